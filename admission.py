@@ -0,0 +1,190 @@
+"""
+Admission Control
+Bounded, prioritised work queue in front of a thread-pool executor, for the
+asyncio NLP service.
+
+Every job is admitted into a lane: "interactive" (small /embed calls, search
+queries) or "bulk" (large /embed-batch ingestion). Each lane's queue is
+bounded in texts; a request that would overflow it is rejected at once with
+Overloaded (→ 429 + Retry-After) instead of waiting without bound.
+
+Dispatchers always take interactive work first, and `reserved_interactive`
+of the executor threads never run bulk work at all, so a burst of large
+batches cannot take every thread away from small queries. Jobs carry a
+deadline: a job whose caller has timed out is dropped before it runs.
+"""
+import asyncio
+import logging
+import math
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+LANES = ("interactive", "bulk")   # priority order
+QUEUE_MS_BUCKETS = (0.5, 1, 2, 5, 10, 20, 50, 100, 250, 1000, 5000)
+# Smoothing for the per-lane service-time estimate behind Retry-After
+EWMA_ALPHA = 0.2
+
+
+class Overloaded(Exception):
+    """The lane's queue is full; retry after `retry_after` seconds."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed before its work finished."""
+
+
+class _Job:
+    __slots__ = ("lane", "fn", "args", "cost", "future", "enqueued")
+
+    def __init__(self, lane, fn, args, cost, future, enqueued):
+        self.lane = lane
+        self.fn = fn
+        self.args = args
+        self.cost = cost
+        self.future = future
+        self.enqueued = enqueued
+
+
+class AdmissionQueue:
+    """Priority lanes with bounded queues, dispatched onto a thread pool."""
+
+    def __init__(self, workers=4, reserved_interactive=1, max_queued=None, name="nlp"):
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+        self.workers = workers
+        self.reserved_interactive = min(reserved_interactive, workers - 1) if workers > 1 else 0
+        self.max_queued = {"interactive": 256, "bulk": 4096, **(max_queued or {})}
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix=f"{name}-exec")
+
+        self._queues = {lane: deque() for lane in LANES}
+        self._queued_cost = dict.fromkeys(LANES, 0)
+        self._running = dict.fromkeys(LANES, 0)
+        self._service_s = dict.fromkeys(LANES, 0.05)
+        self._cond = None
+        self._dispatchers = []
+
+        self.rejected = {lane: REGISTRY.counter(f"{name}_admission_{lane}_rejected_total",
+                                                f"{lane} requests rejected with 429") for lane in LANES}
+        self.expired = {lane: REGISTRY.counter(f"{name}_admission_{lane}_expired_total",
+                                               f"{lane} jobs dropped after their deadline") for lane in LANES}
+        self.queue_ms = {lane: REGISTRY.histogram(f"{name}_admission_{lane}_queue_ms", QUEUE_MS_BUCKETS,
+                                                  f"Time {lane} jobs waited for an executor thread")
+                         for lane in LANES}
+        for lane in LANES:
+            REGISTRY.gauge(f"{name}_admission_{lane}_queued", f"Texts queued in the {lane} lane",
+                           func=lambda lane=lane: self._queued_cost[lane])
+
+    async def start(self):
+        """Start the dispatchers on the running event loop."""
+        self._cond = asyncio.Condition()
+        for i in range(self.workers):
+            interactive_only = i < self.reserved_interactive
+            self._dispatchers.append(asyncio.create_task(self._dispatch(interactive_only)))
+        logger.info(f"Admission queue: {self.workers} executor threads "
+                    f"({self.reserved_interactive} reserved for interactive), limits {self.max_queued}")
+
+    async def close(self):
+        for task in self._dispatchers:
+            task.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    # ── Admission ────────────────────────────────────────────
+    def retry_after(self, lane):
+        """Seconds until the lane's current backlog should have drained."""
+        threads = self.workers if lane == "interactive" else self.workers - self.reserved_interactive
+        backlog = len(self._queues[lane]) * self._service_s[lane] / max(threads, 1)
+        return max(1, math.ceil(backlog))
+
+    def _admit(self, lane, cost):
+        queued = self._queued_cost[lane]
+        # An oversized request is still admitted when its lane is idle
+        if queued and queued + cost > self.max_queued[lane]:
+            self.rejected[lane].inc()
+            raise Overloaded(f"{lane} queue is full ({queued} texts queued)", self.retry_after(lane))
+
+    async def run(self, lane, fn, *args, cost=1, timeout=None):
+        """Run fn(*args) on the executor in `lane`; raises Overloaded or DeadlineExceeded."""
+        results = await self.run_many(lane, fn, [args], [cost], timeout)
+        return results[0]
+
+    async def run_many(self, lane, fn, arg_lists, costs, timeout=None):
+        """
+        Admit several jobs as one request (all or nothing) and gather their
+        results in order. Splitting a large batch this way lets interactive
+        work slip in between its pieces.
+        """
+        if self._cond is None:
+            await self.start()
+        self._admit(lane, sum(costs))
+        loop = asyncio.get_running_loop()
+        jobs = [_Job(lane, fn, args, cost, loop.create_future(), loop.time())
+                for args, cost in zip(arg_lists, costs)]
+        async with self._cond:
+            self._queues[lane].extend(jobs)
+            self._queued_cost[lane] += sum(costs)
+            # Wake every dispatcher: one reserved for interactive work cannot take a bulk job
+            self._cond.notify_all()
+
+        gathered = asyncio.gather(*(job.future for job in jobs))
+        try:
+            return await asyncio.wait_for(gathered, timeout)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"Deadline of {timeout * 1000:.0f} ms exceeded") from None
+
+    # ── Dispatch ─────────────────────────────────────────────
+    async def _take(self, interactive_only):
+        lanes = LANES[:1] if interactive_only else LANES
+        async with self._cond:
+            while True:
+                for lane in lanes:
+                    if self._queues[lane]:
+                        job = self._queues[lane].popleft()
+                        self._queued_cost[lane] -= job.cost
+                        return job
+                await self._cond.wait()
+
+    async def _dispatch(self, interactive_only):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._take(interactive_only)
+            if job.future.done():
+                # The caller gave up (deadline or disconnect): skip the work
+                self.expired[job.lane].inc()
+                continue
+            started = loop.time()
+            self.queue_ms[job.lane].observe((started - job.enqueued) * 1000.0)
+            self._running[job.lane] += 1
+            try:
+                result = await loop.run_in_executor(self.executor, job.fn, *job.args)
+                if not job.future.done():
+                    job.future.set_result(result)
+            except Exception as e:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                self._running[job.lane] -= 1
+                elapsed = loop.time() - started
+                self._service_s[job.lane] += EWMA_ALPHA * (elapsed - self._service_s[job.lane])
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "reserved_interactive": self.reserved_interactive,
+            "lanes": {lane: {
+                "queued_jobs": len(self._queues[lane]),
+                "queued_texts": self._queued_cost[lane],
+                "max_queued_texts": self.max_queued[lane],
+                "running": self._running[lane],
+                "service_ms": round(self._service_s[lane] * 1000.0, 3),
+                "rejected": self.rejected[lane].value,
+                "expired": self.expired[lane].value,
+            } for lane in LANES},
+        }
@@ -5,7 +5,12 @@
 const express = require("express");
 const router = express.Router();
 const { getDB } = require("../config/db");
-const { generateEmbeddingsBatch, checkHealth } = require("../services/nlpService");
+const {
+    generateEmbeddingsBatch, checkHealth, indexUpsert, indexClear, lexicalUpsert, lexicalClear,
+} = require("../services/nlpService");
+const { searchCache } = require("../services/searchCache");
+const { embeddingMeta } = require("../services/embeddingMeta");
+const { storedEmbedding } = require("../services/embeddingStorage");
 
 const COLL = () => {
     const db = getDB();
@@ -41,12 +46,27 @@ router.post("/sample-data", async (req, res) => {
 
         const docsToInsert = sampleDocs.map((doc, i) => ({
             ...doc,
-            embedding: embeddings[i],
+            ...storedEmbedding(embeddings[i]),
+            ...embeddingMeta(doc.content),
             created_at: new Date(),
             updated_at: new Date(),
         }));
 
         const result = await COLL().insertMany(docsToInsert);
+        await Promise.all([
+            indexUpsert(docsToInsert.map((doc, i) => ({
+                id: result.insertedIds[i].toString(),
+                embedding: embeddings[i],
+                metadata: doc.metadata,
+            }))),
+            lexicalUpsert(docsToInsert.map((doc, i) => ({
+                id: result.insertedIds[i].toString(),
+                title: doc.title,
+                content: doc.content,
+                metadata: doc.metadata,
+            }))),
+        ]);
+        searchCache.bumpVersion();
 
         res.status(201).json({
             success: true,
@@ -65,6 +85,8 @@ router.post("/sample-data", async (req, res) => {
 router.post("/clear", async (req, res) => {
     try {
         await COLL().deleteMany({});
+        await Promise.all([indexClear(), lexicalClear()]);
+        searchCache.bumpVersion();
         res.json({ success: true, message: "All documents cleared" });
     } catch (error) {
         console.error("Clear error:", error);
@@ -87,6 +109,7 @@ router.get("/stats", async (req, res) => {
                 embedding_model: nlpHealth.model || "sentence-transformers/all-MiniLM-L6-v2",
                 similarity_threshold: parseFloat(process.env.SIMILARITY_THRESHOLD) || 0.3,
                 nlp_service_status: nlpHealth.status,
+                search_cache: searchCache.stats(),
                 timestamp: new Date().toISOString(),
             },
         });
@@ -6,7 +6,12 @@ const express = require("express");
 const router = express.Router();
 const { ObjectId } = require("mongodb");
 const { getDB } = require("../config/db");
-const { generateEmbedding } = require("../services/nlpService");
+const { generateEmbedding, indexUpsert, indexDelete, lexicalUpsert, lexicalDelete } = require("../services/nlpService");
+const { searchCache } = require("../services/searchCache");
+const { embeddingMeta } = require("../services/embeddingMeta");
+const { storedEmbedding } = require("../services/embeddingStorage");
+const { bulkIngest } = require("../services/bulkIngest");
+const { timeStage } = require("../services/tracing");
 
 const COLL = () => {
     const db = getDB();
@@ -19,7 +24,7 @@ const COLL = () => {
 router.get("/", async (req, res) => {
     try {
         const docs = await COLL()
-            .find({}, { projection: { embedding: 0 } })
+            .find({}, { projection: { embedding: 0, embedding_bits: 0, embedding_scale: 0 } })
             .toArray();
         docs.forEach((d) => { d._id = d._id.toString(); });
         res.json({ success: true, count: docs.length, documents: docs });
@@ -44,17 +49,24 @@ router.post("/", async (req, res) => {
         const document = {
             title,
             content,
-            embedding,
+            ...storedEmbedding(embedding),
+            ...embeddingMeta(content),
             metadata: metadata || {},
             created_at: new Date(),
             updated_at: new Date(),
         };
 
         const result = await COLL().insertOne(document);
+        const id = result.insertedId.toString();
+        await Promise.all([
+            indexUpsert([{ id, embedding, metadata: document.metadata }]),
+            lexicalUpsert([{ id, title, content, metadata: document.metadata }]),
+        ]);
+        searchCache.bumpVersion();
         res.status(201).json({
             success: true,
             message: "Document added successfully",
-            document_id: result.insertedId.toString(),
+            document_id: id,
         });
     } catch (error) {
         console.error("Add document error:", error);
@@ -62,6 +74,38 @@ router.post("/", async (req, res) => {
     }
 });
 
+/**
+ * POST /api/documents/bulk — add many documents from an NDJSON body
+ * (Content-Type: application/x-ndjson, one { title, content, metadata } per
+ * line). Streams the body in batches of /embed-batch + unordered insertMany;
+ * bad lines and rejected writes are reported per line instead of failing
+ * the whole load.
+ */
+router.post("/bulk", async (req, res) => {
+    if (req.is("application/json")) {
+        return res.status(415).json({
+            success: false,
+            error: "Send one JSON document per line with Content-Type: application/x-ndjson",
+        });
+    }
+    const started = Date.now();
+    try {
+        const summary = await timeStage("bulk_ingest", () => bulkIngest(req, COLL()));
+        const elapsed = Date.now() - started;
+        res.json({
+            success: true,
+            ...summary,
+            elapsed_ms: elapsed,
+            docs_per_s: elapsed > 0 ? parseFloat((summary.inserted * 1000 / elapsed).toFixed(1)) : null,
+        });
+    } catch (error) {
+        console.error("Bulk ingest error:", error);
+        res.status(500).json({ success: false, error: error.message });
+    } finally {
+        searchCache.bumpVersion();
+    }
+});
+
 /**
  * DELETE /api/documents/:id — delete a document
  */
@@ -73,6 +117,8 @@ router.delete("/:id", async (req, res) => {
         if (result.deletedCount === 0) {
             return res.status(404).json({ success: false, error: "Document not found" });
         }
+        await Promise.all([indexDelete([id]), lexicalDelete([id])]);
+        searchCache.bumpVersion();
 
         res.json({ success: true, message: "Document deleted successfully" });
     } catch (error) {
@@ -1,30 +1,202 @@
 /**
  * Search Routes
- * Handles semantic search using MongoDB Atlas Vector Search
+ * Handles semantic search using MongoDB Atlas Vector Search, and hybrid
+ * vector + BM25 search fused by reciprocal rank or weighted score
  */
 const express = require("express");
 const router = express.Router();
+const { ObjectId } = require("mongodb");
 const { getDB } = require("../config/db");
-const { generateEmbedding } = require("../services/nlpService");
+const {
+    generateEmbedding, generateEmbeddingsBatch, searchIndex, searchIndexBatch, searchLexical,
+} = require("../services/nlpService");
+const { mapWithConcurrency } = require("../services/concurrency");
+const { reciprocalRankFusion, weightedFusion, contributions } = require("../services/fusion");
+const { searchCache } = require("../services/searchCache");
+const { parseFilter, atlasFilter } = require("../services/filters");
+const { currentTrace, timeStage, traceRequested } = require("../services/tracing");
+
+const MULTI_SEARCH_CONCURRENCY = parseInt(process.env.MULTI_SEARCH_CONCURRENCY) || 4;
+// Hybrid search: candidates per leg = top_k × oversample; "rrf" or "weighted" fusion
+const HYBRID_OVERSAMPLE = parseInt(process.env.HYBRID_OVERSAMPLE) || 4;
+const HYBRID_FUSION = process.env.HYBRID_FUSION || "rrf";
+const HYBRID_ALPHA = parseFloat(process.env.HYBRID_ALPHA ?? "0.5");
+// Near-duplicates marked by dedup.py: fetch top_k × oversample hits, keep the best of each cluster
+const COLLAPSE_DUPLICATES = process.env.SEARCH_COLLAPSE_DUPLICATES !== "false";
+const COLLAPSE_OVERSAMPLE = parseInt(process.env.COLLAPSE_OVERSAMPLE) || 2;
+
+/**
+ * Run one Atlas $vectorSearch query and return the scored documents.
+ * `filters` becomes a $vectorSearch pre-filter, so the candidates are drawn
+ * from matching documents only instead of being dropped after the search.
+ */
+async function atlasVectorSearch(collection, queryEmbedding, { indexName, numCandidates, limit, minThreshold, filters }) {
+    const pipeline = [
+        {
+            $vectorSearch: {
+                index: indexName,
+                path: "embedding",
+                queryVector: queryEmbedding,
+                numCandidates: numCandidates,
+                limit: limit,
+                ...(filters ? { filter: atlasFilter(filters) } : {}),
+            },
+        },
+        { $addFields: { similarity_score: { $meta: "vectorSearchScore" } } },
+        { $match: { similarity_score: { $gte: minThreshold } } },
+        {
+            $project: {
+                embedding: 0,
+                title: 1,
+                content: 1,
+                category: 1,
+                metadata: 1,
+                similarity_score: 1,
+                created_at: 1,
+                updated_at: 1,
+                duplicate_cluster: 1,
+            },
+        },
+    ];
+    return timeStage("vector_search", () => collection.aggregate(pipeline).toArray());
+}
+
+/**
+ * Search the NLP service's local index and hydrate the hits from MongoDB.
+ * Only ids and scores cross the wire — embeddings never leave the NLP service.
+ * Returns null when the index is unreachable or empty.
+ */
+async function localIndexSearch(collection, queryEmbedding, limit, minThreshold, filters) {
+    let response;
+    try {
+        response = await searchIndex(queryEmbedding, limit, minThreshold, filters);
+    } catch (err) {
+        console.warn("Local vector index unavailable:", err.message);
+        return null;
+    }
+    if (!response.index_size) return null;
+    return { method: `local_${response.mode}`, results: await hydrate(collection, response.results) };
+}
+
+/**
+ * Fetch documents (without embeddings) by id string → Map(id → doc)
+ */
+async function fetchDocs(collection, ids) {
+    const unique = [...new Set(ids)].map((id) => new ObjectId(id));
+    const docs = await collection
+        .find({ _id: { $in: unique } }, { projection: { embedding: 0, embedding_bits: 0, embedding_scale: 0 } })
+        .toArray();
+    return new Map(docs.map((d) => [d._id.toString(), d]));
+}
+
+/**
+ * Attach scores to fetched docs, preserving the hit order
+ */
+function scoreHits(hits, byId) {
+    return hits
+        .filter((r) => byId.has(r.id))
+        .map((r) => ({ ...byId.get(r.id), similarity_score: parseFloat(r.score.toFixed(4)) }));
+}
+
+/**
+ * Fetch documents for [{ id, score }] hits, preserving score order
+ */
+async function hydrate(collection, hits) {
+    return scoreHits(hits, await timeStage("hydrate", () => fetchDocs(collection, hits.map((r) => r.id))));
+}
+
+/**
+ * Hits to fetch for `limit` results, leaving room for collapsed duplicates
+ */
+function fetchLimit(limit) {
+    return COLLAPSE_DUPLICATES ? limit * COLLAPSE_OVERSAMPLE : limit;
+}
 
 /**
- * Cosine similarity between two vectors (fallback search)
+ * Keep the best-ranked document of each near-duplicate cluster (duplicate_cluster,
+ * written by dedup.py) with the number of copies it stands for, then cut to `limit`
  */
-function cosineSimilarity(a, b) {
-    let dot = 0, normA = 0, normB = 0;
-    for (let i = 0; i < a.length; i++) {
-        dot += a[i] * b[i];
-        normA += a[i] * a[i];
-        normB += b[i] * b[i];
+function collapseDuplicates(results, limit) {
+    if (!COLLAPSE_DUPLICATES) return results.slice(0, limit);
+    const kept = new Map();
+    const collapsed = [];
+    for (const r of results) {
+        const cluster = r.duplicate_cluster;
+        if (!cluster) {
+            collapsed.push(r);
+        } else if (kept.has(cluster)) {
+            kept.get(cluster).duplicates_collapsed += 1;
+        } else {
+            const doc = { ...r, duplicates_collapsed: 0 };
+            kept.set(cluster, doc);
+            collapsed.push(doc);
+        }
+    }
+    return collapsed.slice(0, limit);
+}
+
+/**
+ * Validated request filter, or null; sends a 400 and returns undefined when invalid
+ */
+function requestFilter(req, res) {
+    try {
+        return parseFilter(req.body.filter);
+    } catch (err) {
+        res.status(400).json({ success: false, error: err.message });
+        return undefined;
     }
-    normA = Math.sqrt(normA);
-    normB = Math.sqrt(normB);
-    return normA && normB ? dot / (normA * normB) : 0;
+}
+
+/**
+ * Per-stage timing breakdown for the response, when the client asked for one
+ * (?trace=1, { trace: true } or X-Trace: 1)
+ */
+function traceFields(req) {
+    const trace = currentTrace();
+    return trace && traceRequested(req) ? { trace: trace.breakdown() } : {};
+}
+
+/**
+ * Embed the query and run Atlas Vector Search, falling back to the local index
+ */
+async function semanticSearch(query, { limit, minThreshold, numCandidates, indexName, collName, filters }) {
+    // Generate query embedding via Python NLP service
+    const queryEmbedding = await generateEmbedding(query);
+    let searchMethod = "atlas_vector";
+    let results = [];
+
+    // Try Atlas Vector Search
+    try {
+        results = await atlasVectorSearch(getDB().collection(collName), queryEmbedding, {
+            indexName, numCandidates, limit: fetchLimit(limit), minThreshold, filters,
+        });
+    } catch (err) {
+        console.warn("Atlas Vector Search failed, using fallback:", err.message);
+    }
+
+    // Fallback: exact/ANN search in the NLP service's local index
+    if (results.length === 0) {
+        const local = await localIndexSearch(getDB().collection(collName), queryEmbedding, fetchLimit(limit),
+            minThreshold, filters);
+        if (local) {
+            searchMethod = local.method;
+            results = local.results;
+        }
+    }
+
+    // Convert _id to string
+    results.forEach((r) => { r._id = r._id.toString(); });
+    results = collapseDuplicates(results, limit);
+    return { results, count: results.length, search_method: searchMethod };
 }
 
 /**
  * POST /api/search
- * Semantic search — tries Atlas Vector Search first, falls back to in-memory
+ * Semantic search — tries Atlas Vector Search first, falls back to the local index.
+ * An optional `filter` ({ category, difficulty }: value or [values]) restricts
+ * both paths to matching documents. Responses are cached per (query, top_k,
+ * threshold, filter, collection version) and concurrent identical queries
+ * share one embedding + search.
  */
 router.post("/", async (req, res) => {
     try {
@@ -32,6 +204,8 @@ router.post("/", async (req, res) => {
         if (!query) {
             return res.status(400).json({ success: false, error: "Search query is required" });
         }
+        const filters = requestFilter(req, res);
+        if (filters === undefined) return;
 
         const limit = top_k || parseInt(process.env.VECTOR_LIMIT) || 5;
         const minThreshold = threshold ?? (parseFloat(process.env.SIMILARITY_THRESHOLD) || 0.3);
@@ -39,88 +213,182 @@ router.post("/", async (req, res) => {
         const collName = process.env.MONGODB_COLLECTION_NAME || "documents";
         const indexName = process.env.VECTOR_INDEX_NAME || "vector_index";
 
-        // Generate query embedding via Python NLP service
-        const queryEmbedding = await generateEmbedding(query);
-        let searchMethod = "atlas_vector";
-        let results = [];
-
-        // Try Atlas Vector Search
-        try {
-            const db = getDB();
-            const pipeline = [
-                {
-                    $vectorSearch: {
-                        index: indexName,
-                        path: "embedding",
-                        queryVector: queryEmbedding,
-                        numCandidates: numCandidates,
-                        limit: limit,
-                    },
-                },
-                { $addFields: { similarity_score: { $meta: "vectorSearchScore" } } },
-                { $match: { similarity_score: { $gte: minThreshold } } },
-                {
-                    $project: {
-                        embedding: 0,
-                        title: 1,
-                        content: 1,
-                        category: 1,
-                        metadata: 1,
-                        similarity_score: 1,
-                        created_at: 1,
-                        updated_at: 1,
-                    },
-                },
-            ];
-            results = await db.collection(collName).aggregate(pipeline).toArray();
-        } catch (err) {
-            console.warn("Atlas Vector Search failed, using fallback:", err.message);
+        const key = searchCache.key("search", query, [limit, minThreshold, filters]);
+        const { value, cache } = await searchCache.getOrCompute(key, () => semanticSearch(query, {
+            limit, minThreshold, numCandidates, indexName, collName, filters,
+        }));
+
+        res.json({
+            success: true,
+            query,
+            ...(filters ? { filter: filters } : {}),
+            ...value,
+            cache,
+            ...traceFields(req),
+            timestamp: new Date().toISOString(),
+        });
+    } catch (error) {
+        console.error("Search error:", error);
+        res.status(500).json({ success: false, error: error.message });
+    }
+});
+
+/**
+ * Vector leg of hybrid search: Atlas $vectorSearch with no similarity cut-off,
+ * falling back to the local index. Returns { method, hits, docs }.
+ */
+async function vectorLeg(collection, query, candidates, { indexName, numCandidates, filters }) {
+    const queryEmbedding = await generateEmbedding(query);
+    try {
+        const results = await atlasVectorSearch(collection, queryEmbedding, {
+            indexName, numCandidates: Math.max(numCandidates, candidates), limit: candidates, minThreshold: 0, filters,
+        });
+        if (results.length > 0) {
+            return {
+                method: "atlas_vector",
+                hits: results.map((r) => ({ id: r._id.toString(), score: r.similarity_score })),
+                docs: new Map(results.map((r) => [r._id.toString(), r])),
+            };
         }
+    } catch (err) {
+        console.warn("Atlas Vector Search failed, using fallback:", err.message);
+    }
+    const response = await searchIndex(queryEmbedding, candidates, undefined, filters);
+    return { method: `local_${response.mode}`, hits: response.results, docs: new Map() };
+}
+
+/**
+ * Run one hybrid leg, timing it; a failed leg yields no hits instead of failing the search
+ */
+async function timedLeg(name, fn) {
+    const started = Date.now();
+    try {
+        const leg = await fn();
+        return { ...leg, ms: Date.now() - started };
+    } catch (err) {
+        console.warn(`Hybrid ${name} leg failed:`, err.message);
+        return { hits: [], docs: new Map(), ms: Date.now() - started, error: err.message };
+    }
+}
+
+/**
+ * Run both hybrid legs in parallel and fuse their candidates
+ */
+async function hybridSearch(query, { limit, fusion, alpha, numCandidates, indexName, collName, filters }) {
+    const candidates = limit * HYBRID_OVERSAMPLE;
+    const collection = getDB().collection(collName);
+
+    const timings = {};
+    const started = Date.now();
+    const [vector, lexical] = await Promise.all([
+        timedLeg("vector", () => vectorLeg(collection, query, candidates, { indexName, numCandidates, filters })),
+        timedLeg("lexical", async () => {
+            const response = await searchLexical(query, candidates, filters);
+            return { method: "bm25", hits: response.results, docs: new Map() };
+        }),
+    ]);
+    timings.vector = vector.ms;
+    timings.lexical = lexical.ms;
+
+    let stageStart = Date.now();
+    const legs = { vector: vector.hits, lexical: lexical.hits };
+    const fused = (fusion === "rrf"
+        ? reciprocalRankFusion(legs)
+        : weightedFusion(legs, { vector: alpha, lexical: 1 - alpha })).slice(0, fetchLimit(limit));
+    timings.fuse = Date.now() - stageStart;
+
+    // Atlas hits arrive with their documents; fetch only the rest
+    stageStart = Date.now();
+    const missing = fused.map((f) => f.id).filter((id) => !vector.docs.has(id));
+    const byId = missing.length > 0 ? await timeStage("hydrate", () => fetchDocs(collection, missing)) : new Map();
+    const results = collapseDuplicates(fused
+        .filter((f) => vector.docs.has(f.id) || byId.has(f.id))
+        .map((f) => {
+            const { similarity_score, ...doc } = vector.docs.get(f.id) || byId.get(f.id);
+            return {
+                ...doc,
+                _id: f.id,
+                hybrid_score: parseFloat(f.score.toFixed(6)),
+                similarity_score: f.scores.vector !== undefined ? parseFloat(f.scores.vector.toFixed(4)) : null,
+                bm25_score: f.scores.lexical !== undefined ? parseFloat(f.scores.lexical.toFixed(4)) : null,
+                vector_rank: f.ranks.vector ?? null,
+                lexical_rank: f.ranks.lexical ?? null,
+            };
+        }), limit);
+    timings.hydrate = Date.now() - stageStart;
+    timings.total = Date.now() - started;
+
+    const contributed = contributions(fused, ["vector", "lexical"]);
+    const legReport = (leg, name) => ({
+        method: leg.method,
+        ms: leg.ms,
+        hits: leg.hits.length,
+        ...contributed[name],
+        ...(leg.error ? { error: leg.error } : {}),
+    });
 
-        // Fallback: in-memory cosine similarity
-        if (results.length === 0) {
-            searchMethod = "fallback_cosine";
-            const db = getDB();
-            const docs = await db
-                .collection(collName)
-                .find({ embedding: { $exists: true, $ne: [] } })
-                .toArray();
-
-            const scored = docs
-                .map((doc) => ({
-                    ...doc,
-                    similarity_score: cosineSimilarity(queryEmbedding, doc.embedding),
-                }))
-                .filter((d) => d.similarity_score >= minThreshold)
-                .sort((a, b) => b.similarity_score - a.similarity_score)
-                .slice(0, limit);
-
-            results = scored.map(({ embedding, ...rest }) => ({
-                ...rest,
-                similarity_score: parseFloat(rest.similarity_score.toFixed(4)),
-            }));
+    return {
+        results,
+        count: results.length,
+        search_method: `hybrid_${fusion}`,
+        legs: { vector: legReport(vector, "vector"), lexical: legReport(lexical, "lexical") },
+        timings_ms: timings,
+    };
+}
+
+/**
+ * POST /api/search/hybrid
+ * Vector and BM25 legs run in parallel; their top candidates are fused with
+ * reciprocal rank fusion ("rrf", default) or a weighted sum of min-max
+ * normalised scores ("weighted", alpha = vector weight). Exact identifiers and
+ * rare terms that embeddings miss still surface through the lexical leg.
+ * `filter` applies to both legs. Cached and single-flighted like POST /api/search.
+ */
+router.post("/hybrid", async (req, res) => {
+    try {
+        const { query, top_k, fusion = HYBRID_FUSION, alpha = HYBRID_ALPHA } = req.body;
+        if (!query) {
+            return res.status(400).json({ success: false, error: "Search query is required" });
         }
+        if (!["rrf", "weighted"].includes(fusion)) {
+            return res.status(400).json({ success: false, error: "'fusion' must be 'rrf' or 'weighted'" });
+        }
+        const filters = requestFilter(req, res);
+        if (filters === undefined) return;
 
-        // Convert _id to string
-        results.forEach((r) => { r._id = r._id.toString(); });
+        const limit = top_k || parseInt(process.env.VECTOR_LIMIT) || 5;
+        const numCandidates = parseInt(process.env.VECTOR_NUM_CANDIDATES) || 100;
+        const collName = process.env.MONGODB_COLLECTION_NAME || "documents";
+        const indexName = process.env.VECTOR_INDEX_NAME || "vector_index";
+
+        const key = searchCache.key("hybrid", query, [limit, fusion, alpha, filters]);
+        const { value, cache } = await searchCache.getOrCompute(
+            key,
+            () => hybridSearch(query, { limit, fusion, alpha, numCandidates, indexName, collName, filters }),
+            // A degraded answer (one leg failed) is served but not cached
+            (v) => !v.legs.vector.error && !v.legs.lexical.error,
+        );
 
         res.json({
             success: true,
             query,
-            results,
-            count: results.length,
-            search_method: searchMethod,
+            ...(filters ? { filter: filters } : {}),
+            ...value,
+            cache,
+            ...traceFields(req),
             timestamp: new Date().toISOString(),
         });
     } catch (error) {
-        console.error("Search error:", error);
+        console.error("Hybrid search error:", error);
         res.status(500).json({ success: false, error: error.message });
     }
 });
 
 /**
  * POST /api/search/multi
- * Multi-query search
+ * Multi-query search — one batched embedding call, bounded-concurrency vector
+ * searches, and a single batched local-index pass for the queries that fall back.
+ * One optional `filter` applies to every query.
  */
 router.post("/multi", async (req, res) => {
     try {
@@ -128,58 +396,80 @@ router.post("/multi", async (req, res) => {
         if (!queries || !Array.isArray(queries)) {
             return res.status(400).json({ success: false, error: "Queries array is required" });
         }
+        const filters = requestFilter(req, res);
+        if (filters === undefined) return;
 
         const limit = top_k || parseInt(process.env.VECTOR_LIMIT) || 5;
         const minThreshold = threshold ?? (parseFloat(process.env.SIMILARITY_THRESHOLD) || 0.3);
         const numCandidates = parseInt(process.env.VECTOR_NUM_CANDIDATES) || 100;
         const collName = process.env.MONGODB_COLLECTION_NAME || "documents";
         const indexName = process.env.VECTOR_INDEX_NAME || "vector_index";
-        const db = getDB();
+        const collection = getDB().collection(collName);
 
-        const allResults = {};
+        const timings = {};
+        const started = Date.now();
+        const uniqueQueries = [...new Set(queries)];
+        if (uniqueQueries.length === 0) {
+            return res.json({ success: true, query_count: 0, results: {}, timings_ms: { total: 0 }, timestamp: new Date().toISOString() });
+        }
 
-        for (const query of queries) {
-            const queryEmbedding = await generateEmbedding(query);
-            let results = [];
+        // Stage 1: embed every query in one /embed-batch call
+        let stageStart = Date.now();
+        const embeddings = await generateEmbeddingsBatch(uniqueQueries);
+        timings.embed = Date.now() - stageStart;
 
+        // Stage 2: Atlas vector searches, at most MULTI_SEARCH_CONCURRENCY in flight
+        stageStart = Date.now();
+        const perQuery = await mapWithConcurrency(uniqueQueries, MULTI_SEARCH_CONCURRENCY, async (query, i) => {
             try {
-                const pipeline = [
-                    {
-                        $vectorSearch: {
-                            index: indexName,
-                            path: "embedding",
-                            queryVector: queryEmbedding,
-                            numCandidates: numCandidates,
-                            limit: limit,
-                        },
-                    },
-                    { $addFields: { similarity_score: { $meta: "vectorSearchScore" } } },
-                    { $match: { similarity_score: { $gte: minThreshold } } },
-                    { $project: { embedding: 0, title: 1, content: 1, category: 1, metadata: 1, similarity_score: 1, created_at: 1 } },
-                ];
-                results = await db.collection(collName).aggregate(pipeline).toArray();
+                return await atlasVectorSearch(collection, embeddings[i], {
+                    indexName, numCandidates, limit: fetchLimit(limit), minThreshold, filters,
+                });
             } catch (_) {
-                // fallback
+                return [];
             }
+        });
+        timings.vector_search = Date.now() - stageStart;
 
-            if (results.length === 0) {
-                const docs = await db.collection(collName).find({ embedding: { $exists: true, $ne: [] } }).toArray();
-                results = docs
-                    .map((doc) => ({ ...doc, similarity_score: cosineSimilarity(queryEmbedding, doc.embedding) }))
-                    .filter((d) => d.similarity_score >= minThreshold)
-                    .sort((a, b) => b.similarity_score - a.similarity_score)
-                    .slice(0, limit)
-                    .map(({ embedding, ...rest }) => ({ ...rest, similarity_score: parseFloat(rest.similarity_score.toFixed(4)) }));
-            }
+        // Stage 3: queries with no Atlas hits share one local-index snapshot
+        const fallbackIdx = perQuery.map((r, i) => (r.length === 0 ? i : -1)).filter((i) => i >= 0);
+        let shards;
+        if (fallbackIdx.length > 0) {
+            stageStart = Date.now();
+            try {
+                const response = await searchIndexBatch(fallbackIdx.map((i) => embeddings[i]), fetchLimit(limit),
+                    minThreshold, filters);
+                timings.fallback = Date.now() - stageStart;
+                shards = response.shards;
 
-            results.forEach((r) => { r._id = r._id.toString(); });
-            allResults[query] = results;
+                stageStart = Date.now();
+                const byId = await timeStage("hydrate",
+                    () => fetchDocs(collection, response.batch_results.flat().map((hit) => hit.id)));
+                fallbackIdx.forEach((qi, j) => {
+                    perQuery[qi] = scoreHits(response.batch_results[j], byId);
+                });
+                timings.hydrate = Date.now() - stageStart;
+            } catch (err) {
+                console.warn("Local vector index unavailable:", err.message);
+                timings.fallback = Date.now() - stageStart;
+            }
         }
 
+        const allResults = {};
+        uniqueQueries.forEach((query, i) => {
+            allResults[query] = collapseDuplicates(perQuery[i].map((r) => ({ ...r, _id: r._id.toString() })), limit);
+        });
+        timings.total = Date.now() - started;
+
         res.json({
             success: true,
             query_count: queries.length,
             results: allResults,
+            fallback_count: fallbackIdx.length,
+            // Sharded local index: how many shards answered within the deadline
+            ...(shards && { shards }),
+            timings_ms: timings,
+            ...traceFields(req),
             timestamp: new Date().toISOString(),
         });
     } catch (error) {
@@ -188,4 +478,11 @@ router.post("/multi", async (req, res) => {
     }
 });
 
+/**
+ * GET /api/search/cache — result cache hit ratio and saved latency
+ */
+router.get("/cache", (req, res) => {
+    res.json({ success: true, cache: searchCache.stats() });
+});
+
 module.exports = router;
@@ -6,6 +6,8 @@ require("dotenv").config();
 const express = require("express");
 const cors = require("cors");
 const { connectDB, closeDB } = require("./config/db");
+const { REGISTRY, PROMETHEUS_CONTENT_TYPE, wantsPrometheus } = require("./services/metrics");
+const { tracingMiddleware } = require("./services/tracing");
 
 const searchRoutes = require("./routes/search");
 const documentRoutes = require("./routes/documents");
@@ -17,6 +19,7 @@ const PORT = process.env.PORT || 5000;
 // ── Middleware ───────────────────────────────────────────────
 app.use(cors());
 app.use(express.json({ limit: "10mb" }));
+app.use(tracingMiddleware);
 
 // ── Routes ──────────────────────────────────────────────────
 app.use("/api/search", searchRoutes);
@@ -32,6 +35,14 @@ app.get("/api/health", (req, res) => {
     });
 });
 
+// Metrics: per-stage and per-route histograms, search cache counters
+app.get("/metrics", (req, res) => {
+    if (wantsPrometheus(req.get("Accept"), req.query.format)) {
+        return res.type(PROMETHEUS_CONTENT_TYPE).send(REGISTRY.prometheus());
+    }
+    res.json(REGISTRY.snapshot());
+});
+
 // 404 handler
 app.use((req, res) => {
     res.status(404).json({ success: false, error: "Endpoint not found" });
@@ -0,0 +1,223 @@
+/**
+ * Bulk Ingestion
+ * Streams NDJSON documents ({ title, content, metadata? } per line) into
+ * MongoDB: fixed-size groups go to /embed-batch with several groups in flight,
+ * and each group is written with one unordered insertMany.
+ *
+ * The request body is read straight from the socket, never buffered whole.
+ * Buffered documents are bounded by BULK_MAX_BUFFER_MB: a group is sent once
+ * it holds BULK_BATCH_SIZE documents or its share of the budget, and reading
+ * pauses (TCP backpressure) while BULK_CONCURRENCY groups are in flight.
+ * A bad line, a failed embedding call or a rejected write fails only the
+ * documents involved; they are reported by line number.
+ */
+const { StringDecoder } = require("string_decoder");
+const { generateEmbeddingsBatch, indexUpsert, lexicalUpsert } = require("./nlpService");
+const { embeddingMeta } = require("./embeddingMeta");
+const { storedEmbedding } = require("./embeddingStorage");
+const { REGISTRY } = require("./metrics");
+
+const BATCH_SIZE = parseInt(process.env.BULK_BATCH_SIZE) || 64;
+const CONCURRENCY = parseInt(process.env.BULK_CONCURRENCY) || 4;
+const MAX_BUFFER_BYTES = (parseFloat(process.env.BULK_MAX_BUFFER_MB) || 32) * 1024 * 1024;
+const MAX_LINE_BYTES = (parseInt(process.env.BULK_MAX_LINE_KB) || 1024) * 1024;
+const MAX_ERRORS = parseInt(process.env.BULK_MAX_ERRORS ?? "100");
+
+const insertedTotal = REGISTRY.counter("api_bulk_documents_inserted_total", "Documents inserted by bulk ingestion");
+const failedTotal = REGISTRY.counter("api_bulk_documents_failed_total", "Documents rejected by bulk ingestion");
+
+/**
+ * Yield { line, text } for each non-blank line of a byte stream, or
+ * { line, error } for a line longer than maxLineBytes (which is skipped
+ * without being buffered)
+ */
+async function* ndjsonLines(stream, maxLineBytes = MAX_LINE_BYTES) {
+    const decoder = new StringDecoder("utf8");
+    const tooLong = `Line exceeds ${Math.round(maxLineBytes / 1024)} KB`;
+    let partial = "";
+    let skipping = false;
+    let line = 0;
+
+    function* complete(piece) {
+        line += 1;
+        const text = partial + piece;
+        partial = "";
+        if (skipping || Buffer.byteLength(text) > maxLineBytes) {
+            skipping = false;
+            yield { line, error: tooLong };
+        } else if (text.trim()) {
+            yield { line, text };
+        }
+    }
+
+    for await (const chunk of stream) {
+        const text = decoder.write(chunk);
+        let start = 0;
+        let end;
+        while ((end = text.indexOf("\n", start)) !== -1) {
+            yield* complete(skipping ? "" : text.slice(start, end));
+            start = end + 1;
+        }
+        if (!skipping) {
+            partial += text.slice(start);
+            if (Buffer.byteLength(partial) > maxLineBytes) {
+                skipping = true;
+                partial = "";
+            }
+        }
+    }
+    const rest = decoder.end();
+    if (skipping || partial || rest) yield* complete(skipping ? "" : rest);
+}
+
+/**
+ * Validate one parsed line → { title, content, metadata } or an error message
+ */
+function parseDocument(text) {
+    let doc;
+    try {
+        doc = JSON.parse(text);
+    } catch (err) {
+        return { error: `Invalid JSON: ${err.message}` };
+    }
+    if (!doc || typeof doc !== "object" || Array.isArray(doc)) {
+        return { error: "Each line must be a JSON object" };
+    }
+    const { title, content, metadata } = doc;
+    if (typeof title !== "string" || !title || typeof content !== "string" || !content) {
+        return { error: "Title and content are required" };
+    }
+    if (metadata !== undefined && (typeof metadata !== "object" || metadata === null || Array.isArray(metadata))) {
+        return { error: "'metadata' must be an object" };
+    }
+    return { doc: { title, content, metadata: metadata || {} } };
+}
+
+class BulkSummary {
+    constructor(maxErrors) {
+        this.maxErrors = maxErrors;
+        this.received = 0;
+        this.inserted = 0;
+        this.failed = 0;
+        this.batches = 0;
+        this.errors = [];
+    }
+
+    fail(line, error) {
+        this.failed += 1;
+        failedTotal.inc();
+        if (this.errors.length < this.maxErrors) this.errors.push({ line, error });
+    }
+
+    report() {
+        return {
+            received: this.received,
+            inserted: this.inserted,
+            failed: this.failed,
+            batches: this.batches,
+            errors: this.errors,
+            ...(this.failed > this.errors.length ? { errors_truncated: true } : {}),
+        };
+    }
+}
+
+/**
+ * Embed, insert and index one group of [{ line, doc }]; never throws
+ */
+async function ingestBatch(collection, items, summary) {
+    summary.batches += 1;
+    let embeddings;
+    try {
+        embeddings = await generateEmbeddingsBatch(items.map((item) => item.doc.content));
+    } catch (err) {
+        items.forEach((item) => summary.fail(item.line, err.message));
+        return;
+    }
+
+    const now = new Date();
+    const docs = items.map(({ doc }, i) => ({
+        ...doc,
+        ...storedEmbedding(embeddings[i]),
+        ...embeddingMeta(doc.content),
+        created_at: now,
+        updated_at: now,
+    }));
+
+    // Unordered: one rejected document does not stop the rest of the group
+    const rejected = new Map();
+    try {
+        await collection.insertMany(docs, { ordered: false });
+    } catch (err) {
+        if (!err.writeErrors) {
+            items.forEach((item) => summary.fail(item.line, err.message));
+            return;
+        }
+        for (const writeError of [].concat(err.writeErrors)) {
+            rejected.set(writeError.index, writeError.errmsg || writeError.message);
+        }
+    }
+
+    const inserted = [];
+    docs.forEach((doc, i) => {
+        if (rejected.has(i)) summary.fail(items[i].line, rejected.get(i));
+        else inserted.push({ ...doc, id: doc._id.toString(), embedding: embeddings[i] });
+    });
+    summary.inserted += inserted.length;
+    insertedTotal.inc(inserted.length);
+
+    await Promise.all([
+        indexUpsert(inserted.map(({ id, embedding, metadata }) => ({ id, embedding, metadata }))),
+        lexicalUpsert(inserted.map(({ id, title, content, metadata }) => ({ id, title, content, metadata }))),
+    ]);
+}
+
+/**
+ * Ingest an NDJSON stream into `collection`; resolves to the load summary
+ */
+async function bulkIngest(stream, collection, {
+    batchSize = BATCH_SIZE,
+    concurrency = CONCURRENCY,
+    maxBufferBytes = MAX_BUFFER_BYTES,
+    maxLineBytes = MAX_LINE_BYTES,
+    maxErrors = MAX_ERRORS,
+} = {}) {
+    const summary = new BulkSummary(maxErrors);
+    // In-flight groups plus the one filling stay within maxBufferBytes
+    const batchBytes = Math.max(1, Math.floor(maxBufferBytes / (concurrency + 1)));
+    const inflight = new Set();
+    let batch = [];
+    let bytes = 0;
+
+    async function flush() {
+        while (inflight.size >= concurrency) await Promise.race(inflight);
+        const promise = ingestBatch(collection, batch, summary).finally(() => inflight.delete(promise));
+        inflight.add(promise);
+        batch = [];
+        bytes = 0;
+    }
+
+    try {
+        for await (const item of ndjsonLines(stream, maxLineBytes)) {
+            summary.received += 1;
+            if (item.error) {
+                summary.fail(item.line, item.error);
+                continue;
+            }
+            const { doc, error } = parseDocument(item.text);
+            if (error) {
+                summary.fail(item.line, error);
+                continue;
+            }
+            batch.push({ line: item.line, doc });
+            bytes += Buffer.byteLength(item.text);
+            if (batch.length >= batchSize || bytes >= batchBytes) await flush();
+        }
+        if (batch.length > 0) await flush();
+    } finally {
+        // Let started groups finish even when the stream breaks off
+        await Promise.all(inflight);
+    }
+    return summary.report();
+}
+
+module.exports = { bulkIngest, ndjsonLines, parseDocument };
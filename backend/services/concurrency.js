@@ -0,0 +1,26 @@
+/**
+ * Concurrency Helpers
+ * Bounded-parallelism utilities for fan-out work
+ */
+
+/**
+ * Map items through an async fn with at most `limit` calls in flight.
+ * Results keep the input order.
+ */
+async function mapWithConcurrency(items, limit, fn) {
+    const results = new Array(items.length);
+    let next = 0;
+
+    async function worker() {
+        while (next < items.length) {
+            const i = next++;
+            results[i] = await fn(items[i], i);
+        }
+    }
+
+    const workers = Array.from({ length: Math.min(Math.max(limit, 1), items.length) }, worker);
+    await Promise.all(workers);
+    return results;
+}
+
+module.exports = { mapWithConcurrency };
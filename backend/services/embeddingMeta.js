@@ -0,0 +1,34 @@
+/**
+ * Embedding Metadata
+ * Content hash and model identity stored next to every embedding, so the
+ * re-embedding job (reembed.py) can skip documents that are already current.
+ */
+const crypto = require("crypto");
+
+const MODEL_NAME = process.env.EMBEDDING_MODEL || "sentence-transformers/all-MiniLM-L6-v2";
+const MODEL_VERSION = process.env.EMBEDDING_MODEL_VERSION || "1";
+// The API stores only the (pooled or truncated) document vector, never per-chunk vectors
+const CHUNKING_MODE = process.env.EMBEDDING_CHUNKING || "pooled";
+const CHUNKING = CHUNKING_MODE === "chunks" ? "pooled" : CHUNKING_MODE;
+
+/**
+ * Must match embedding_cache.normalize_text: NFC, trimmed, single-spaced
+ */
+function normalizeText(text) {
+    return text.normalize("NFC").split(/\s+/).filter(Boolean).join(" ");
+}
+
+function contentHash(text) {
+    return crypto.createHash("sha256").update(normalizeText(text), "utf8").digest("hex");
+}
+
+function embeddingMeta(content) {
+    return {
+        content_hash: contentHash(content),
+        embedding_model: MODEL_NAME,
+        embedding_model_version: MODEL_VERSION,
+        embedding_chunking: CHUNKING,
+    };
+}
+
+module.exports = { contentHash, embeddingMeta, normalizeText };
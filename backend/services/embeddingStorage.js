@@ -0,0 +1,102 @@
+/**
+ * Embedding Storage
+ * Encodes an embedding for MongoDB in the configured EMBEDDING_STORAGE mode.
+ * Must match quantization.encode_embedding on the Python side:
+ *   float32 — plain array of doubles
+ *   int8    — BSON vector (subtype 9, INT8) + per-vector embedding_scale
+ *   float16 — generic binary of little-endian halves
+ * Compact modes also store embedding_bits, a packed sign-bit sketch.
+ */
+const { Binary } = require("mongodb");
+
+const EMBEDDING_STORAGE = (process.env.EMBEDDING_STORAGE || "float32").toLowerCase();
+
+const BSON_VECTOR_SUBTYPE = 9;
+const DTYPE_INT8 = 0x03;
+const DTYPE_PACKED_BIT = 0x10;
+
+const f32 = new Float32Array(1);
+const u32 = new Uint32Array(f32.buffer);
+
+/**
+ * IEEE 754 float32 → float16 bits, round-to-nearest-even
+ */
+function floatToHalf(value) {
+    f32[0] = value;
+    const x = u32[0];
+    const sign = (x >>> 16) & 0x8000;
+    const exp = (x >>> 23) & 0xff;
+    let mant = x & 0x7fffff;
+    if (exp === 0xff) return sign | 0x7c00 | (mant ? 0x200 : 0);
+    const e = exp - 112;
+    if (e >= 0x1f) return sign | 0x7c00;
+    if (e <= 0) {
+        // Subnormal half (or underflow to zero)
+        if (e < -10) return sign;
+        mant |= 0x800000;
+        const shift = 14 - e;
+        let half = mant >>> shift;
+        const rem = mant & ((1 << shift) - 1);
+        const mid = 1 << (shift - 1);
+        if (rem > mid || (rem === mid && (half & 1))) half++;
+        return sign | half;
+    }
+    let half = (e << 10) | (mant >>> 13);
+    const rem = mant & 0x1fff;
+    if (rem > 0x1000 || (rem === 0x1000 && (half & 1))) half++;
+    return sign | half;
+}
+
+/**
+ * Packed sign bits, most significant bit first (numpy.packbits order)
+ */
+function signBits(embedding) {
+    const bytes = Buffer.alloc(Math.ceil(embedding.length / 8));
+    embedding.forEach((x, i) => {
+        if (x > 0) bytes[i >> 3] |= 0x80 >> (i & 7);
+    });
+    return bytes;
+}
+
+function quantizeInt8(embedding) {
+    let max = 0;
+    for (const x of embedding) max = Math.max(max, Math.abs(x));
+    const scale = max > 0 ? max / 127 : 1;
+    const codes = Buffer.alloc(embedding.length);
+    embedding.forEach((x, i) => {
+        codes.writeInt8(Math.max(-127, Math.min(127, Math.round(x / scale))), i);
+    });
+    return { codes, scale };
+}
+
+/**
+ * Fields to store for one embedding (spread into the document)
+ */
+function storedEmbedding(embedding, mode = EMBEDDING_STORAGE) {
+    if (mode === "float32") {
+        return { embedding, embedding_storage: mode };
+    }
+
+    const padding = (8 - (embedding.length % 8)) % 8;
+    const fields = {
+        embedding_storage: mode,
+        embedding_bits: new Binary(
+            Buffer.concat([Buffer.from([DTYPE_PACKED_BIT, padding]), signBits(embedding)]),
+            BSON_VECTOR_SUBTYPE
+        ),
+    };
+    if (mode === "int8") {
+        const { codes, scale } = quantizeInt8(embedding);
+        fields.embedding = new Binary(Buffer.concat([Buffer.from([DTYPE_INT8, 0]), codes]), BSON_VECTOR_SUBTYPE);
+        fields.embedding_scale = scale;
+    } else if (mode === "float16") {
+        const halves = Buffer.alloc(embedding.length * 2);
+        embedding.forEach((x, i) => halves.writeUInt16LE(floatToHalf(x), i * 2));
+        fields.embedding = new Binary(halves, 0);
+    } else {
+        throw new Error(`Unknown EMBEDDING_STORAGE '${mode}' (expected float32, int8 or float16)`);
+    }
+    return fields;
+}
+
+module.exports = { storedEmbedding, EMBEDDING_STORAGE };
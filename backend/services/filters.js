@@ -0,0 +1,49 @@
+/**
+ * Search Filters
+ * Validates request filters and turns them into an Atlas $vectorSearch
+ * pre-filter (mirrors filters.py in the NLP service, which applies the same
+ * filters to its local vector and BM25 indexes)
+ */
+
+// attribute → document paths it is read from; each path must be a "filter"
+// field of the Atlas vector index
+const FILTER_FIELDS = {
+    category: ["category", "metadata.category"],
+    difficulty: ["metadata.difficulty", "difficulty"],
+};
+
+/**
+ * Normalize { attribute: value | [values] } to { attribute: [values] };
+ * null when there is nothing to filter on. Throws on invalid input.
+ */
+function parseFilter(filter) {
+    if (filter === undefined || filter === null) return null;
+    if (typeof filter !== "object" || Array.isArray(filter)) {
+        throw new Error("'filter' must be an object of attribute → value(s)");
+    }
+    const filters = {};
+    for (const [field, value] of Object.entries(filter)) {
+        if (!FILTER_FIELDS[field]) {
+            throw new Error(`Unknown filter attribute '${field}' (filterable: ${Object.keys(FILTER_FIELDS).join(", ")})`);
+        }
+        const values = Array.isArray(value) ? value : [value];
+        if (values.length === 0 || values.some((v) => typeof v !== "string" || !v)) {
+            throw new Error(`Filter '${field}' needs a non-empty string or array of strings`);
+        }
+        filters[field] = values;
+    }
+    return Object.keys(filters).length > 0 ? filters : null;
+}
+
+/**
+ * $vectorSearch `filter`: every attribute must match one of its values on
+ * any of its document paths
+ */
+function atlasFilter(filters) {
+    const clauses = Object.entries(filters).map(([field, values]) => ({
+        $or: FILTER_FIELDS[field].map((path) => ({ [path]: { $in: values } })),
+    }));
+    return clauses.length === 1 ? clauses[0] : { $and: clauses };
+}
+
+module.exports = { FILTER_FIELDS, parseFilter, atlasFilter };
@@ -0,0 +1,67 @@
+/**
+ * Result Fusion
+ * Merge ranked hit lists from independent retrievers (vector, BM25) into one
+ */
+
+const RRF_K = parseInt(process.env.HYBRID_RRF_K) || 60;
+
+/**
+ * Reciprocal rank fusion: score(d) = Σ_legs 1 / (k + rank_leg(d)).
+ * Uses ranks only, so cosine and BM25 scales never need reconciling.
+ * legs: { name: [{ id, score }] } (best first)
+ */
+function reciprocalRankFusion(legs, k = RRF_K) {
+    const fused = new Map();
+    for (const [name, hits] of Object.entries(legs)) {
+        hits.forEach((hit, i) => {
+            const entry = fused.get(hit.id) || { id: hit.id, score: 0, ranks: {}, scores: {} };
+            entry.score += 1 / (k + i + 1);
+            entry.ranks[name] = i + 1;
+            entry.scores[name] = hit.score;
+            fused.set(hit.id, entry);
+        });
+    }
+    return [...fused.values()].sort((a, b) => b.score - a.score);
+}
+
+/**
+ * Weighted fusion: Σ_legs weight_leg · minmax(score_leg(d)).
+ * Each leg's scores are min-max normalised to [0, 1] first; a document a leg
+ * did not return contributes 0 for that leg.
+ * weights: { name: weight }
+ */
+function weightedFusion(legs, weights) {
+    const fused = new Map();
+    for (const [name, hits] of Object.entries(legs)) {
+        if (hits.length === 0) continue;
+        const scores = hits.map((h) => h.score);
+        const lo = Math.min(...scores);
+        const span = Math.max(...scores) - lo;
+        hits.forEach((hit, i) => {
+            const entry = fused.get(hit.id) || { id: hit.id, score: 0, ranks: {}, scores: {} };
+            entry.score += (weights[name] ?? 1) * (span > 0 ? (hit.score - lo) / span : 1);
+            entry.ranks[name] = i + 1;
+            entry.scores[name] = hit.score;
+            fused.set(hit.id, entry);
+        });
+    }
+    return [...fused.values()].sort((a, b) => b.score - a.score);
+}
+
+/**
+ * Per-leg contribution to the final top-k: how many results the leg ranked
+ * at all, and how many only that leg found
+ */
+function contributions(fused, legNames) {
+    const out = {};
+    for (const name of legNames) {
+        const ranked = fused.filter((f) => name in f.ranks);
+        out[name] = {
+            contributed: ranked.length,
+            unique: ranked.filter((f) => Object.keys(f.ranks).length === 1).length,
+        };
+    }
+    return out;
+}
+
+module.exports = { RRF_K, reciprocalRankFusion, weightedFusion, contributions };
@@ -0,0 +1,139 @@
+/**
+ * Metrics
+ * In-process counters, gauges and fixed-bucket histograms for the Express API,
+ * exposed in the Prometheus text format (mirrors metrics.py in the NLP service)
+ */
+
+const STAGE_MS_BUCKETS = [0.5, 1, 2, 5, 10, 20, 50, 100, 250, 500, 1000, 2500, 10000];
+
+function header(name, help, type) {
+    return [...(help ? [`# HELP ${name} ${help}`] : []), `# TYPE ${name} ${type}`];
+}
+
+/**
+ * Monotonic counter; `func` reads the value from elsewhere instead
+ */
+class Counter {
+    constructor(name, help, func) {
+        this.name = name;
+        this.help = help;
+        this.func = func;
+        this.value = 0;
+    }
+
+    inc(amount = 1) {
+        this.value += amount;
+    }
+
+    snapshot() {
+        return this.func ? this.func() : this.value;
+    }
+
+    prometheus() {
+        return [...header(this.name, this.help, "counter"), `${this.name} ${this.snapshot()}`];
+    }
+}
+
+class Gauge extends Counter {
+    set(value) {
+        this.value = value;
+    }
+
+    prometheus() {
+        return [...header(this.name, this.help, "gauge"), `${this.name} ${this.snapshot()}`];
+    }
+}
+
+/**
+ * Cumulative histogram over fixed upper bounds
+ */
+class Histogram {
+    constructor(name, buckets, help) {
+        this.name = name;
+        this.help = help;
+        this.buckets = [...buckets].sort((a, b) => a - b);
+        this.counts = new Array(this.buckets.length + 1).fill(0); // last slot is +Inf
+        this.sum = 0;
+        this.count = 0;
+    }
+
+    observe(value) {
+        this.sum += value;
+        this.count += 1;
+        const i = this.buckets.findIndex((bound) => value <= bound);
+        this.counts[i === -1 ? this.buckets.length : i] += 1;
+    }
+
+    snapshot() {
+        let running = 0;
+        const buckets = {};
+        this.buckets.forEach((bound, i) => {
+            running += this.counts[i];
+            buckets[String(bound)] = running;
+        });
+        buckets["+Inf"] = this.count;
+        return { count: this.count, sum: this.sum, mean: this.count ? this.sum / this.count : null, buckets };
+    }
+
+    prometheus() {
+        const lines = header(this.name, this.help, "histogram");
+        let running = 0;
+        this.buckets.forEach((bound, i) => {
+            running += this.counts[i];
+            lines.push(`${this.name}_bucket{le="${bound}"} ${running}`);
+        });
+        lines.push(`${this.name}_bucket{le="+Inf"} ${this.count}`);
+        lines.push(`${this.name}_sum ${this.sum}`);
+        lines.push(`${this.name}_count ${this.count}`);
+        return lines;
+    }
+}
+
+class Registry {
+    constructor() {
+        this.metrics = new Map();
+    }
+
+    register(metric) {
+        const name = metric.name.replace(/[^a-zA-Z0-9_:]/g, "_");
+        if (!this.metrics.has(name)) {
+            metric.name = name;
+            this.metrics.set(name, metric);
+        }
+        return this.metrics.get(name);
+    }
+
+    counter(name, help, func) {
+        return this.register(new Counter(name, help, func));
+    }
+
+    gauge(name, help, func) {
+        return this.register(new Gauge(name, help, func));
+    }
+
+    histogram(name, buckets, help) {
+        return this.register(new Histogram(name, buckets, help));
+    }
+
+    snapshot() {
+        return Object.fromEntries([...this.metrics].map(([name, m]) => [name, m.snapshot()]));
+    }
+
+    prometheus() {
+        const names = [...this.metrics.keys()].sort();
+        return names.flatMap((name) => this.metrics.get(name).prometheus()).join("\n") + "\n";
+    }
+}
+
+const REGISTRY = new Registry();
+const PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8";
+
+/**
+ * /metrics negotiation: ?format=json|prometheus wins, else JSON only when asked for
+ */
+function wantsPrometheus(accept, format) {
+    if (format) return format !== "json";
+    return !(accept || "").includes("application/json");
+}
+
+module.exports = { REGISTRY, STAGE_MS_BUCKETS, PROMETHEUS_CONTENT_TYPE, wantsPrometheus };
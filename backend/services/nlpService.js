@@ -3,20 +3,103 @@
  * HTTP client for communicating with the Python NLP microservice
  */
 const axios = require("axios");
+const { TRACE_HEADER, currentTrace, timeStage } = require("./tracing");
 
 const NLP_URL = process.env.NLP_SERVICE_URL || "http://localhost:5001";
 
+// "json" (default), "float32" or "float16" — binary formats skip JSON float lists
+const WIRE_FORMAT = (process.env.NLP_WIRE_FORMAT || "json").toLowerCase();
+const BINARY_ACCEPT = {
+    float32: "application/octet-stream; dtype=float32",
+    float16: "application/octet-stream; dtype=float16",
+};
+
+// Must match wire_format.py: magic, version, dtype, reserved, count, dim
+const HEADER_SIZE = 16;
+const MAGIC = "EMBV";
+
+/**
+ * Convert one IEEE 754 half-precision value to a JS number
+ */
+function halfToFloat(h) {
+    const sign = h & 0x8000 ? -1 : 1;
+    const exp = (h >> 10) & 0x1f;
+    const frac = h & 0x3ff;
+    if (exp === 0) return sign * Math.pow(2, -14) * (frac / 1024);
+    if (exp === 0x1f) return frac ? NaN : sign * Infinity;
+    return sign * Math.pow(2, exp - 15) * (1 + frac / 1024);
+}
+
+/**
+ * Decode a binary embedding buffer into an array of number arrays
+ */
+function decodeEmbeddings(data) {
+    const buf = Buffer.isBuffer(data) ? data : Buffer.from(data);
+    if (buf.length < HEADER_SIZE || buf.toString("latin1", 0, 4) !== MAGIC) {
+        throw new Error("Invalid binary embedding payload");
+    }
+    const dtypeCode = buf.readUInt8(5);
+    const count = buf.readUInt32LE(8);
+    const dim = buf.readUInt32LE(12);
+    const itemSize = dtypeCode === 2 ? 2 : 4;
+    if (buf.length !== HEADER_SIZE + count * dim * itemSize) {
+        throw new Error("Truncated binary embedding payload");
+    }
+
+    const vectors = new Array(count);
+    for (let i = 0; i < count; i++) {
+        const row = new Array(dim);
+        const base = HEADER_SIZE + i * dim * itemSize;
+        for (let j = 0; j < dim; j++) {
+            row[j] = itemSize === 4
+                ? buf.readFloatLE(base + j * 4)
+                : halfToFloat(buf.readUInt16LE(base + j * 2));
+        }
+        vectors[i] = row;
+    }
+    return vectors;
+}
+
+/**
+ * POST to the NLP service as one traced stage: forwards X-Trace-Id and folds
+ * the service's Server-Timing breakdown into the request's trace as nlp.*
+ */
+function tracedPost(stage, path, body, options = {}) {
+    return timeStage(stage, async () => {
+        const trace = currentTrace();
+        const headers = { ...(options.headers || {}), ...(trace ? { [TRACE_HEADER]: trace.id } : {}) };
+        const response = await axios.post(`${NLP_URL}${path}`, body, { ...options, headers });
+        if (trace) trace.mergeServerTiming("nlp", response.headers["server-timing"]);
+        return response;
+    });
+}
+
+/**
+ * POST to the NLP service, negotiating the binary format when enabled
+ */
+async function postEmbed(path, body, timeout) {
+    const accept = BINARY_ACCEPT[WIRE_FORMAT];
+    // The async NLP service drops queued work once this deadline has passed
+    const headers = { "X-Request-Timeout-Ms": String(timeout) };
+    if (!accept) {
+        const response = await tracedPost("embed_http", path, body, { timeout, headers });
+        return response.data.embeddings || [response.data.embedding];
+    }
+    const response = await tracedPost("embed_http", path, body, {
+        timeout,
+        responseType: "arraybuffer",
+        headers: { ...headers, Accept: accept },
+    });
+    return decodeEmbeddings(response.data);
+}
+
 /**
  * Generate embedding for a single text
  */
 async function generateEmbedding(text) {
     try {
-        const response = await axios.post(
-            `${NLP_URL}/embed`,
-            { text },
-            { timeout: 30000 }
-        );
-        return response.data.embedding;
+        const [embedding] = await postEmbed("/embed", { text }, 30000);
+        return embedding;
     } catch (error) {
         console.error("NLP Service embed error:", error.message);
         throw new Error("Failed to generate embedding from NLP service");
@@ -28,18 +111,91 @@ async function generateEmbedding(text) {
  */
 async function generateEmbeddingsBatch(texts) {
     try {
-        const response = await axios.post(
-            `${NLP_URL}/embed-batch`,
-            { texts },
-            { timeout: 60000 }
-        );
-        return response.data.embeddings;
+        return await postEmbed("/embed-batch", { texts }, 60000);
     } catch (error) {
         console.error("NLP Service batch embed error:", error.message);
         throw new Error("Failed to generate batch embeddings from NLP service");
     }
 }
 
+/**
+ * Top-k search against the NLP service's local vector index, optionally
+ * restricted by a filter ({ attribute: [values] })
+ * Returns { results: [{ id, score }], index_size, search_ms }
+ */
+async function searchIndex(vector, topK, threshold, filter) {
+    const response = await tracedPost("local_search_http", "/search",
+        { vector, top_k: topK, threshold, filter },
+        { timeout: 10000 }
+    );
+    return response.data;
+}
+
+/**
+ * Batched top-k search: one matrix-matrix product over the same index snapshot
+ * Returns { batch_results: [[{ id, score }]], index_size, search_ms }, plus
+ * shards: { answered, total } when the index is sharded
+ */
+async function searchIndexBatch(vectors, topK, threshold, filter) {
+    const response = await tracedPost("local_search_http", "/search",
+        { vectors, top_k: topK, threshold, filter },
+        { timeout: 30000 }
+    );
+    return response.data;
+}
+
+/**
+ * BM25 top-k over title + content from the NLP service's lexical index
+ * Returns { results: [{ id, score }], index_size, search_ms }
+ */
+async function searchLexical(query, topK, filter) {
+    const response = await tracedPost("lexical_http", "/lexical/search",
+        { query, top_k: topK, filter },
+        { timeout: 10000 }
+    );
+    return response.data;
+}
+
+/**
+ * Keep the local vector and BM25 indexes in sync with MongoDB writes.
+ * Failures are logged, not thrown — MongoDB stays the source of truth and
+ * the index is rebuilt from it on the next NLP service restart.
+ */
+async function syncIndex(path, body) {
+    try {
+        await axios.post(`${NLP_URL}${path}`, body, { timeout: 10000 });
+    } catch (error) {
+        console.warn(`Local index sync (${path}) failed:`, error.message);
+    }
+}
+
+function indexUpsert(documents) {
+    return syncIndex("/index/upsert", { documents });
+}
+
+function indexDelete(ids) {
+    return syncIndex("/index/delete", { ids });
+}
+
+function indexClear() {
+    return syncIndex("/index/clear", {});
+}
+
+/**
+ * documents: [{ id, title, content, category?, metadata? }]
+ */
+function lexicalUpsert(documents) {
+    return syncIndex("/lexical/upsert", { documents });
+}
+
+function lexicalDelete(ids) {
+    return syncIndex("/lexical/delete", { ids });
+}
+
+function lexicalClear() {
+    return syncIndex("/lexical/clear", {});
+}
+
 /**
  * Check NLP service health
  */
@@ -52,4 +208,18 @@ async function checkHealth() {
     }
 }
 
-module.exports = { generateEmbedding, generateEmbeddingsBatch, checkHealth };
+module.exports = {
+    generateEmbedding,
+    generateEmbeddingsBatch,
+    checkHealth,
+    decodeEmbeddings,
+    searchIndex,
+    searchIndexBatch,
+    indexUpsert,
+    indexDelete,
+    indexClear,
+    searchLexical,
+    lexicalUpsert,
+    lexicalDelete,
+    lexicalClear,
+};
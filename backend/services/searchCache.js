@@ -0,0 +1,142 @@
+/**
+ * Search Result Cache
+ * TTL + LRU cache of search responses keyed by (normalized query, parameters,
+ * collection version), with single-flight de-duplication of identical
+ * in-flight queries.
+ *
+ * Every write to the collection (document add/delete, sample data, clear)
+ * bumps the version, so no entry computed before a write is served after it.
+ * The version is per process: with several API instances behind a balancer,
+ * keep SEARCH_CACHE_TTL_MS short enough that cross-instance staleness is
+ * acceptable.
+ */
+const { normalizeText } = require("./embeddingMeta");
+const { REGISTRY } = require("./metrics");
+
+const TTL_MS = parseInt(process.env.SEARCH_CACHE_TTL_MS ?? "60000");
+const MAX_ENTRIES = parseInt(process.env.SEARCH_CACHE_MAX_ENTRIES) || 1000;
+
+class SearchCache {
+    constructor({ ttlMs = TTL_MS, maxEntries = MAX_ENTRIES } = {}) {
+        this.ttlMs = ttlMs;
+        this.maxEntries = maxEntries;
+        this.version = 0;
+        this.entries = new Map();   // key → { value, expires, computeMs }, oldest first
+        this.inflight = new Map();  // key → Promise
+        this.counters = { hits: 0, misses: 0, coalesced: 0, evictions: 0, expirations: 0, invalidations: 0 };
+        this.savedMs = 0;
+        this.computeMs = 0;
+    }
+
+    get enabled() {
+        return this.ttlMs > 0;
+    }
+
+    /**
+     * Cache key for a route: the query is normalized (NFC, trimmed, single-spaced)
+     */
+    key(route, query, params) {
+        return JSON.stringify([route, normalizeText(String(query)), params, this.version]);
+    }
+
+    /**
+     * Drop every entry; called after each write to the collection
+     */
+    bumpVersion() {
+        this.version += 1;
+        this.entries.clear();
+        this.counters.invalidations += 1;
+    }
+
+    lookup(key) {
+        const entry = this.entries.get(key);
+        if (!entry) return undefined;
+        if (entry.expires <= Date.now()) {
+            this.entries.delete(key);
+            this.counters.expirations += 1;
+            return undefined;
+        }
+        // Refresh recency
+        this.entries.delete(key);
+        this.entries.set(key, entry);
+        return entry;
+    }
+
+    store(key, value, computeMs) {
+        this.entries.set(key, { value, expires: Date.now() + this.ttlMs, computeMs });
+        while (this.entries.size > this.maxEntries) {
+            this.entries.delete(this.entries.keys().next().value);
+            this.counters.evictions += 1;
+        }
+    }
+
+    /**
+     * Return the cached value for `key`, join an identical in-flight
+     * computation, or run `compute()` once. Resolves to { value, cache } with
+     * cache "hit", "coalesced" or "miss". `cacheable(value)` can veto storing
+     * a result (e.g. a degraded one).
+     */
+    async getOrCompute(key, compute, cacheable = () => true) {
+        if (!this.enabled) {
+            return { value: await compute(), cache: "off" };
+        }
+
+        const entry = this.lookup(key);
+        if (entry) {
+            this.counters.hits += 1;
+            this.savedMs += entry.computeMs;
+            return { value: entry.value, cache: "hit" };
+        }
+
+        const pending = this.inflight.get(key);
+        if (pending) {
+            this.counters.coalesced += 1;
+            return { value: await pending, cache: "coalesced" };
+        }
+
+        this.counters.misses += 1;
+        const version = this.version;
+        const started = Date.now();
+        const promise = (async () => {
+            try {
+                const value = await compute();
+                const elapsed = Date.now() - started;
+                this.computeMs += elapsed;
+                // A write landed mid-computation: the result may predate it
+                if (version === this.version && cacheable(value)) this.store(key, value, elapsed);
+                return value;
+            } finally {
+                this.inflight.delete(key);
+            }
+        })();
+        this.inflight.set(key, promise);
+        return { value: await promise, cache: "miss" };
+    }
+
+    stats() {
+        const { hits, misses, coalesced } = this.counters;
+        const lookups = hits + misses + coalesced;
+        return {
+            enabled: this.enabled,
+            ttl_ms: this.ttlMs,
+            max_entries: this.maxEntries,
+            entries: this.entries.size,
+            inflight: this.inflight.size,
+            version: this.version,
+            ...this.counters,
+            hit_ratio: lookups ? parseFloat(((hits + coalesced) / lookups).toFixed(4)) : 0,
+            saved_ms: this.savedMs,
+            avg_miss_ms: misses ? parseFloat((this.computeMs / misses).toFixed(2)) : 0,
+        };
+    }
+}
+
+const searchCache = new SearchCache();
+
+for (const name of ["hits", "misses", "coalesced", "evictions", "expirations", "invalidations"]) {
+    REGISTRY.counter(`api_search_cache_${name}_total`, `Search cache ${name}`, () => searchCache.counters[name]);
+}
+REGISTRY.counter("api_search_cache_saved_ms_total", "Search time saved by cache hits", () => searchCache.savedMs);
+REGISTRY.gauge("api_search_cache_entries", "Cached search responses", () => searchCache.entries.size);
+
+module.exports = { SearchCache, searchCache };
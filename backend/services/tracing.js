@@ -0,0 +1,129 @@
+/**
+ * Request Tracing
+ * Per-request stage timings for the search path.
+ *
+ * Each API request gets a Trace (id from an incoming X-Trace-Id, else a new
+ * one) held in AsyncLocalStorage, so any code on the request's async path can
+ * time a stage without threading the trace through arguments. Calls to the
+ * NLP service forward X-Trace-Id and fold the service's Server-Timing stages
+ * (queue, tokenize, forward, search ...) into the same trace as "nlp.<stage>".
+ * Every stage also feeds an `api_stage_<name>_ms` histogram.
+ */
+const { AsyncLocalStorage } = require("async_hooks");
+const crypto = require("crypto");
+const { REGISTRY, STAGE_MS_BUCKETS } = require("./metrics");
+
+const TRACE_HEADER = "X-Trace-Id";
+const storage = new AsyncLocalStorage();
+
+class Trace {
+    constructor(id) {
+        this.id = id || crypto.randomBytes(8).toString("hex");
+        this.started = process.hrtime.bigint();
+        this.stages = {};   // name → ms, summed when a stage repeats
+        this.counts = {};
+    }
+
+    add(name, ms) {
+        this.stages[name] = (this.stages[name] || 0) + ms;
+    }
+
+    /**
+     * Fold a Server-Timing header ("a;dur=1.2, tokens;desc=\"40\"") in under `prefix`
+     */
+    mergeServerTiming(prefix, header) {
+        if (!header) return;
+        for (const entry of header.split(",")) {
+            const [name, ...params] = entry.trim().split(";");
+            if (!name) continue;
+            for (const param of params) {
+                const [key, raw] = param.trim().split("=");
+                const value = parseFloat((raw || "").replace(/"/g, ""));
+                if (Number.isNaN(value)) continue;
+                if (key === "dur") this.add(`${prefix}.${name}`, value);
+                else if (key === "desc") this.counts[`${prefix}.${name}`] = (this.counts[`${prefix}.${name}`] || 0) + value;
+            }
+        }
+    }
+
+    elapsedMs() {
+        return Number(process.hrtime.bigint() - this.started) / 1e6;
+    }
+
+    /**
+     * { id, total_ms, stages_ms, counts } for the response body
+     */
+    breakdown() {
+        const round = (ms) => parseFloat(ms.toFixed(3));
+        return {
+            id: this.id,
+            total_ms: round(this.elapsedMs()),
+            stages_ms: Object.fromEntries(Object.entries(this.stages).map(([k, v]) => [k, round(v)])),
+            counts: this.counts,
+        };
+    }
+
+    serverTiming() {
+        return Object.entries(this.stages)
+            .map(([name, ms]) => `${name.replace(/\./g, "_")};dur=${ms.toFixed(3)}`)
+            .join(", ");
+    }
+}
+
+function currentTrace() {
+    return storage.getStore();
+}
+
+function stageHistogram(name) {
+    return REGISTRY.histogram(`api_stage_${name}_ms`, STAGE_MS_BUCKETS, `Time spent in the ${name} stage`);
+}
+
+/**
+ * Time an async stage into its histogram and the current request's trace
+ */
+async function timeStage(name, fn) {
+    const started = process.hrtime.bigint();
+    try {
+        return await fn();
+    } finally {
+        const ms = Number(process.hrtime.bigint() - started) / 1e6;
+        stageHistogram(name).observe(ms);
+        const trace = currentTrace();
+        if (trace) trace.add(name, ms);
+    }
+}
+
+/**
+ * Whether the client asked for a timing breakdown in the response body
+ */
+function traceRequested(req) {
+    const flag = req.query.trace ?? req.body?.trace ?? req.get("X-Trace");
+    return flag === true || flag === "1" || flag === "true";
+}
+
+/**
+ * Express middleware: open a trace per request, echo X-Trace-Id and
+ * Server-Timing, and record the request duration per route
+ */
+function tracingMiddleware(req, res, next) {
+    const trace = new Trace(req.get(TRACE_HEADER));
+    res.setHeader(TRACE_HEADER, trace.id);
+
+    // Headers must be set before they are sent, so hook writeHead
+    const writeHead = res.writeHead;
+    res.writeHead = function (...args) {
+        const timing = trace.serverTiming();
+        if (timing && !res.headersSent) res.setHeader("Server-Timing", timing);
+        return writeHead.apply(this, args);
+    };
+    res.on("finish", () => {
+        if (!req.route) return;
+        const route = `${req.baseUrl}${req.route.path}`.replace(/^\/api\/?/, "")
+            .replace(/[^a-zA-Z0-9]+/g, "_").replace(/^_+|_+$/g, "") || "root";
+        REGISTRY.histogram(`api_request_${req.method.toLowerCase()}_${route}_ms`, STAGE_MS_BUCKETS,
+            `${req.method} ${req.baseUrl}${req.route.path} duration`).observe(trace.elapsedMs());
+    });
+    storage.run(trace, next);
+}
+
+module.exports = { TRACE_HEADER, Trace, currentTrace, timeStage, traceRequested, tracingMiddleware };
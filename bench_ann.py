@@ -0,0 +1,92 @@
+"""
+Benchmark: IVF-flat local index vs. exact brute force.
+
+Generates a clustered synthetic corpus (unit vectors around random topic
+centres, like sentence embeddings), computes exact top-k as ground truth,
+then sweeps nprobe and reports recall@k against per-query latency.
+
+Usage:
+    python bench_ann.py
+    python bench_ann.py --docs 200000 --dim 384 --queries 500 --k 10
+"""
+import argparse
+import time
+
+import numpy as np
+
+from vector_index import IVFIndex, normalize, top_k
+
+NPROBES = [1, 2, 4, 8, 16, 32, 64]
+
+
+def synthetic_corpus(n, dim, topics, seed=0):
+    """Unit vectors scattered around `topics` random centres."""
+    rng = np.random.default_rng(seed)
+    centres = normalize(rng.standard_normal((topics, dim)))
+    labels = rng.integers(0, topics, size=n)
+    noise = rng.standard_normal((n, dim)).astype(np.float32) * (1.0 / np.sqrt(dim)) * 0.9
+    return normalize(centres[labels] + noise)
+
+
+def latency_stats(samples_ms):
+    arr = np.asarray(samples_ms)
+    return float(np.mean(arr)), float(np.percentile(arr, 50)), float(np.percentile(arr, 99))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("=" * 72)
+    print(f"🔎 ANN BENCHMARK — {args.docs:,} docs × {args.dim} dims, {args.queries} queries, k={args.k}")
+    print("=" * 72)
+
+    corpus = synthetic_corpus(args.docs, args.dim, args.topics, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = normalize(corpus[rng.choice(args.docs, args.queries, replace=False)]
+                        + rng.standard_normal((args.queries, args.dim)).astype(np.float32) * 0.02)
+    ids = [str(i) for i in range(args.docs)]
+
+    # Ground truth: exact brute force
+    truth, exact_ms = [], []
+    for q in queries:
+        start = time.perf_counter()
+        best = top_k(corpus @ q, args.k)
+        exact_ms.append((time.perf_counter() - start) * 1000.0)
+        truth.append(set(best.tolist()))
+    mean, p50, p99 = latency_stats(exact_ms)
+    print(f"\n{'method':>14} {'recall@k':>9} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'speedup':>8}")
+    print(f"{'exact':>14} {1.0:>9.4f} {mean:>9.3f} {p50:>9.3f} {p99:>9.3f} {1.0:>7.1f}x")
+    exact_mean = mean
+
+    start = time.perf_counter()
+    index = IVFIndex(args.dim, seed=args.seed)
+    index.build(ids, corpus)
+    build_s = time.perf_counter() - start
+
+    for nprobe in NPROBES:
+        if index.is_trained and nprobe > index.centroids.shape[0]:
+            break
+        hits, samples = 0, []
+        for q, expected in zip(queries, truth):
+            start = time.perf_counter()
+            found = index.search(q, args.k, nprobe=nprobe)
+            samples.append((time.perf_counter() - start) * 1000.0)
+            hits += len(expected & {int(doc_id) for doc_id, _ in found})
+        recall = hits / (args.k * len(queries))
+        mean, p50, p99 = latency_stats(samples)
+        label = f"ivf nprobe={nprobe}"
+        print(f"{label:>14} {recall:>9.4f} {mean:>9.3f} {p50:>9.3f} {p99:>9.3f} {exact_mean / mean:>7.1f}x")
+
+    print(f"\n🏗️  Index build: {build_s:.2f}s, {index.stats()['nlist']} lists")
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark: length-bucketed vs. naive batching of chunked documents.
+
+Builds a synthetic corpus with a long-tailed length distribution (most
+documents short, a few far past the model's max sequence length), splits
+it into token windows, then encodes the windows
+  • naive    — batches of --batch-size in arrival order
+  • bucketed — the same batches after sorting windows by token count
+and reports padding efficiency (real / padded tokens) and windows/s.
+
+Usage:
+    python bench_chunking.py
+    python bench_chunking.py --docs 2000 --batch-size 32 --max-tokens 254 --overlap 32
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from chunking import Chunker, encode_bucketed, padding_efficiency
+
+MODEL_NAME = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+WORDS = ("vector search semantic embedding model query document index cluster "
+         "latency throughput database retrieval language neural network").split()
+
+
+def synthetic_documents(n, seed=0):
+    """Documents with log-normal word counts (median ~80 words, long tail past 1,000)."""
+    rng = np.random.default_rng(seed)
+    lengths = np.clip(rng.lognormal(mean=4.4, sigma=1.0, size=n), 5, 4000).astype(int)
+    return [" ".join(WORDS[(i * 7 + j) % len(WORDS)] for j in range(length)) + f" #{i}"
+            for i, length in enumerate(lengths)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--max-tokens", type=int, default=None, help="Window size (default: model limit)")
+    parser.add_argument("--overlap", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(MODEL_NAME)
+    chunker = Chunker.from_model(model, args.max_tokens, args.overlap)
+
+    docs = synthetic_documents(args.docs, args.seed)
+    pieces, lengths = [], []
+    for text in docs:
+        for start, end, n_tokens in chunker.windows(text):
+            pieces.append(text[start:end])
+            lengths.append(n_tokens)
+    long_docs = sum(1 for text in docs if len(chunker.windows(text)) > 1)
+
+    print("=" * 64)
+    print(f"✂️  CHUNKING BENCHMARK — {MODEL_NAME}")
+    print(f"   {len(docs):,} docs → {len(pieces):,} windows of ≤{chunker.max_tokens} tokens "
+          f"(overlap {chunker.overlap}); {long_docs:,} docs needed splitting")
+    print(f"   {sum(lengths):,} tokens, batch size {args.batch_size}")
+    print("=" * 64)
+
+    encode_fn = lambda texts: model.encode(texts, batch_size=args.batch_size)
+    encode_fn(pieces[:args.batch_size])  # warm-up
+
+    # Naive: fixed batches in arrival order, one encode call each
+    start = time.perf_counter()
+    for i in range(0, len(pieces), args.batch_size):
+        encode_fn(pieces[i:i + args.batch_size])
+    naive_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    encode_bucketed(pieces, lengths, encode_fn, args.batch_size)
+    bucketed_s = time.perf_counter() - start
+
+    sorted_lengths = np.sort(lengths)
+    print(f"\n{'batching':>10} {'padding eff':>12} {'windows/s':>10} {'tokens/s':>10} {'speedup':>8}")
+    for label, seconds, eff in (
+        ("naive", naive_s, padding_efficiency(lengths, args.batch_size)),
+        ("bucketed", bucketed_s, padding_efficiency(sorted_lengths, args.batch_size)),
+    ):
+        print(f"{label:>10} {eff:>11.1%} {len(pieces) / seconds:>10,.0f} "
+              f"{sum(lengths) / seconds:>10,.0f} {naive_s / seconds:>7.2f}x")
+    print("=" * 64)
+
+
+if __name__ == "__main__":
+    main()
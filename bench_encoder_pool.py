@@ -0,0 +1,72 @@
+"""
+Benchmark: encoder throughput (texts/s) vs. number of worker processes.
+
+For each worker count from 1 to N, starts an EncoderPool (each worker pinned
+to its own CPU slice), warms it up, then encodes the same synthetic corpus
+in /embed-batch sized requests and reports texts/s and speedup over one
+worker. The in-process single-model path is measured as a baseline.
+
+Usage:
+    python bench_encoder_pool.py
+    python bench_encoder_pool.py --max-workers 8 --texts 4096 --request-size 256
+"""
+import argparse
+import os
+import time
+
+from encoder_pool import EncoderPool
+
+MODEL_NAME = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+WORDS = ("vector search semantic embedding model query document index cluster "
+         "latency throughput database retrieval language neural network").split()
+
+
+def synthetic_texts(n, words_per_text=40):
+    return [" ".join(WORDS[(i * 7 + j) % len(WORDS)] for j in range(words_per_text)) + f" #{i}"
+            for i in range(n)]
+
+
+def run(encode, texts, request_size):
+    start = time.perf_counter()
+    for i in range(0, len(texts), request_size):
+        encode(texts[i:i + request_size])
+    return len(texts) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--texts", type=int, default=2048)
+    parser.add_argument("--request-size", type=int, default=256, help="Texts per encode call")
+    args = parser.parse_args()
+
+    texts = synthetic_texts(args.texts)
+    print("=" * 64)
+    print(f"⚙️  ENCODER POOL BENCHMARK — {MODEL_NAME}")
+    print(f"   {args.texts} texts, {args.request_size} per request, {os.cpu_count()} CPUs")
+    print("=" * 64)
+
+    # Pools fork before torch is imported in this process, so measure them first
+    rows = []
+    for workers in range(1, args.max_workers + 1):
+        pool = EncoderPool(MODEL_NAME, workers)
+        pool.wait_ready()
+        pool.encode(texts[:args.request_size])  # warm-up
+        rows.append((workers, run(pool.encode, texts, args.request_size)))
+        pool.close()
+
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(MODEL_NAME)
+    model.encode(texts[:args.request_size])
+    baseline = run(lambda batch: model.encode(batch, batch_size=32), texts, args.request_size)
+
+    print(f"\n{'workers':>8} {'texts/s':>10} {'speedup':>8}")
+    print(f"{'inproc':>8} {baseline:>10,.0f} {1.0:>7.2f}x")
+    for workers, rate in rows:
+        print(f"{workers:>8} {rate:>10,.0f} {rate / baseline:>7.2f}x")
+    print("=" * 64)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark: encoder backends — parity with torch, then latency and throughput.
+
+Loads the model on each backend (see encoders.py; ONNX graphs are exported
+on first use) and
+  • parity: encodes a sample corpus (the seed documents, their titles, short
+    queries, and texts longer than max_seq_length) with every backend and
+    reports per-text cosine similarity to the torch embeddings, plus how
+    much of each query's top-10 neighbours the backend reproduces
+  • speed: encodes batches of 1, 8, 32 and 128 texts and reports latency per
+    batch (mean / p50 / p99) and texts/s
+
+Exits 1 when a backend's minimum cosine falls below --min-cosine.
+
+Usage:
+    python bench_encoders.py
+    python bench_encoders.py --backends torch onnx-int8 --batch-sizes 1 32 --rounds 50
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+from bench_ann import latency_stats
+from bench_encoder_pool import synthetic_texts
+from encoders import BACKENDS, DEFAULT_MODEL, load_encoder
+from seed import SEED_DOCUMENTS
+from vector_index import normalize, top_k
+
+load_dotenv()
+
+MODEL_NAME = os.getenv("EMBEDDING_MODEL", DEFAULT_MODEL)
+BATCH_SIZES = [1, 8, 32, 128]
+QUERIES = [
+    "how do neural networks learn", "database indexing performance", "healthy sleep habits",
+    "climate change effects", "investing for retirement", "GPT-4 and large language models",
+]
+
+
+def sample_corpus():
+    """Seed documents and titles, short queries, and long texts that hit truncation."""
+    texts = [d["content"] for d in SEED_DOCUMENTS] + [d["title"] for d in SEED_DOCUMENTS] + QUERIES
+    long = " ".join(d["content"] for d in SEED_DOCUMENTS[:6])
+    return texts + [long, long.upper(), "  padded   whitespace  "]
+
+
+def parity(reference, embeddings, n_queries):
+    """(mean cosine, min cosine, top-10 neighbour overlap) against the reference embeddings."""
+    cosine = np.sum(normalize(reference) * normalize(embeddings), axis=1)
+    corpus_ref, corpus = normalize(reference[n_queries:]), normalize(embeddings[n_queries:])
+    overlap = []
+    for q_ref, q in zip(normalize(reference[:n_queries]), normalize(embeddings[:n_queries])):
+        expected = set(top_k(corpus_ref @ q_ref, 10).tolist())
+        overlap.append(len(expected & set(top_k(corpus @ q, 10).tolist())) / len(expected))
+    return float(cosine.mean()), float(cosine.min()), float(np.mean(overlap))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=BATCH_SIZES)
+    parser.add_argument("--rounds", type=int, default=20, help="Timed batches per batch size")
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads per backend")
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    args = parser.parse_args()
+
+    print("=" * 72)
+    print(f"🧪 ENCODER BACKEND BENCHMARK — {args.model}, {os.cpu_count()} CPUs")
+    print("=" * 72)
+
+    encoders = {}
+    for backend in ["torch"] + [b for b in args.backends if b != "torch"]:
+        started = time.perf_counter()
+        encoders[backend] = load_encoder(args.model, backend, args.threads)
+        print(f"🤖 {backend:>10} loaded in {time.perf_counter() - started:.2f}s")
+
+    # ── Parity ───────────────────────────────────────────────
+    texts = QUERIES + sample_corpus()
+    reference = np.asarray(encoders["torch"].encode(texts, batch_size=32), dtype=np.float32)
+    print(f"\n🎯 Parity with torch over {len(texts)} texts ({len(QUERIES)} queries for top-10 overlap)")
+    print(f"{'backend':>10} {'mean cos':>10} {'min cos':>10} {'top-10':>8}")
+    failed = []
+    for backend in args.backends:
+        embeddings = np.asarray(encoders[backend].encode(texts, batch_size=32), dtype=np.float32)
+        mean, worst, overlap = parity(reference, embeddings, len(QUERIES))
+        flag = "" if worst >= args.min_cosine else "  ❌"
+        print(f"{backend:>10} {mean:>10.6f} {worst:>10.6f} {overlap:>7.1%}{flag}")
+        if worst < args.min_cosine:
+            failed.append(backend)
+
+    # ── Speed ────────────────────────────────────────────────
+    pool = synthetic_texts(max(args.batch_sizes) * 4)
+    print(f"\n⏱️  Latency per batch (ms) and throughput, {args.rounds} batches each")
+    print(f"{'backend':>10} {'batch':>6} {'mean':>9} {'p50':>9} {'p99':>9} {'texts/s':>10} {'vs torch':>9}")
+    baseline = {}
+    for backend in sorted(args.backends, key=lambda b: b != "torch"):
+        encoder = encoders[backend]
+        for size in args.batch_sizes:
+            batches = [[pool[(r * size + j) % len(pool)] for j in range(size)] for r in range(args.rounds)]
+            encoder.encode(batches[0], batch_size=size)  # warm-up for this shape
+            samples = []
+            for batch in batches:
+                start = time.perf_counter()
+                encoder.encode(batch, batch_size=size)
+                samples.append((time.perf_counter() - start) * 1000.0)
+            mean, p50, p99 = latency_stats(samples)
+            rate = size * 1000.0 / mean
+            baseline.setdefault(size, rate if backend == "torch" else None)
+            speedup = f"{rate / baseline[size]:>8.2f}x" if baseline[size] else f"{'—':>9}"
+            print(f"{backend:>10} {size:>6} {mean:>9.2f} {p50:>9.2f} {p99:>9.2f} {rate:>10,.0f} {speedup}")
+
+    print("=" * 72)
+    if failed:
+        print(f"❌ Below --min-cosine {args.min_cosine}: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
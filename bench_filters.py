@@ -0,0 +1,108 @@
+"""
+Benchmark: filtered vector search vs. post-filtering, across selectivities.
+
+Gives every document of a clustered synthetic corpus a `category` out of 1000
+buckets, then for each selectivity (fraction of the corpus a filter matches)
+compares, against exact top-k over the matching documents only:
+  • post-filter: unfiltered exact top (oversample × k), matches kept — what a
+    caller gets by filtering search results after the fact
+  • exact filtered: ExactIndex with the filter pushed down (bitmap → gather
+    of the matching rows, or a masked full scan for broad filters)
+  • ivf filtered: IVFIndex with the filter pushed down (exact scan of the
+    matches when they are few, else a widening probe)
+
+Usage:
+    python bench_filters.py
+    python bench_filters.py --docs 200000 --dim 384 --queries 500 --k 10
+    python bench_filters.py --selectivities 0.001 0.05 0.5
+"""
+import argparse
+import time
+
+import numpy as np
+
+from bench_ann import latency_stats, synthetic_corpus
+from vector_index import ExactIndex, IVFIndex, normalize, top_k
+
+SELECTIVITIES = [0.001, 0.01, 0.1, 0.5, 1.0]
+BUCKETS = 1000
+
+
+def bucket_filter(selectivity):
+    """Filter matching the first `selectivity` × BUCKETS category buckets."""
+    return {"category": [f"b{b:03d}" for b in range(max(1, round(selectivity * BUCKETS)))]}
+
+
+def evaluate(search, queries, truth, k):
+    """(recall@k, latency samples in ms) for a per-query search function."""
+    hits, expected_total, samples = 0, 0, []
+    for q, expected in zip(queries, truth):
+        start = time.perf_counter()
+        found = search(q)
+        samples.append((time.perf_counter() - start) * 1000.0)
+        hits += len(expected & set(int(i) for i in found))
+        expected_total += len(expected)
+    return hits / max(1, expected_total), samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--oversample", type=int, default=10, help="post-filter fetches oversample × k")
+    parser.add_argument("--selectivities", type=float, nargs="+", default=SELECTIVITIES)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("=" * 72)
+    print(f"🧮 FILTER BENCHMARK — {args.docs:,} docs × {args.dim} dims, "
+          f"{args.queries} queries, k={args.k}")
+    print("=" * 72)
+
+    corpus = synthetic_corpus(args.docs, args.dim, args.topics, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = normalize(corpus[rng.choice(args.docs, args.queries, replace=False)]
+                        + rng.standard_normal((args.queries, args.dim)).astype(np.float32) * 0.02)
+    buckets = rng.integers(0, BUCKETS, size=args.docs)
+    ids = [str(i) for i in range(args.docs)]
+    attributes = [{"category": f"b{b:03d}"} for b in buckets]
+
+    start = time.perf_counter()
+    exact = ExactIndex(args.dim)
+    exact.build(ids, corpus, attributes)
+    ivf = IVFIndex(args.dim, seed=args.seed)
+    ivf.build(ids, corpus, attributes)
+    build_s = time.perf_counter() - start
+
+    for selectivity in args.selectivities:
+        filters = bucket_filter(selectivity)
+        matching = np.flatnonzero(buckets < len(filters["category"]))
+        truth = [set(matching[top_k(corpus[matching] @ q, args.k)].tolist()) for q in queries]
+        allowed = np.zeros(args.docs, dtype=bool)
+        allowed[matching] = True
+
+        print(f"\n🎯 selectivity {selectivity:.1%} — {matching.size:,} matching docs")
+        print(f"{'method':>16} {'recall@k':>9} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9}")
+
+        def report(label, search):
+            recall, samples = evaluate(search, queries, truth, args.k)
+            mean, p50, p99 = latency_stats(samples)
+            print(f"{label:>16} {recall:>9.4f} {mean:>9.3f} {p50:>9.3f} {p99:>9.3f}")
+
+        def post_filter(q):
+            found = top_k(corpus @ q, args.oversample * args.k)
+            return found[allowed[found]][:args.k]
+
+        report("post-filter", post_filter)
+        report("exact filtered", lambda q: [i for i, _ in exact.search(q, args.k, filters=filters)])
+        report("ivf filtered", lambda q: [i for i, _ in ivf.search(q, args.k, filters=filters)])
+
+    print(f"\n🏗️  Index build: {build_s:.2f}s, {ivf.stats()['nlist']} IVF lists, nprobe={ivf.nprobe}")
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark: compact embedding storage — bytes saved vs. recall lost.
+
+Encodes a clustered synthetic corpus in each EMBEDDING_STORAGE mode and
+measures the BSON size of the stored embedding fields per document, then
+compares search over the compact codes against exact float32 top-k:
+  • float16 / int8 exact scans of the decoded vectors
+  • sign-bit Hamming top-k alone
+  • Hamming shortlist (rescore × k) re-scored with int8 — QuantizedIndex
+
+Usage:
+    python bench_quantization.py
+    python bench_quantization.py --docs 200000 --dim 384 --queries 500 --k 10
+"""
+import argparse
+import time
+
+import bson
+import numpy as np
+
+from bench_ann import latency_stats, synthetic_corpus
+from quantization import STORAGE_MODES, decode_embedding, encode_embedding, hamming_distances, sign_bits
+from vector_index import QuantizedIndex, normalize, top_k
+
+RESCORE_FACTORS = [1, 2, 4, 8, 16, 32]
+SIZE_SAMPLE = 1000
+
+
+def storage_bytes(corpus, mode):
+    """Mean BSON bytes per document for the embedding fields alone."""
+    sample = corpus[:SIZE_SAMPLE]
+    return sum(len(bson.encode(encode_embedding(v, mode))) for v in sample) / len(sample)
+
+
+def decoded(corpus, mode):
+    """Corpus as read back from storage in `mode`."""
+    return np.vstack([decode_embedding(encode_embedding(v, mode)) for v in corpus])
+
+
+def evaluate(search, queries, truth, k):
+    """(recall@k, latency samples in ms) for a per-query search function."""
+    hits, samples = 0, []
+    for q, expected in zip(queries, truth):
+        start = time.perf_counter()
+        found = search(q)
+        samples.append((time.perf_counter() - start) * 1000.0)
+        hits += len(expected & set(int(i) for i in found))
+    return hits / (k * len(queries)), samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("=" * 72)
+    print(f"🗜️  QUANTIZATION BENCHMARK — {args.docs:,} docs × {args.dim} dims, "
+          f"{args.queries} queries, k={args.k}")
+    print("=" * 72)
+
+    corpus = synthetic_corpus(args.docs, args.dim, args.topics, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = normalize(corpus[rng.choice(args.docs, args.queries, replace=False)]
+                        + rng.standard_normal((args.queries, args.dim)).astype(np.float32) * 0.02)
+    truth = [set(top_k(corpus @ q, args.k).tolist()) for q in queries]
+
+    # ── Storage ──────────────────────────────────────────────
+    print(f"\n{'storage':>10} {'bytes/doc':>10} {'vs float32':>11} {'1M docs':>10}")
+    baseline = storage_bytes(corpus, "float32")
+    for mode in STORAGE_MODES:
+        size = storage_bytes(corpus, mode)
+        print(f"{mode:>10} {size:>10,.0f} {size / baseline:>10.1%} {size * 1e6 / 2**20:>8,.0f}MB")
+
+    # ── Recall ───────────────────────────────────────────────
+    print(f"\n{'method':>22} {'recall@k':>9} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9}")
+
+    def report(label, search):
+        recall, samples = evaluate(search, queries, truth, args.k)
+        mean, p50, p99 = latency_stats(samples)
+        print(f"{label:>22} {recall:>9.4f} {mean:>9.3f} {p50:>9.3f} {p99:>9.3f}")
+
+    report("float32 exact", lambda q: top_k(corpus @ q, args.k))
+    for mode in ("float16", "int8"):
+        matrix = decoded(corpus, mode)
+        report(f"{mode} exact", lambda q, m=matrix: top_k(m @ q, args.k))
+
+    bits = sign_bits(corpus)
+    report("binary hamming", lambda q: top_k(-hamming_distances(sign_bits(q)[0], bits).astype(np.float32), args.k))
+
+    index = QuantizedIndex(args.dim)
+    index.build([str(i) for i in range(args.docs)], corpus)
+    for factor in RESCORE_FACTORS:
+        report(f"hamming→int8 ×{factor}",
+               lambda q, f=factor: [doc_id for doc_id, _ in index.search(q, args.k, rescore=f)])
+
+    print(f"\n📦 QuantizedIndex in memory: {index.stats()['matrix_bytes'] / 2**20:,.1f}MB "
+          f"(float32 matrix: {corpus.nbytes / 2**20:,.1f}MB)")
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Benchmark: two-stage reduced-dimension search — latency and memory vs. recall@10.
+
+For each target dimension it builds a ReducedIndex and compares it with the
+exact full-dimension top-k. The index scans every row at the reduced
+dimension and re-scores the best `rerank` candidates with the full vectors.
+The projection is either PCA fitted on the corpus or prefix truncation
+(meaningful only for Matryoshka-trained models). For every (dims, rerank)
+pair it reports:
+  • recall@k against the exact top-k
+  • latency per query (mean / p50 / p99)
+  • scan MB: the reduced copy that is read in full for every query. This is
+    all that must stay resident when the full rows are memory-mapped.
+
+Sentence embeddings concentrate their variance in a few directions. The
+synthetic corpus imitates this with a power-law spectrum (--decay; 0 makes
+the noise isotropic) applied in a random basis, so prefix truncation gets no
+free help. --from-collection benchmarks the stored embeddings instead.
+
+Usage:
+    python bench_reduction.py
+    python bench_reduction.py --dims 32 64 128 --reranks 100 256 500 --method prefix
+    python bench_reduction.py --from-collection --queries 200
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from bench_ann import latency_stats, synthetic_corpus
+from dim_reduction import METHODS, Projection, principal_basis
+from vector_index import ReducedIndex, normalize, top_k
+
+DIMS = [32, 64, 128, 192]
+RERANKS = [100, 256, 500]
+
+
+def anisotropic_corpus(n, dim, topics, decay, seed=0):
+    """synthetic_corpus with variance falling off as i^-decay along random directions."""
+    corpus = synthetic_corpus(n, dim, topics, seed)
+    if not decay:
+        return corpus
+    rng = np.random.default_rng(seed + 2)
+    rotation = np.linalg.qr(rng.standard_normal((dim, dim)))[0].astype(np.float32)
+    return normalize((corpus @ rotation) * (np.arange(1, dim + 1) ** -decay).astype(np.float32))
+
+
+def collection_corpus():
+    """Stored embeddings of the configured collection (per chunk where chunked)."""
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    from vector_index import load_from_collection
+
+    load_dotenv()
+    client = MongoClient(os.getenv("MONGODB_URI"), serverSelectionTimeoutMS=5000)
+    collection = client[os.getenv("MONGODB_DB_NAME", "semantic_search_db")][
+        os.getenv("MONGODB_COLLECTION_NAME", "documents")]
+    _, vectors, _ = load_from_collection(collection)
+    client.close()
+    if vectors is None:
+        raise SystemExit("⚠️  No embedded documents in the collection")
+    return normalize(vectors)
+
+
+def evaluate(search, queries, truth, k):
+    """(recall@k, latency samples in ms) for a per-query search function."""
+    hits, samples = 0, []
+    for q, expected in zip(queries, truth):
+        start = time.perf_counter()
+        found = search(q)
+        samples.append((time.perf_counter() - start) * 1000.0)
+        hits += len(expected & set(int(i) for i in found))
+    return hits / (k * len(queries)), samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--decay", type=float, default=0.5, help="Spectrum fall-off of the synthetic corpus")
+    parser.add_argument("--from-collection", action="store_true", help="Use the stored embeddings instead")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dims", type=int, nargs="+", default=DIMS)
+    parser.add_argument("--reranks", type=int, nargs="+", default=RERANKS)
+    parser.add_argument("--method", choices=METHODS, default="pca")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.from_collection:
+        corpus = collection_corpus()
+        source = "stored embeddings"
+    else:
+        corpus = anisotropic_corpus(args.docs, args.dim, args.topics, args.decay, args.seed)
+        source = f"synthetic, decay {args.decay}"
+    n, dim = corpus.shape
+    print("=" * 72)
+    print(f"📐 REDUCED-DIMENSION BENCHMARK — {n:,} docs × {dim} dims ({source}), "
+          f"{args.queries} queries, k={args.k}, {args.method}")
+    print("=" * 72)
+
+    rng = np.random.default_rng(args.seed + 1)
+    queries = normalize(corpus[rng.choice(n, args.queries, replace=False)]
+                        + rng.standard_normal((args.queries, dim)).astype(np.float32) * 0.02)
+    truth = [set(top_k(corpus @ q, args.k).tolist()) for q in queries]
+    ids = [str(i) for i in range(n)]
+
+    started = time.perf_counter()
+    values, basis = principal_basis(corpus, seed=args.seed) if args.method == "pca" else (None, None)
+    fit_s = time.perf_counter() - started
+
+    print(f"\n{'dims':>6} {'energy':>7} {'rerank':>7} {'recall@k':>9} {'mean ms':>9} {'p50 ms':>9} "
+          f"{'p99 ms':>9} {'scan MB':>9}")
+
+    def report(label, energy, rerank, search, scan_bytes):
+        recall, samples = evaluate(search, queries, truth, args.k)
+        mean, p50, p99 = latency_stats(samples)
+        print(f"{label:>6} {energy:>7} {rerank:>7} {recall:>9.4f} {mean:>9.3f} {p50:>9.3f} {p99:>9.3f} "
+              f"{scan_bytes / 2**20:>9.1f}")
+
+    report(dim, "100%", "—", lambda q: top_k(corpus @ q, args.k), corpus.nbytes)
+    for reduced_dim in sorted(d for d in args.dims if d < dim):
+        if args.method == "pca":
+            projection = Projection("pca", dim, reduced_dim, basis[:reduced_dim])
+            energy = values[:reduced_dim].sum() / values.sum()
+        else:
+            projection = Projection("prefix", dim, reduced_dim)
+            energy = projection.retained_energy(corpus)
+        index = ReducedIndex(dim, projection=projection)
+        index.build(ids, corpus)
+        scan_bytes = index.stats()["reduced_bytes"]
+        for rerank in args.reranks:
+            report(reduced_dim, f"{energy:.0%}", rerank,
+                   lambda q, r=rerank: [int(doc_id) for doc_id, _ in index.search(q, args.k, rerank=r)],
+                   scan_bytes)
+
+    print(f"\n🧮 PCA fit: {fit_s:.2f}s" if args.method == "pca" else "")
+    print(f"📦 Full float32 matrix: {corpus.nbytes / 2**20:,.1f}MB; a reduced index holds it plus the scan copy, "
+          f"or maps it from EMBEDDING_STORE_PATH and keeps only the scan copy resident")
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark: sharded search — throughput and latency against the shard count.
+
+Builds the same corpus in-process and then split over 1, 2, 4, ... shard
+processes (shard_search.ShardPool) and, for each layout, reports
+  • QPS with --clients threads each sending one query at a time
+  • QPS when the queries arrive in batches of --batch (one scatter per batch)
+  • single-query latency (mean / p50 / p99)
+  • recall@k of the merged results against the exact top-k
+
+--slow-shard-ms delays every search on shard 0 to show the deadline at work:
+with a delay beyond --deadline-ms the coordinator answers from the other
+shards on time, and the table shows the recall given up.
+
+Each shard takes its own CPU group, so the scaling stops where the machine
+runs out of cores.
+
+Usage:
+    python bench_shards.py
+    python bench_shards.py --shards 1 2 4 8 --docs 200000 --index-type int8_binary
+    python bench_shards.py --shards 4 --slow-shard-ms 300 --deadline-ms 100
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from bench_ann import latency_stats, synthetic_corpus
+from shard_search import DEADLINE_MS, ShardedIndex, ShardPool
+from vector_index import INDEX_TYPES, normalize, top_k
+
+SHARDS = [1, 2, 4, 8]
+
+
+def throughput(search, queries, clients):
+    """Queries per second with `clients` threads issuing one query each at a time."""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        list(executor.map(search, queries))
+    return len(queries) / (time.perf_counter() - started)
+
+
+def batch_throughput(search_batch, queries, batch):
+    started = time.perf_counter()
+    for start in range(0, len(queries), batch):
+        search_batch(queries[start:start + batch])
+    return len(queries) / (time.perf_counter() - started)
+
+
+def recall(results, truth, k):
+    return sum(len(expected & {int(doc_id) for doc_id, _ in hits})
+               for hits, expected in zip(results, truth)) / (k * len(truth))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=400)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--shards", type=int, nargs="+", default=SHARDS)
+    parser.add_argument("--index-type", choices=sorted(INDEX_TYPES), default="exact")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent single-query clients")
+    parser.add_argument("--batch", type=int, default=32, help="Queries per scatter in batch mode")
+    parser.add_argument("--deadline-ms", type=float, default=DEADLINE_MS)
+    parser.add_argument("--slow-shard-ms", type=float, default=0, help="Delay every search on shard 0")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = synthetic_corpus(args.docs, args.dim, args.topics, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    queries = normalize(corpus[rng.choice(args.docs, args.queries, replace=False)]
+                        + rng.standard_normal((args.queries, args.dim)).astype(np.float32) * 0.02)
+    truth = [set(top_k(corpus @ q, args.k).tolist()) for q in queries]
+    ids = [str(i) for i in range(args.docs)]
+
+    print("=" * 80)
+    print(f"🧩 SHARDED SEARCH BENCHMARK — {args.docs:,} docs × {args.dim} dims, {args.index_type}, "
+          f"{args.queries} queries, k={args.k}, {os.cpu_count()} CPUs")
+    if args.slow_shard_ms:
+        print(f"   Shard 0 delayed by {args.slow_shard_ms:.0f}ms, deadline {args.deadline_ms:.0f}ms")
+    print("=" * 80)
+    print(f"\n{'layout':>10} {'clients QPS':>12} {'batch QPS':>10} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9} "
+          f"{'recall@k':>9} {'partial':>8}")
+
+    def report(label, search, search_batch, partial=None):
+        samples, results = [], []
+        for q in queries[:min(len(queries), 200)]:
+            start = time.perf_counter()
+            results.append(search(q))
+            samples.append((time.perf_counter() - start) * 1000.0)
+        mean, p50, p99 = latency_stats(samples)
+        qps = throughput(search, queries, args.clients)
+        batch_qps = batch_throughput(search_batch, queries, args.batch)
+        print(f"{label:>10} {qps:>12,.0f} {batch_qps:>10,.0f} {mean:>9.2f} {p50:>9.2f} {p99:>9.2f} "
+              f"{recall(results, truth, args.k):>9.4f} {partial() if partial else '—':>8}")
+
+    index = INDEX_TYPES[args.index_type](args.dim)
+    index.build(ids, corpus)
+    if hasattr(index, "train"):
+        index.train()
+    report("in-proc", lambda q: index.search(q, args.k), lambda qs: index.search_batch(qs, args.k))
+    del index
+
+    for shards in args.shards:
+        delays = {0: args.slow_shard_ms} if args.slow_shard_ms else None
+        pool = ShardPool(shards, delays_ms=delays)
+        try:
+            started = time.perf_counter()
+            sharded = ShardedIndex(pool, args.index_type, args.dim, deadline_ms=args.deadline_ms)
+            sharded.build(ids, corpus)
+            sharded.train()
+            build_s = time.perf_counter() - started
+            report(f"{shards} shards", lambda q: sharded.search(q, args.k),
+                   lambda qs: sharded.search_batch(qs, args.k), lambda: sharded.partial_searches)
+            print(f"{'':>10} built in {build_s:.2f}s, shard sizes {sharded._sizes}")
+        finally:
+            pool.close()
+
+    print("\n'partial' counts searches answered without every shard (see --slow-shard-ms)")
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,479 @@
+"""
+Benchmark suite: embedding service and search path, end to end, offline.
+
+Runs the real NLP service (Flask app, in-process test client), seed.py's
+ingestion pipeline and the local index over a synthetic corpus, with
+  • a deterministic stub encoder (default) or a real sentence-transformers
+    model (--encoder model), and
+  • mongomock (default) or a MongoDB reachable at MONGODB_URI (--mongo uri;
+    the bench collection is cleared first).
+
+Measures
+  • /embed latency distribution, sequential and concurrent (micro-batched)
+  • /embed-batch throughput vs. batch size
+  • ingestion docs/s through seed.ingest_stream
+  • search QPS / p50 / p99: local index exact, ANN and category-filtered,
+    BM25, and the API's fallback path (embed → local index → fetch
+    documents from MongoDB)
+  • corpus load time: every embedding read out of MongoDB vs. opening the
+    memory-mapped embedding store
+
+and writes everything to JSON. --compare prints the change of each headline
+metric against an earlier run and flags regressions beyond --tolerance.
+
+The stub encoder hashes words to fixed random vectors and sums them, so
+similar texts get similar vectors, and simulates model cost as
+  --stub-overhead-ms per call + --stub-token-us per padded token.
+
+Usage:
+    python bench_suite.py
+    python bench_suite.py --docs 20000 --concurrency 16 --output bench_results/base.json
+    python bench_suite.py --compare bench_results/base.json --tolerance 0.1
+    python bench_suite.py --encoder model --mongo uri
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from datetime import datetime, timezone
+
+import numpy as np
+
+BATCH_SIZES = [1, 8, 32, 128, 512]
+TOPICS = {
+    "Databases": "mongodb index query shard replica aggregation transaction schema collection btree",
+    "Machine Learning": "model training gradient embedding transformer attention loss dataset inference",
+    "Networking": "packet latency tcp socket router bandwidth protocol tls handshake congestion",
+    "Systems": "kernel thread scheduler memory cache page allocator syscall interrupt process",
+    "Web": "http request browser javascript react render cookie session frontend api",
+}
+FILLER = "the a of and to in for with on by this that from is are was be as it".split()
+
+
+# ── Stub encoder ─────────────────────────────────────────────
+class StubEncoder:
+    """Deterministic offline stand-in for a SentenceTransformer: hashed bag-of-words vectors."""
+
+    _WORD_RE = re.compile(r"\w+")
+
+    def __init__(self, dim=384, max_seq_length=256, overhead_ms=1.0, token_us=5.0):
+        self.dim = dim
+        self.max_seq_length = max_seq_length
+        self.overhead_ms = overhead_ms
+        self.token_us = token_us
+        self.tokenizer = None
+        self._word_vectors = {}
+        self._lock = threading.Lock()
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def _word_vector(self, word):
+        vec = self._word_vectors.get(word)
+        if vec is None:
+            seed = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+            vec = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+            with self._lock:
+                self._word_vectors[word] = vec
+        return vec
+
+    def encode(self, sentences, batch_size=32, convert_to_tensor=False, **_):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            lengths = []
+            for i in range(start, min(start + batch_size, len(texts))):
+                words = self._WORD_RE.findall(texts[i].lower())[:self.max_seq_length]
+                lengths.append(len(words) + 2)
+                for word in words:
+                    out[i] += self._word_vector(word)
+            # Like a transformer, a batch costs its padded length × batch size
+            cost_s = self.overhead_ms / 1000.0 + max(lengths) * len(lengths) * self.token_us / 1e6
+            if cost_s > 0:
+                time.sleep(cost_s)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        out /= np.where(norms == 0, 1.0, norms)
+        return out[0] if single else out
+
+
+def install_stub_encoder(args):
+    """Make `from sentence_transformers import SentenceTransformer` return the stub."""
+    module = types.ModuleType("sentence_transformers")
+    module.SentenceTransformer = lambda *_, **__: StubEncoder(
+        args.dim, overhead_ms=args.stub_overhead_ms, token_us=args.stub_token_us)
+    sys.modules["sentence_transformers"] = module
+    # The stub stands in for the torch backend's SentenceTransformer
+    os.environ["ENCODER_BACKEND"] = "torch"
+
+
+def install_mongomock():
+    """Route every pymongo.MongoClient to one shared in-memory mongomock client."""
+    try:
+        import mongomock
+    except ImportError:
+        sys.exit("❌ --mongo mongomock needs `pip install mongomock` (or use --mongo uri)")
+    import pymongo
+    shared = mongomock.MongoClient()
+    pymongo.MongoClient = lambda *_, **__: shared
+
+
+# ── Synthetic data ───────────────────────────────────────────
+def synthetic_corpus(n, seed=0):
+    """Documents with log-normal word counts drawn from a few topic vocabularies."""
+    rng = np.random.default_rng(seed)
+    categories = list(TOPICS)
+    lengths = np.clip(rng.lognormal(mean=4.0, sigma=0.8, size=n), 8, 1500).astype(int)
+    docs = []
+    for i, length in enumerate(lengths):
+        category = categories[i % len(categories)]
+        topic = TOPICS[category].split()
+        # Two topic words to one filler word
+        words = [topic[j % len(topic)] if j % 3 else FILLER[j % len(FILLER)]
+                 for j in rng.integers(0, len(topic) * 3, size=length)]
+        docs.append({
+            "title": f"{category} note {i}",
+            "content": " ".join(words) + f" ref-{i:06d}",
+            "category": category,
+        })
+    return docs
+
+
+def synthetic_queries(n, seed=1):
+    rng = np.random.default_rng(seed)
+    vocab = [w for words in TOPICS.values() for w in words.split()]
+    return [" ".join(rng.choice(vocab, size=rng.integers(2, 6))) for _ in range(n)]
+
+
+# ── Measurement helpers ──────────────────────────────────────
+def latency_summary(samples_ms, wall_s=None):
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    summary = {
+        "count": int(samples.size),
+        "mean_ms": round(float(samples.mean()), 3),
+        "p50_ms": round(float(np.percentile(samples, 50)), 3),
+        "p90_ms": round(float(np.percentile(samples, 90)), 3),
+        "p99_ms": round(float(np.percentile(samples, 99)), 3),
+        "max_ms": round(float(samples.max()), 3),
+    }
+    if wall_s:
+        summary["qps"] = round(samples.size / wall_s, 1)
+    return summary
+
+
+def run_load(app, calls, concurrency):
+    """
+    Issue calls (each a function of a Flask test client) from `concurrency`
+    threads; returns (latencies in ms, wall seconds). Raises on a non-200.
+    """
+    latencies = [0.0] * len(calls)
+    errors = []
+    cursor = iter(range(len(calls)))
+    lock = threading.Lock()
+
+    def worker():
+        client = app.test_client()
+        while True:
+            with lock:
+                i = next(cursor, None)
+            if i is None or errors:
+                return
+            started = time.perf_counter()
+            response = calls[i](client)
+            latencies[i] = (time.perf_counter() - started) * 1000.0
+            if response.status_code != 200:
+                errors.append(f"{response.status_code}: {response.get_data(as_text=True)[:200]}")
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(max(1, concurrency))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall_s = time.perf_counter() - started
+    if errors:
+        raise RuntimeError(f"Request failed with {errors[0]}")
+    return latencies, wall_s
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+# ── Benchmarks ───────────────────────────────────────────────
+def bench_ingestion(collection, args, docs):
+    import seed
+    from encoders import load_encoder
+
+    model = load_encoder(seed.MODEL_NAME)
+    collection.delete_many({})
+    stats = seed.ingest_stream(collection, model, iter(docs), args.chunk_size, progress=False,
+                               storage=args.storage, chunking=args.chunking)
+    return {
+        "docs": stats["inserted"],
+        "docs_per_s": round(stats["docs_per_s"], 1),
+        "wall_s": round(stats["wall_s"], 3),
+        "encode_s": round(stats["encode_s"], 3),
+        "write_s": round(stats["write_s"], 3),
+    }
+
+
+def bench_embed(svc, args, queries):
+    # Unique texts, so the embedding cache (when enabled) can't serve them
+    texts = [f"{q} #{i}" for i, q in enumerate(queries)]
+    call = lambda text: (lambda client: client.post("/embed", json={"text": text}))
+    sequential, wall_s = run_load(svc.app, [call(t) for t in texts[:args.requests]], 1)
+    concurrent, c_wall_s = run_load(svc.app, [call(f"{t} c") for t in texts[:args.requests]], args.concurrency)
+    return {
+        "sequential": latency_summary(sequential, wall_s),
+        "concurrent": {"concurrency": args.concurrency, **latency_summary(concurrent, c_wall_s)},
+    }
+
+
+def bench_embed_batch(svc, args, docs):
+    contents = [d["content"] for d in docs]
+    results = {}
+    for size in BATCH_SIZES:
+        calls = max(3, min(50, args.batch_texts // size))
+        batches = [[f"{contents[(r * size + j) % len(contents)]} #{r}" for j in range(size)] for r in range(calls)]
+        latencies, wall_s = run_load(svc.app, [
+            (lambda batch: lambda client: client.post("/embed-batch", json={"texts": batch}))(b)
+            for b in batches
+        ], 1)
+        results[str(size)] = {
+            "calls": calls,
+            "texts_per_s": round(size * calls / wall_s, 1),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        }
+    return results
+
+
+def bench_search(svc, collection, args, queries):
+    from bson import ObjectId
+
+    client = svc.app.test_client()
+    vectors = client.post("/embed-batch", json={"texts": queries[:args.requests]}).get_json()["embeddings"]
+    results = {}
+    for mode in ("exact", "ann"):
+        latencies, wall_s = run_load(svc.app, [
+            (lambda v: lambda c: c.post("/search", json={"vector": v, "top_k": args.k, "mode": mode}))(v)
+            for v in vectors
+        ], args.concurrency)
+        results[f"local_{mode}"] = latency_summary(latencies, wall_s)
+
+    # One category out of len(TOPICS): the filtered local path
+    category = next(iter(TOPICS))
+    latencies, wall_s = run_load(svc.app, [
+        (lambda v: lambda c: c.post("/search", json={"vector": v, "top_k": args.k, "filter": {"category": category}}))(v)
+        for v in vectors
+    ], args.concurrency)
+    results["local_filtered"] = latency_summary(latencies, wall_s)
+
+    if svc.LEXICAL_INDEX_ENABLED:
+        latencies, wall_s = run_load(svc.app, [
+            (lambda q: lambda c: c.post("/lexical/search", json={"query": q, "top_k": args.k}))(q)
+            for q in queries[:args.requests]
+        ], args.concurrency)
+        results["bm25"] = latency_summary(latencies, wall_s)
+
+    # The Express fallback path: embed the query, search the local index, hydrate from MongoDB
+    def fallback(query):
+        def call(c):
+            vector = c.post("/embed", json={"text": query}).get_json()["embedding"]
+            response = c.post("/search", json={"vector": vector, "top_k": args.k})
+            ids = [ObjectId(hit["id"]) for hit in response.get_json()["results"]]
+            list(collection.find({"_id": {"$in": ids}}, {"embedding": 0}))
+            return response
+        return call
+
+    latencies, wall_s = run_load(svc.app, [fallback(f"{q} ?{i}") for i, q in enumerate(queries[:args.requests])],
+                                 args.concurrency)
+    results["fallback"] = latency_summary(latencies, wall_s)
+    return results
+
+
+def bench_index_load(collection, workdir):
+    from embedding_store import EmbeddingStore
+    from vector_index import ExactIndex, load_from_collection
+
+    started = time.perf_counter()
+    ids, vectors, attributes = load_from_collection(collection)
+    mongo_ms = (time.perf_counter() - started) * 1000.0
+
+    EmbeddingStore(os.path.join(workdir, "embedding_store"), vectors.shape[1]).append(ids, vectors, attributes)
+    started = time.perf_counter()
+    store = EmbeddingStore(os.path.join(workdir, "embedding_store"))
+    ExactIndex(store.dim).attach(store)
+    store_ms = (time.perf_counter() - started) * 1000.0
+    return {"vectors": len(ids), "mongo_ms": round(mongo_ms, 3), "store_ms": round(store_ms, 3)}
+
+
+def headline(results):
+    """Flat {metric: (value, higher_is_better)} used by --compare."""
+    metrics = {
+        "ingestion.docs_per_s": (results["ingestion"]["docs_per_s"], True),
+        "embed.sequential.p50_ms": (results["embed"]["sequential"]["p50_ms"], False),
+        "embed.sequential.p99_ms": (results["embed"]["sequential"]["p99_ms"], False),
+        "embed.concurrent.qps": (results["embed"]["concurrent"]["qps"], True),
+        "embed.concurrent.p99_ms": (results["embed"]["concurrent"]["p99_ms"], False),
+    }
+    for size, row in results["embed_batch"].items():
+        metrics[f"embed_batch.{size}.texts_per_s"] = (row["texts_per_s"], True)
+    for path, row in results["search"].items():
+        metrics[f"search.{path}.qps"] = (row["qps"], True)
+        metrics[f"search.{path}.p50_ms"] = (row["p50_ms"], False)
+        metrics[f"search.{path}.p99_ms"] = (row["p99_ms"], False)
+    if "index_load" in results:
+        metrics["index_load.mongo_ms"] = (results["index_load"]["mongo_ms"], False)
+        metrics["index_load.store_ms"] = (results["index_load"]["store_ms"], False)
+    return metrics
+
+
+def compare(current, baseline_path, tolerance):
+    """Print each headline metric's change; returns the number of regressions."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    base = {k: v for k, (v, _) in headline(baseline["results"]).items()}
+    print(f"\n📊 vs. {baseline_path} ({baseline['meta'].get('git_commit') or 'unknown commit'}, "
+          f"{baseline['meta']['timestamp']})")
+    print(f"{'metric':<36} {'baseline':>12} {'current':>12} {'change':>9}")
+    regressions = 0
+    for name, (value, higher_is_better) in headline(current).items():
+        if name not in base or not base[name]:
+            continue
+        change = (value - base[name]) / base[name]
+        worse = -change if higher_is_better else change
+        flag = ""
+        if worse > tolerance:
+            regressions += 1
+            flag = " ⚠️"
+        print(f"{name:<36} {base[name]:>12,.2f} {value:>12,.2f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--encoder", choices=["stub", "model"], default="stub")
+    parser.add_argument("--mongo", choices=["mongomock", "uri"], default="mongomock")
+    parser.add_argument("--collection", default="bench_documents", help="Collection to (re)create")
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=300, help="Requests per latency measurement")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--batch-texts", type=int, default=2048, help="Texts per /embed-batch size step")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--chunk-size", type=int, default=256, help="Ingestion chunk size")
+    parser.add_argument("--storage", default="float32")
+    parser.add_argument("--chunking", default="pooled")
+    parser.add_argument("--dim", type=int, default=384, help="Stub encoder dimension")
+    parser.add_argument("--stub-overhead-ms", type=float, default=1.0)
+    parser.add_argument("--stub-token-us", type=float, default=5.0)
+    parser.add_argument("--cache-mb", type=float, default=0, help="NLP embedding cache size (default off)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON results path (default: bench_results/<timestamp>.json)")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative change flagged as a regression")
+    args = parser.parse_args()
+
+    # The NLP service reads its configuration at import time
+    workdir = tempfile.mkdtemp(prefix="bench-suite-")
+    os.environ.update({
+        "MONGODB_COLLECTION_NAME": args.collection,
+        "NLP_STARTUP_MODE": "lazy",
+        "NLP_ENCODER_WORKERS": "0",
+        "EMBED_CACHE_MAX_MB": str(args.cache_mb),
+        "EMBED_CACHE_PATH": "",
+        "EMBEDDING_STORAGE": args.storage,
+        "EMBEDDING_CHUNKING": args.chunking,
+        "LOCAL_INDEX_PATH": os.path.join(workdir, "vector_index.npz"),
+        "LEXICAL_INDEX_PATH": os.path.join(workdir, "bm25_index.npz"),
+        "LOCAL_INDEX_SAVE_INTERVAL": "3600",
+    })
+    if args.encoder == "stub":
+        install_stub_encoder(args)
+    if args.mongo == "mongomock":
+        install_mongomock()
+
+    from pymongo import MongoClient
+    db = MongoClient(os.getenv("MONGODB_URI"), serverSelectionTimeoutMS=5000)[
+        os.getenv("MONGODB_DB_NAME", "semantic_search_db")]
+    collection = db[args.collection]
+
+    docs = synthetic_corpus(args.docs, args.seed)
+    queries = synthetic_queries(max(args.requests, 1), args.seed + 1)
+
+    print("=" * 64)
+    print(f"🏁 BENCHMARK SUITE — {args.encoder} encoder, {args.mongo}, {len(docs):,} docs")
+    print("=" * 64)
+    results = {}
+
+    print("\n📥 Ingestion (seed.ingest_stream)...")
+    results["ingestion"] = bench_ingestion(collection, args, docs)
+    print(f"   {results['ingestion']['docs_per_s']:,.0f} docs/s")
+
+    import nlp_service as svc
+    svc.ensure_model()
+    if not svc.index_ready.wait(600) or (svc.LEXICAL_INDEX_ENABLED and not svc.lexical_ready.wait(600)):
+        sys.exit("❌ Local indexes did not become ready")
+
+    print("⚡ /embed latency...")
+    results["embed"] = bench_embed(svc, args, queries)
+    seq, conc = results["embed"]["sequential"], results["embed"]["concurrent"]
+    print(f"   sequential p50 {seq['p50_ms']} ms / p99 {seq['p99_ms']} ms — "
+          f"{args.concurrency} concurrent: {conc['qps']:,.0f} req/s, p99 {conc['p99_ms']} ms")
+
+    print("📦 /embed-batch throughput...")
+    results["embed_batch"] = bench_embed_batch(svc, args, docs)
+    print("   " + "  ".join(f"{size}: {row['texts_per_s']:,.0f}/s" for size, row in results["embed_batch"].items()))
+
+    print("🔎 Search paths...")
+    results["search"] = bench_search(svc, collection, args, queries)
+    for path, row in results["search"].items():
+        print(f"   {path:<12} {row['qps']:>9,.0f} QPS   p50 {row['p50_ms']:>8.3f} ms   p99 {row['p99_ms']:>8.3f} ms")
+
+    print("💾 Corpus load (MongoDB vs. embedding store)...")
+    results["index_load"] = bench_index_load(collection, workdir)
+    load = results["index_load"]
+    print(f"   {load['vectors']:,} vectors: MongoDB {load['mongo_ms']:,.1f} ms — store {load['store_ms']:,.1f} ms")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "index_type": svc.LOCAL_INDEX_TYPE,
+            "encoder_backend": svc.ENCODER_BACKEND,
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    output = args.output or os.path.join(
+        "bench_results", f"bench-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results written to {output}")
+
+    regressions = compare(results, args.compare, args.tolerance) if args.compare else 0
+    print("=" * 64)
+    if regressions:
+        print(f"⚠️  {regressions} metric(s) regressed by more than {args.tolerance:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
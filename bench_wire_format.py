@@ -0,0 +1,104 @@
+"""
+Benchmark: JSON float lists vs. binary float32/float16 embedding payloads.
+
+For each batch size, measures the server-side serialize time (tolist + JSON
+dump vs. header + tobytes), the client-side parse time (JSON parse vs.
+frombuffer) and the payload size, using the same random vectors for all
+formats. Pass --model to time a real model.encode call as well, which is
+shared by every format and shows how much serialization adds on top.
+
+Usage:
+    python bench_wire_format.py
+    python bench_wire_format.py --dim 384 --repeats 20 --model sentence-transformers/all-MiniLM-L6-v2
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from wire_format import pack_embeddings, unpack_embeddings
+
+BATCH_SIZES = [1, 4, 16, 64, 256, 1024]
+
+
+def best_of(fn, repeats):
+    """Minimum wall time of fn over several runs, in milliseconds."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000.0
+
+
+def bench_json(vectors, repeats):
+    payload = {}
+
+    def serialize():
+        payload["body"] = json.dumps({"embeddings": [v.tolist() for v in vectors]})
+
+    def parse():
+        json.loads(payload["body"])["embeddings"]
+
+    ser = best_of(serialize, repeats)
+    par = best_of(parse, repeats)
+    return ser, par, len(payload["body"].encode("utf-8"))
+
+
+def bench_binary(vectors, dtype, repeats):
+    payload = {}
+
+    def serialize():
+        payload["body"] = pack_embeddings(vectors, dtype)
+
+    def parse():
+        unpack_embeddings(payload["body"])
+
+    ser = best_of(serialize, repeats)
+    par = best_of(parse, repeats)
+    return ser, par, len(payload["body"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--model", default=None, help="Also time model.encode with this model")
+    args = parser.parse_args()
+
+    model = None
+    if args.model:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(args.model)
+        args.dim = model.get_sentence_embedding_dimension()
+
+    rng = np.random.default_rng(0)
+    print("=" * 96)
+    print(f"📦 WIRE FORMAT BENCHMARK — dim={args.dim}, best of {args.repeats}")
+    print("=" * 96)
+    header = f"{'batch':>6} {'format':>8} {'encode ms':>10} {'serialize ms':>13} {'parse ms':>10} {'total ms':>10} {'bytes':>12}"
+    print(header)
+    print("-" * len(header))
+
+    for n in BATCH_SIZES:
+        encode_ms = 0.0
+        if model:
+            texts = [f"benchmark sentence number {i} about semantic search" for i in range(n)]
+            encode_ms = best_of(lambda: model.encode(texts, batch_size=32), max(1, args.repeats // 5))
+            vectors = model.encode(texts, batch_size=32)
+        else:
+            vectors = rng.standard_normal((n, args.dim)).astype(np.float32)
+
+        rows = [("json",) + bench_json(vectors, args.repeats)]
+        for dtype in ("float32", "float16"):
+            rows.append((dtype,) + bench_binary(vectors, dtype, args.repeats))
+
+        for fmt, ser, par, size in rows:
+            total = encode_ms + ser + par
+            print(f"{n:>6} {fmt:>8} {encode_ms:>10.2f} {ser:>13.3f} {par:>10.3f} {total:>10.2f} {size:>12,}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
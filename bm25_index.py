@@ -0,0 +1,273 @@
+"""
+Local BM25 Index
+In-process lexical search over document title + content.
+
+Postings are compact per-term arrays (array('I') row numbers, array('H')
+term frequencies) that grow by appending, so documents can be added
+incrementally; deletes are tombstones that also decrement document
+frequencies, and compaction rewrites the postings without dead rows.
+A query scores only the postings of its own terms, accumulated into one
+dense score vector, then picks top-k with argpartition.
+
+Tokens are lower-cased word runs; identifiers such as "gpt-4" or
+"sha256.hexdigest" are indexed both whole and by their parts, so exact
+identifiers and rare terms match even when embeddings blur them. Rows also
+carry filter attributes, so a filtered query zeroes non-matching rows before
+picking top-k.
+"""
+import math
+import os
+import re
+import threading
+from array import array
+
+import numpy as np
+
+from filters import FILTER_PROJECTION, RowAttributes, document_attributes
+from vector_index import top_k
+
+K1 = 1.2
+B = 0.75
+MAX_TF = 65535
+
+_TOKEN_RE = re.compile(r"\w+(?:[-.:/]\w+)*")
+_PART_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Lower-cased tokens; compound identifiers also yield their parts."""
+    tokens = []
+    for match in _TOKEN_RE.finditer((text or "").lower()):
+        token = match.group()
+        tokens.append(token)
+        if not token.isalnum() and "_" not in token:
+            tokens.extend(_PART_RE.findall(token))
+    return tokens
+
+
+class BM25Index:
+    """Okapi BM25 over an incrementally maintained inverted index."""
+
+    index_type = "bm25"
+
+    def __init__(self, k1=K1, b=B):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.vocab = {}                # term → term id
+        self._rows = []                # term id → array('I') of rows
+        self._tfs = []                 # term id → array('H') of term frequencies
+        self._df = array("I")          # term id → live document frequency
+        self._doc_len = array("I")     # row → token count
+        self._doc_terms = []           # row → array('I') of distinct term ids
+        self._alive = array("b")
+        self.ids = []                  # row → external id
+        self.id_to_row = {}
+        self.attributes = RowAttributes()
+        self._total_len = 0            # tokens over live documents
+
+    # ── Size / bookkeeping ───────────────────────────────────
+    def __len__(self):
+        return len(self.id_to_row)
+
+    @property
+    def tombstones(self):
+        return len(self.ids) - len(self.id_to_row)
+
+    def _term_id(self, term):
+        tid = self.vocab.get(term)
+        if tid is None:
+            tid = self.vocab[term] = len(self._rows)
+            self._rows.append(array("I"))
+            self._tfs.append(array("H"))
+            self._df.append(0)
+        return tid
+
+    # ── Mutations ────────────────────────────────────────────
+    def _delete_row(self, row):
+        self._alive[row] = 0
+        for tid in self._doc_terms[row]:
+            self._df[tid] -= 1
+        self._total_len -= self._doc_len[row]
+
+    def _append(self, doc_id, text, attributes=None):
+        old = self.id_to_row.get(doc_id)
+        if old is not None:
+            self._delete_row(old)
+        counts = {}
+        tokens = tokenize(text)
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+
+        row = len(self.ids)
+        terms = array("I")
+        for token, tf in counts.items():
+            tid = self._term_id(token)
+            self._rows[tid].append(row)
+            self._tfs[tid].append(min(tf, MAX_TF))
+            self._df[tid] += 1
+            terms.append(tid)
+        self._doc_terms.append(terms)
+        self._doc_len.append(len(tokens))
+        self._alive.append(1)
+        self._total_len += len(tokens)
+        self.ids.append(doc_id)
+        self.id_to_row[doc_id] = row
+        if attributes is not None:
+            self.attributes.set(row, [attributes])
+
+    def add(self, ids, texts, attributes=None):
+        """Insert or replace documents by id; `attributes` is one filter-attribute dict per id."""
+        with self._lock:
+            for doc_id, text, doc_attributes in zip(ids, texts, attributes or [None] * len(ids)):
+                self._append(doc_id, text, doc_attributes)
+
+    def build(self, ids, texts, attributes=None):
+        """Replace the index contents."""
+        with self._lock:
+            self._reset()
+            self.add(ids, texts, attributes)
+
+    def remove(self, ids):
+        """Tombstone documents by id; returns how many were present."""
+        removed = 0
+        with self._lock:
+            for doc_id in ids:
+                row = self.id_to_row.pop(doc_id, None)
+                if row is not None:
+                    self._delete_row(row)
+                    removed += 1
+        return removed
+
+    def compact(self):
+        """Rewrite postings without tombstoned rows."""
+        with self._lock:
+            live = [r for r in range(len(self.ids)) if self._alive[r]]
+            remap = np.full(len(self.ids), -1, dtype=np.int64)
+            remap[live] = np.arange(len(live))
+            for tid in range(len(self._rows)):
+                rows = np.frombuffer(self._rows[tid], dtype=np.uint32).astype(np.int64)
+                keep = remap[rows] >= 0
+                self._rows[tid] = array("I", remap[rows[keep]].astype(np.uint32).tobytes())
+                self._tfs[tid] = array("H", np.frombuffer(self._tfs[tid], dtype=np.uint16)[keep].tobytes())
+            self._doc_len = array("I", (self._doc_len[r] for r in live))
+            self._doc_terms = [self._doc_terms[r] for r in live]
+            self.attributes.take(np.asarray(live, dtype=np.int64))
+            self._alive = array("b", [1] * len(live))
+            self.ids = [self.ids[r] for r in live]
+            self.id_to_row = {doc_id: i for i, doc_id in enumerate(self.ids)}
+
+    # ── Search ───────────────────────────────────────────────
+    def search(self, query, k=10, filters=None):
+        """Return [(id, bm25 score)] for the k best-matching live documents (matching `filters`)."""
+        with self._lock:
+            n_docs = len(self.id_to_row)
+            if n_docs == 0:
+                return []
+            avg_len = self._total_len / n_docs
+            doc_len = np.frombuffer(self._doc_len, dtype=np.uint32)
+            scores = np.zeros(len(self.ids), dtype=np.float32)
+            for term in set(tokenize(query)):
+                tid = self.vocab.get(term)
+                if tid is None or self._df[tid] == 0:
+                    continue
+                df = self._df[tid]
+                idf = math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+                rows = np.frombuffer(self._rows[tid], dtype=np.uint32)
+                tf = np.frombuffer(self._tfs[tid], dtype=np.uint16).astype(np.float32)
+                norm = self.k1 * (1.0 - self.b + self.b * doc_len[rows] / avg_len)
+                scores[rows] += idf * tf * (self.k1 + 1.0) / (tf + norm)
+            if self.tombstones:
+                scores[np.frombuffer(self._alive, dtype=np.int8) == 0] = 0.0
+            if filters:
+                scores[~self.attributes.mask(filters, len(self.ids))] = 0.0
+            best = top_k(scores, k)
+            return [(self.ids[r], float(scores[r])) for r in best if scores[r] > 0]
+
+    def search_batch(self, queries, k=10, filters=None):
+        return [self.search(q, k, filters) for q in queries]
+
+    def stats(self):
+        postings = sum(len(rows) for rows in self._rows)
+        return {
+            "type": self.index_type,
+            "size": len(self),
+            "tombstones": self.tombstones,
+            "terms": len(self.vocab),
+            "postings": postings,
+            "postings_bytes": postings * 6,
+            "avg_doc_len": round(self._total_len / len(self), 2) if len(self) else 0.0,
+        }
+
+    # ── Persistence ──────────────────────────────────────────
+    def save(self, path):
+        """Write the live documents' postings atomically to `path` (.npz, CSR layout)."""
+        with self._lock:
+            if self.tombstones:
+                self.compact()
+            terms = sorted(self.vocab, key=self.vocab.get)
+            offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(self._rows[self.vocab[t]]) for t in terms])
+            arrays = {
+                "type": np.array(self.index_type),
+                "params": np.array([self.k1, self.b]),
+                "ids": np.array(self.ids, dtype=str),
+                "doc_len": np.frombuffer(self._doc_len, dtype=np.uint32).copy(),
+                "terms": np.array(terms, dtype=str),
+                "offsets": offsets,
+                "rows": np.frombuffer(b"".join(self._rows[self.vocab[t]].tobytes() for t in terms),
+                                      dtype=np.uint32),
+                "tfs": np.frombuffer(b"".join(self._tfs[self.vocab[t]].tobytes() for t in terms),
+                                     dtype=np.uint16),
+                **self.attributes.arrays(np.arange(len(self.ids))),
+            }
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.tmp.npz"
+        np.savez(tmp, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            k1, b = data["params"].tolist()
+            index = cls(k1, b)
+            ids = data["ids"].tolist()
+            doc_len = data["doc_len"]
+            offsets, rows, tfs = data["offsets"], data["rows"], data["tfs"]
+            terms = data["terms"].tolist()
+            index.attributes.load(data, len(ids))
+
+        index.ids = ids
+        index.id_to_row = {doc_id: i for i, doc_id in enumerate(ids)}
+        index._doc_len = array("I", doc_len.astype(np.uint32).tobytes())
+        index._alive = array("b", [1] * len(ids))
+        index._total_len = int(doc_len.sum())
+        doc_terms = [array("I") for _ in ids]
+        for tid, term in enumerate(terms):
+            start, end = offsets[tid], offsets[tid + 1]
+            index.vocab[term] = tid
+            index._rows.append(array("I", rows[start:end].tobytes()))
+            index._tfs.append(array("H", tfs[start:end].tobytes()))
+            index._df.append(int(end - start))
+            for row in rows[start:end]:
+                doc_terms[row].append(tid)
+        index._doc_terms = doc_terms
+        return index
+
+
+def document_text(doc):
+    """Indexed text for a MongoDB document."""
+    return f"{doc.get('title') or ''}\n{doc.get('content') or ''}"
+
+
+def load_texts_from_collection(collection, batch_size=2000):
+    """Read (ids, texts, attributes) for every document in the collection."""
+    ids, texts, attributes = [], [], []
+    for doc in collection.find({}, {"title": 1, "content": 1, **FILTER_PROJECTION}, batch_size=batch_size):
+        ids.append(str(doc["_id"]))
+        texts.append(document_text(doc))
+        attributes.append(document_attributes(doc))
+    return ids, texts, attributes
@@ -1,123 +1,459 @@
 """
 Diagnostic Script: Check Document Embeddings
 Helps identify why semantic search returns no results
+
+The summary never transfers a vector. One aggregation ($facet) counts
+documents per (storage mode, dimension) and per (model, version) on the server.
+For float32 arrays the dimension comes from `$size`. For int8/float16 binary
+storage it comes from `$binarySize`.
+
+`--deep` streams the vectors over batched cursors, one batch in memory at a
+time. It counts NaN/inf and zero-norm vectors, builds the norm distribution,
+and finds duplicate vectors from an 8-byte hash per vector. `--sample N` checks
+a random sample (`$sample`). `--workers N` splits a full scan into `_id` ranges
+scanned in parallel.
+
+`--json` prints the report as JSON instead (`--output` also writes it to a
+file). `--strict` exits 1 when any check fails.
+
+Usage:
+    python check_embeddings.py                         # Counts, dimensions, models
+    python check_embeddings.py --deep --sample 10000   # + vector checks on a sample
+    python check_embeddings.py --deep --workers 4      # + vector checks on every document
+    python check_embeddings.py --deep --json > report.json
 """
-from pymongo import MongoClient
-from dotenv import load_dotenv
+import argparse
+import hashlib
+import json
 import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+from quantization import decode_embedding
+from vector_index import EMBEDDED_FILTER
 
 # Load environment variables
 load_dotenv()
 
-print("=" * 60)
-print("🔍 SEMANTIC SEARCH EMBEDDING DIAGNOSTIC TOOL")
-print("=" * 60)
-
-# Connect to MongoDB
-try:
-    uri = os.getenv('MONGODB_URI')
-    db_name = os.getenv('MONGODB_DB_NAME', 'semantic_search_db')
-    collection_name = os.getenv('MONGODB_COLLECTION_NAME', 'documents')
-    
-    print(f"\n📡 Connecting to MongoDB...")
-    print(f"   URI: {uri[:50]}..." if uri else "   URI: Not found")
-    print(f"   Database: {db_name}")
-    print(f"   Collection: {collection_name}")
-    
-    client = MongoClient(uri, serverSelectionTimeoutMS=5000)
-    client.admin.command('ping')
-    print("   ✓ Connection successful!")
-    
-    db = client[db_name]
-    collection = db[collection_name]
-    
-except Exception as e:
-    print(f"   ✗ Connection failed: {e}")
-    print("\n💡 Make sure your .env file has correct MongoDB URI")
-    exit(1)
-
-# Get all documents
-print(f"\n📊 Fetching documents...")
-docs = list(collection.find())
-print(f"   Total documents found: {len(docs)}")
-
-if len(docs) == 0:
-    print("\n⚠️  WARNING: No documents in database!")
-    print("   → Go to frontend → Sample Data → Load Sample Data")
-    exit(0)
-
-# Check embeddings
-print("\n" + "=" * 60)
-print("📋 EMBEDDING ANALYSIS")
-print("=" * 60)
-
-docs_with_embeddings = 0
-docs_without_embeddings = 0
-embedding_dimensions = []
-
-for i, doc in enumerate(docs, 1):
-    title = doc.get('title', 'No Title')
-    has_embedding = 'embedding' in doc and isinstance(doc.get('embedding'), list) and len(doc.get('embedding', [])) > 0
-    
-    if has_embedding:
-        docs_with_embeddings += 1
-        dim = len(doc['embedding'])
-        embedding_dimensions.append(dim)
-        status = "✓"
-        dim_info = f"({dim} dimensions)"
+# ── Configuration ─────────────────────────────────────────────
+MONGODB_URI = os.getenv("MONGODB_URI")
+DB_NAME = os.getenv("MONGODB_DB_NAME", "semantic_search_db")
+COLLECTION_NAME = os.getenv("MONGODB_COLLECTION_NAME", "documents")
+MODEL_NAME = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+MODEL_VERSION = os.getenv("EMBEDDING_MODEL_VERSION", "1")
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "float32")
+EXPECTED_DIM = 384  # all-MiniLM-L6-v2
+SCAN_BATCH_SIZE = 1000
+NORM_TOLERANCE = 0.02  # int8 storage alone moves a unit norm by well under 1%
+NORM_BINS = np.linspace(0.0, 2.0, 41)
+MAX_EXAMPLES = 5
+
+# ── Server-side summary ───────────────────────────────────────
+# Dimension of the stored embedding, computed in the pipeline: arrays by
+# length, int8 BSON vectors by byte length minus the 2-byte header, float16
+# binaries by byte length / 2. Missing or empty embeddings give 0.
+DIMENSION_EXPR = {"$switch": {
+    "branches": [
+        {"case": {"$isArray": "$embedding"}, "then": {"$size": "$embedding"}},
+        {"case": {"$eq": [{"$type": "$embedding"}, "binData"]}, "then": {"$cond": [
+            {"$eq": ["$embedding_storage", "int8"]},
+            {"$subtract": [{"$binarySize": "$embedding"}, 2]},
+            {"$floor": {"$divide": [{"$binarySize": "$embedding"}, 2]}},
+        ]}},
+    ],
+    "default": 0,
+}}
+
+SUMMARY_PIPELINE = [
+    {"$project": {
+        "_id": 0,
+        "dim": DIMENSION_EXPR,
+        "storage": {"$ifNull": ["$embedding_storage", "float32"]},
+        "model": {"$ifNull": ["$embedding_model", None]},
+        "version": {"$ifNull": ["$embedding_model_version", None]},
+    }},
+    {"$facet": {
+        "dimensions": [{"$group": {"_id": {"storage": "$storage", "dim": "$dim"}, "count": {"$sum": 1}}}],
+        "models": [
+            {"$match": {"dim": {"$gt": 0}}},
+            {"$group": {"_id": {"model": "$model", "version": "$version"}, "count": {"$sum": 1}}},
+        ],
+    }},
+]
+
+DEEP_PROJECTION = {"embedding": 1, "embedding_scale": 1, "embedding_storage": 1}
+
+
+def connect():
+    """(client, collection), or exit with a hint when MongoDB is unreachable."""
+    try:
+        client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=5000)
+        client.admin.command("ping")
+    except Exception as e:
+        print(f"✗ Connection failed: {e}", file=sys.stderr)
+        print("💡 Make sure your .env file has correct MongoDB URI", file=sys.stderr)
+        sys.exit(1)
+    return client, client[DB_NAME][COLLECTION_NAME]
+
+
+def summarize(collection):
+    """Document counts by storage mode, dimension and model — computed by MongoDB."""
+    result = next(collection.aggregate(SUMMARY_PIPELINE, allowDiskUse=True), None) or {}
+
+    total, embedded = 0, 0
+    dimensions, storage = Counter(), Counter()
+    for row in result.get("dimensions", []):
+        dim, count = int(row["_id"].get("dim") or 0), row["count"]
+        total += count
+        if dim > 0:
+            embedded += count
+            dimensions[dim] += count
+            storage[row["_id"].get("storage")] += count
+
+    models = sorted(
+        ({"model": row["_id"].get("model"), "version": row["_id"].get("version"), "count": row["count"]}
+         for row in result.get("models", [])),
+        key=lambda m: -m["count"],
+    )
+    return {
+        "total_documents": total,
+        "with_embedding": embedded,
+        "without_embedding": total - embedded,
+        "dimensions": {str(d): c for d, c in sorted(dimensions.items())},
+        "storage": dict(storage.most_common()),
+        "models": models,
+    }
+
+
+# ── Streaming vector checks ───────────────────────────────────
+def vector_hashes(vectors):
+    """8-byte content hash per row: equal vectors, equal hashes."""
+    return np.array([int.from_bytes(hashlib.blake2b(row.tobytes(), digest_size=8).digest(), "little")
+                     for row in vectors], dtype=np.uint64)
+
+
+class VectorStats:
+    """Running counts over batches of decoded vectors; mergeable across workers."""
+
+    def __init__(self, norm_tolerance=NORM_TOLERANCE):
+        self.norm_tolerance = norm_tolerance
+        self.scanned = 0
+        self.undecodable = 0
+        self.non_finite = 0
+        self.zero_norm = 0
+        self.non_unit = 0
+        self.norm_counts = np.zeros(len(NORM_BINS) - 1, dtype=np.int64)
+        self.norm_sum = 0.0
+        self.norm_sq_sum = 0.0
+        self.norm_min = np.inf
+        self.norm_max = -np.inf
+        self.hashes = []
+        self.examples = {"undecodable": [], "non_finite": [], "zero_norm": [], "non_unit_norm": []}
+
+    def _example(self, check, ids):
+        room = MAX_EXAMPLES - len(self.examples[check])
+        self.examples[check].extend(str(i) for i in ids[:max(0, room)])
+
+    def update(self, docs):
+        """Fold one cursor batch (documents with DEEP_PROJECTION fields) into the counts."""
+        by_dim = {}
+        for doc in docs:
+            self.scanned += 1
+            try:
+                vector = decode_embedding(doc)
+            except ValueError:
+                vector = None
+            if vector is None:
+                self.undecodable += 1
+                self._example("undecodable", [doc["_id"]])
+                continue
+            ids, rows = by_dim.setdefault(vector.shape[0], ([], []))
+            ids.append(doc["_id"])
+            rows.append(vector)
+
+        for ids, rows in by_dim.values():
+            vectors = np.stack(rows)
+            finite = np.isfinite(vectors).all(axis=1)
+            self.non_finite += int((~finite).sum())
+            self._example("non_finite", [i for i, ok in zip(ids, finite) if not ok])
+            self.hashes.append(vector_hashes(vectors))
+
+            ids = [i for i, ok in zip(ids, finite) if ok]
+            norms = np.linalg.norm(vectors[finite].astype(np.float64), axis=1)
+            if norms.size == 0:
+                continue
+            zero = norms < 1e-12
+            off_unit = ~zero & (np.abs(norms - 1.0) > self.norm_tolerance)
+            self.zero_norm += int(zero.sum())
+            self.non_unit += int(off_unit.sum())
+            self._example("zero_norm", [i for i, z in zip(ids, zero) if z])
+            self._example("non_unit_norm", [i for i, o in zip(ids, off_unit) if o])
+            self.norm_counts += np.histogram(np.clip(norms, NORM_BINS[0], NORM_BINS[-1]), bins=NORM_BINS)[0]
+            self.norm_sum += float(norms.sum())
+            self.norm_sq_sum += float((norms ** 2).sum())
+            self.norm_min = min(self.norm_min, float(norms.min()))
+            self.norm_max = max(self.norm_max, float(norms.max()))
+
+    def merge(self, other):
+        for name in ("scanned", "undecodable", "non_finite", "zero_norm", "non_unit",
+                     "norm_sum", "norm_sq_sum"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.norm_counts += other.norm_counts
+        self.norm_min = min(self.norm_min, other.norm_min)
+        self.norm_max = max(self.norm_max, other.norm_max)
+        self.hashes.extend(other.hashes)
+        for check, ids in other.examples.items():
+            self._example(check, ids)
+        return self
+
+    def report(self):
+        hashes = np.concatenate(self.hashes) if self.hashes else np.zeros(0, dtype=np.uint64)
+        counts = np.unique(hashes, return_counts=True)[1]
+        measured = int(self.norm_counts.sum())
+        mean = self.norm_sum / measured if measured else None
+        histogram = {f"{NORM_BINS[b]:.2f}-{NORM_BINS[b + 1]:.2f}": int(c)
+                     for b, c in enumerate(self.norm_counts) if c}
+        return {
+            "scanned": self.scanned,
+            "undecodable": self.undecodable,
+            "non_finite": self.non_finite,
+            "zero_norm": self.zero_norm,
+            "non_unit_norm": self.non_unit,
+            "norm_tolerance": self.norm_tolerance,
+            "norms": {
+                "min": self.norm_min if measured else None,
+                "max": self.norm_max if measured else None,
+                "mean": mean,
+                "std": float(np.sqrt(max(0.0, self.norm_sq_sum / measured - mean ** 2))) if measured else None,
+                "histogram": histogram,
+            },
+            "duplicates": {
+                # Documents whose vector repeats an earlier one, and distinct repeated vectors
+                "documents": int((counts - 1).sum()),
+                "groups": int((counts > 1).sum()),
+            },
+            "examples": {check: ids for check, ids in self.examples.items() if ids},
+        }
+
+
+def scan(cursor, batch_size, norm_tolerance):
+    """VectorStats over one cursor, folded in batches of `batch_size` (the cursor's fetch size)."""
+    stats = VectorStats(norm_tolerance)
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            stats.update(batch)
+            batch = []
+    if batch:
+        stats.update(batch)
+    return stats
+
+
+def id_ranges(collection, workers, total):
+    """`workers` contiguous _id ranges of about equal size, as (low, high) bounds (None = open)."""
+    bounds = [None]
+    for w in range(1, workers):
+        edge = next(collection.find({}, {"_id": 1}).sort("_id", 1).skip(w * total // workers).limit(1), None)
+        if edge is not None and edge["_id"] != bounds[-1]:
+            bounds.append(edge["_id"])
+    bounds.append(None)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def range_filter(low, high):
+    bounds = {**({"$gte": low} if low is not None else {}), **({"$lt": high} if high is not None else {})}
+    return {**EMBEDDED_FILTER, **({"_id": bounds} if bounds else {})}
+
+
+def deep_check(collection, total, sample=None, workers=1, batch_size=SCAN_BATCH_SIZE,
+               norm_tolerance=NORM_TOLERANCE):
+    """Stream embeddings (all, or a `$sample`) through VectorStats; ranges run in parallel."""
+    if sample:
+        # $sample first, so MongoDB can use its random cursor instead of sorting the collection
+        cursor = collection.aggregate([{"$sample": {"size": sample}}, {"$match": EMBEDDED_FILTER},
+                                       {"$project": DEEP_PROJECTION}], batchSize=batch_size)
+        return scan(cursor, batch_size, norm_tolerance)
+
+    def scan_range(bounds):
+        cursor = collection.find(range_filter(*bounds), DEEP_PROJECTION, batch_size=batch_size)
+        return scan(cursor, batch_size, norm_tolerance)
+
+    ranges = id_ranges(collection, workers, total) if workers > 1 else [(None, None)]
+    if len(ranges) == 1:
+        return scan_range(ranges[0])
+    with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+        parts = list(executor.map(scan_range, ranges))
+    stats = parts[0]
+    for part in parts[1:]:
+        stats.merge(part)
+    return stats
+
+
+# ── Findings ──────────────────────────────────────────────────
+def find_issues(summary, deep, expected_dim):
+    """Failed checks as {check, count, message}; empty when everything looks right."""
+    issues = []
+
+    def issue(check, count, message):
+        if count:
+            issues.append({"check": check, "count": int(count), "message": message})
+
+    if summary["total_documents"] == 0:
+        issue("empty_collection", 1, "No documents in database → Frontend → Sample Data → Load Sample Data")
+    issue("missing_embedding", summary["without_embedding"],
+          "Documents without embeddings → run `python reembed.py` or clear & reload sample data")
+    wrong_dim = sum(c for d, c in summary["dimensions"].items() if int(d) != expected_dim)
+    issue("dimension_mismatch", wrong_dim,
+          f"Embeddings not {expected_dim}-dimensional → check EMBEDDING_MODEL in .env, then re-embed")
+    issue("storage_mismatch", sum(c for s, c in summary["storage"].items() if s != EMBEDDING_STORAGE),
+          f"Embeddings not stored as {EMBEDDING_STORAGE} (EMBEDDING_STORAGE) → `python reembed.py` converts them")
+
+    untracked = sum(m["count"] for m in summary["models"] if m["model"] is None)
+    stale = sum(m["count"] for m in summary["models"]
+                if m["model"] is not None and (m["model"], m["version"]) != (MODEL_NAME, MODEL_VERSION))
+    issue("model_mismatch", stale,
+          f"Embedded by another model/version than {MODEL_NAME} v{MODEL_VERSION} → `python reembed.py`")
+    issue("model_untracked", untracked,
+          "Embeddings without embedding_model metadata → `python reembed.py` re-embeds and tags them")
+
+    if deep:
+        issue("undecodable", deep["undecodable"], "Stored embeddings that cannot be decoded")
+        issue("non_finite", deep["non_finite"], "Vectors containing NaN or infinity")
+        issue("zero_norm", deep["zero_norm"], "All-zero vectors (they match nothing under cosine)")
+        issue("non_unit_norm", deep["non_unit_norm"],
+              f"Vectors whose norm is not 1 ± {deep['norm_tolerance']} (the model normalizes its output)")
+        issue("duplicate_vectors", deep["duplicates"]["documents"],
+              f"Documents repeating another document's vector ({deep['duplicates']['groups']} distinct vectors)")
+    return issues
+
+
+# ── Output ────────────────────────────────────────────────────
+def percent(count, total):
+    return f"{count / total * 100:.1f}%" if total else "—"
+
+
+def print_report(report):
+    summary, deep, issues = report["summary"], report["deep"], report["issues"]
+    total = summary["total_documents"]
+
+    print("=" * 60)
+    print("🔍 SEMANTIC SEARCH EMBEDDING DIAGNOSTIC TOOL")
+    print("=" * 60)
+    print(f"\n📡 {report['database']}.{report['collection']} — summary in {report['summary_s']:.2f}s")
+
+    print("\n" + "=" * 60)
+    print("📈 SUMMARY")
+    print("=" * 60)
+    print(f"   Total Documents: {total:,}")
+    print(f"   With Embeddings: {summary['with_embedding']:,} ({percent(summary['with_embedding'], total)})")
+    print(f"   Without Embeddings: {summary['without_embedding']:,} ({percent(summary['without_embedding'], total)})")
+    print(f"   Expected dimension: {report['expected']['dim']} ({report['expected']['model']})")
+    for dim, count in summary["dimensions"].items():
+        flag = "" if int(dim) == report["expected"]["dim"] else "  ⚠️"
+        print(f"      {dim:>6} dims: {count:,}{flag}")
+    print("   Storage: " + ", ".join(f"{s} {c:,}" for s, c in summary["storage"].items()))
+    print("   Models:")
+    for m in summary["models"]:
+        label = f"{m['model']} v{m['version']}" if m["model"] else "(untracked)"
+        print(f"      {label}: {m['count']:,}")
+
+    if deep:
+        norms = deep["norms"]
+        print("\n" + "=" * 60)
+        print(f"🧪 VECTOR CHECKS — {deep['scanned']:,} {'sampled' if report['sample'] else 'scanned'} "
+              f"in {report['deep_s']:.2f}s")
+        print("=" * 60)
+        print(f"   NaN / inf vectors:  {deep['non_finite']:,}")
+        print(f"   Zero-norm vectors:  {deep['zero_norm']:,}")
+        print(f"   Undecodable:        {deep['undecodable']:,}")
+        print(f"   Duplicate vectors:  {deep['duplicates']['documents']:,} docs "
+              f"({deep['duplicates']['groups']:,} distinct vectors)")
+        if norms["mean"] is not None:
+            print(f"   Norms: min {norms['min']:.4f}  mean {norms['mean']:.4f}  "
+                  f"max {norms['max']:.4f}  std {norms['std']:.4f}")
+            print(f"   Off unit norm (± {deep['norm_tolerance']}): {deep['non_unit_norm']:,}")
+            for bucket, count in norms["histogram"].items():
+                print(f"      {bucket}: {count:,}")
+
+    print("\n" + "=" * 60)
+    print("💡 RECOMMENDATIONS")
+    print("=" * 60)
+    for n, found in enumerate(issues, 1):
+        print(f"   {n}. {found['check']}: {found['count']:,}")
+        print(f"      → {found['message']}")
+        examples = (deep or {}).get("examples", {}).get(found["check"])
+        if examples:
+            print(f"      → e.g. {', '.join(examples)}")
+    if not issues:
+        print("   ✓ All documents have valid embeddings!")
+        print("   → Try lowering similarity threshold to 0.0")
+        print("   → Check if search query is too specific")
+        if not deep:
+            print("   → Run with --deep to check the vectors themselves")
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--deep", action="store_true", help="Stream vectors for NaN / norm / duplicate checks")
+    parser.add_argument("--sample", type=int, default=None, help="Deep-check a random sample of N documents")
+    parser.add_argument("--workers", type=int, default=1, help="Parallel _id-range scans for a full deep check")
+    parser.add_argument("--batch-size", type=int, default=SCAN_BATCH_SIZE)
+    parser.add_argument("--expected-dim", type=int, default=EXPECTED_DIM)
+    parser.add_argument("--norm-tolerance", type=float, default=NORM_TOLERANCE)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    parser.add_argument("--strict", action="store_true", help="Exit 1 when any check fails")
+    args = parser.parse_args()
+
+    client, collection = connect()
+    try:
+        started = time.perf_counter()
+        summary = summarize(collection)
+        summary_s = time.perf_counter() - started
+
+        deep, deep_s = None, None
+        if args.deep and summary["with_embedding"]:
+            started = time.perf_counter()
+            deep = deep_check(collection, summary["total_documents"], args.sample, max(1, args.workers),
+                              args.batch_size, args.norm_tolerance).report()
+            deep_s = time.perf_counter() - started
+    finally:
+        client.close()
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "database": DB_NAME,
+        "collection": COLLECTION_NAME,
+        "expected": {"model": MODEL_NAME, "version": MODEL_VERSION, "dim": args.expected_dim,
+                     "storage": EMBEDDING_STORAGE},
+        "summary": summary,
+        "summary_s": round(summary_s, 3),
+        "sample": args.sample if deep else None,
+        "deep": deep,
+        "deep_s": round(deep_s, 3) if deep_s is not None else None,
+        "issues": find_issues(summary, deep, args.expected_dim),
+    }
+    report["ok"] = not report["issues"]
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
     else:
-        docs_without_embeddings += 1
-        status = "✗"
-        dim_info = "NO EMBEDDING"
-    
-    print(f"   {status} Document {i}: {title}")
-    print(f"      → {dim_info}")
-
-# Summary
-print("\n" + "=" * 60)
-print("📈 SUMMARY")
-print("=" * 60)
-print(f"   Total Documents: {len(docs)}")
-print(f"   With Embeddings: {docs_with_embeddings} ({docs_with_embeddings/len(docs)*100:.1f}%)")
-print(f"   Without Embeddings: {docs_without_embeddings} ({docs_without_embeddings/len(docs)*100:.1f}%)")
-
-if embedding_dimensions:
-    print(f"   Embedding Dimensions: {min(embedding_dimensions)} - {max(embedding_dimensions)}")
-    print(f"   Expected: 384 (for all-MiniLM-L6-v2 model)")
-    
-    if 384 not in embedding_dimensions:
-        print(f"\n⚠️  WARNING: Embedding dimensions don't match expected 384!")
-        print("   → This may cause search issues")
-
-# Recommendations
-print("\n" + "=" * 60)
-print("💡 RECOMMENDATIONS")
-print("=" * 60)
-
-if docs_without_embeddings > 0:
-    print("   1. Documents missing embeddings!")
-    print("      → Clear data and reload sample data")
-    print("      → Frontend → Sample Data → Clear All → Load Sample Data")
-    
-if embedding_dimensions and 384 not in embedding_dimensions:
-    print("   2. Embedding dimension mismatch!")
-    print("      → Expected: 384 (all-MiniLM-L6-v2)")
-    print(f"      → Found: {embedding_dimensions[0]}")
-    print("      → Check your EMBEDDING_MODEL in .env")
-
-if docs_with_embeddings > 0 and docs_without_embeddings == 0:
-    print("   ✓ All documents have valid embeddings!")
-    print("   → Try lowering similarity threshold to 0.0")
-    print("   → Check if search query is too specific")
-
-print("\n" + "=" * 60)
-print("🔧 NEXT STEPS")
-print("=" * 60)
-print("   1. If embeddings missing: Clear & reload sample data")
-print("   2. If dimensions wrong: Check .env EMBEDDING_MODEL")
-print("   3. If all good: Lower threshold to 0.0 and test search")
-print("   4. Check Flask terminal for errors during search")
-print("=" * 60)
-
-# Close connection
-client.close()
\ No newline at end of file
+        print_report(report)
+    if args.strict and not report["ok"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
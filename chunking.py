@@ -0,0 +1,182 @@
+"""
+Long-Text Chunking
+Token-bounded, overlapping windows for documents longer than the model's
+max sequence length, with length-bucketed batching and pooling.
+
+sentence-transformers silently truncates input at `max_seq_length`, so a long
+document is otherwise embedded from its first few hundred tokens only. Here
+each document is split into windows of at most `max_tokens` tokens that
+overlap by `overlap` tokens; every window is embedded and the document gets
+either
+  • pooled — one vector: token-weighted mean of its window vectors, or
+  • chunks — the window vectors themselves, indexed as "<doc id>#<n>" and
+             collapsed back to the parent document at search time.
+
+Windows from a whole batch of documents are sorted by token count before
+encoding, so each forward pass pads sequences of similar length instead of
+padding 31 short texts up to one long one.
+"""
+import re
+
+import numpy as np
+
+from quantization import encode_embedding
+
+CHUNKING_MODES = ("off", "pooled", "chunks")
+DEFAULT_MAX_TOKENS = 254           # all-MiniLM-L6-v2: 256 minus [CLS] and [SEP]
+DEFAULT_OVERLAP = 32
+CHUNK_ID_SEP = "#"
+
+# Fallback tokenization when no fast tokenizer is available: words and punctuation
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+
+# ── Chunk ids ────────────────────────────────────────────────
+def chunk_id(doc_id, index):
+    return f"{doc_id}{CHUNK_ID_SEP}{index}"
+
+
+def parent_id(entry_id):
+    return entry_id.split(CHUNK_ID_SEP, 1)[0]
+
+
+def collapse_hits(hits, k):
+    """Keep each parent document's best-scoring chunk; hits are (id, score), best first."""
+    best = {}
+    for entry_id, score in hits:
+        parent = parent_id(entry_id)
+        if parent not in best:
+            best[parent] = score
+            if len(best) == k:
+                break
+    return list(best.items())
+
+
+def chunk_records(windows, storage="float32"):
+    """`chunks` array stored on a document in "chunks" mode (empty for a single window)."""
+    if len(windows) <= 1:
+        return []
+    records = []
+    for start, end, vector in windows:
+        fields = encode_embedding(vector, storage)
+        record = {"start": start, "end": end, "embedding": fields["embedding"]}
+        if "embedding_scale" in fields:
+            record["embedding_scale"] = fields["embedding_scale"]
+        records.append(record)
+    return records
+
+
+# ── Pooling / batching ───────────────────────────────────────
+def pool(vectors, weights):
+    """Weighted mean of window vectors, L2-normalized (a single window is returned as is)."""
+    if len(vectors) == 1:
+        return vectors[0]
+    pooled = np.average(vectors, axis=0, weights=np.asarray(weights, dtype=np.float32))
+    norm = np.linalg.norm(pooled)
+    return pooled / norm if norm else pooled
+
+
+def encode_bucketed(texts, lengths, encode_fn, batch_size=None):
+    """
+    Encode texts in ascending length order and return rows in input order.
+    With `batch_size`, each sorted slice is one encode_fn call; otherwise the
+    whole sorted list goes to encode_fn at once.
+    """
+    order = np.argsort(np.asarray(lengths), kind="stable")
+    sorted_texts = [texts[i] for i in order]
+    if batch_size:
+        parts = [np.asarray(encode_fn(sorted_texts[i:i + batch_size]), dtype=np.float32)
+                 for i in range(0, len(sorted_texts), batch_size)]
+        encoded = np.vstack(parts)
+    else:
+        encoded = np.asarray(encode_fn(sorted_texts), dtype=np.float32)
+    out = np.empty_like(encoded)
+    out[order] = encoded
+    return out
+
+
+def padding_efficiency(lengths, batch_size):
+    """Real tokens / padded tokens when `lengths` are batched in the given order."""
+    lengths = np.asarray(lengths)
+    padded = sum(int(lengths[i:i + batch_size].max()) * len(lengths[i:i + batch_size])
+                 for i in range(0, len(lengths), batch_size))
+    return float(lengths.sum()) / padded if padded else 1.0
+
+
+class Chunker:
+    """Split texts into token windows and embed them (pooled or per chunk)."""
+
+    def __init__(self, tokenizer=None, max_tokens=DEFAULT_MAX_TOKENS, overlap=DEFAULT_OVERLAP):
+        if overlap >= max_tokens:
+            raise ValueError("overlap must be smaller than max_tokens")
+        self.tokenizer = tokenizer if getattr(tokenizer, "is_fast", False) else None
+        self.max_tokens = max_tokens
+        self.overlap = overlap
+
+    @classmethod
+    def from_model(cls, model, max_tokens=None, overlap=DEFAULT_OVERLAP):
+        """Use a SentenceTransformer's own tokenizer and sequence limit."""
+        limit = getattr(model, "max_seq_length", None)
+        return cls(getattr(model, "tokenizer", None),
+                   max_tokens or (limit - 2 if limit else DEFAULT_MAX_TOKENS), overlap)
+
+    @classmethod
+    def from_pretrained(cls, model_name, max_tokens=None, overlap=DEFAULT_OVERLAP):
+        """Load only the tokenizer (e.g. when encoding happens in worker processes)."""
+        from transformers import AutoTokenizer
+        return cls(AutoTokenizer.from_pretrained(model_name), max_tokens or DEFAULT_MAX_TOKENS, overlap)
+
+    # ── Splitting ────────────────────────────────────────────
+    def token_spans(self, text):
+        """(start, end) character offsets of each token, without special tokens."""
+        if self.tokenizer is None:
+            return [m.span() for m in _WORD_RE.finditer(text)]
+        encoded = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True,
+                                 truncation=False, verbose=False)
+        return [span for span in encoded["offset_mapping"] if span[1] > span[0]]
+
+    def windows(self, text):
+        """[(start, end, n_tokens)] character windows covering the text."""
+        spans = self.token_spans(text)
+        if len(spans) <= self.max_tokens:
+            return [(0, len(text), max(len(spans), 1))]
+        stride = self.max_tokens - self.overlap
+        windows = []
+        for first in range(0, len(spans), stride):
+            last = min(first + self.max_tokens, len(spans))
+            windows.append((spans[first][0], spans[last - 1][1], last - first))
+            if last == len(spans):
+                break
+        return windows
+
+    def needs_split(self, text):
+        # Cheap pre-check: a text can't exceed max_tokens with fewer characters than that
+        return len(text) > self.max_tokens and len(self.windows(text)) > 1
+
+    # ── Embedding ────────────────────────────────────────────
+    def embed_documents(self, texts, encode_fn, batch_size=None):
+        """
+        Embed each text from its windows. Returns (pooled, chunks): an (n, dim)
+        array with one pooled vector per text, and per text a list of
+        (start, end, vector) windows.
+        """
+        owners, pieces, lengths, spans = [], [], [], []
+        for i, text in enumerate(texts):
+            for start, end, n_tokens in self.windows(text):
+                owners.append(i)
+                pieces.append(text[start:end])
+                lengths.append(n_tokens)
+                spans.append((start, end))
+        vectors = encode_bucketed(pieces, lengths, encode_fn, batch_size)
+
+        owners = np.asarray(owners)
+        bounds = np.searchsorted(owners, np.arange(len(texts) + 1))
+        pooled, chunks = [], []
+        for i in range(len(texts)):
+            rows = slice(bounds[i], bounds[i + 1])
+            pooled.append(pool(vectors[rows], lengths[rows]))
+            chunks.append([(s, e, v) for (s, e), v in zip(spans[rows], vectors[rows])])
+        return np.vstack(pooled).astype(np.float32), chunks
+
+    def embed_pooled(self, texts, encode_fn, batch_size=None):
+        return self.embed_documents(texts, encode_fn, batch_size)[0]
@@ -0,0 +1,352 @@
+"""
+Semantic Search Engine — Near-Duplicate Detection
+Finds documents whose embeddings are near-identical and marks them, so search
+can collapse copies of the same article.
+
+Pairs are never compared all against all. The vectors are partitioned with
+spherical k-means (the IVF quantizer from vector_index), each vector joining
+its `--probes` nearest lists, and pairs are scored only within a list, one
+bounded block at a time. Near-duplicates (cosine ≥ --threshold) lie close
+together and almost always share a list. `--lists 1` scores every pair
+exactly, still in blocks: use it for small collections, or to measure what
+the partitioning misses.
+
+Pairs above the threshold are joined into clusters (union-find, so A≈B and
+B≈C put A and C together). The oldest document of a cluster (smallest _id) is
+its canonical copy. Batched bulk_write updates set, on every member:
+  duplicate_cluster  the canonical document's id, as a string (also on the canonical)
+  duplicate_of       the canonical _id (copies only)
+  duplicate_score    cosine similarity to the canonical (copies only)
+Flags from an earlier run that no longer hold are removed. Documents whose
+flags are already right are not rewritten.
+
+Memory stays bounded. The vectors are streamed from MongoDB (in parallel
+`_id` ranges) into a memory-mapped scratch file. Only one list and one score
+block per worker are in memory at a time. `--workers` threads compare lists
+in parallel, because numpy releases the GIL in the matrix products.
+
+Usage:
+    python dedup.py                              # Find and mark near-duplicates
+    python dedup.py --dry-run                    # Report clusters without writing
+    python dedup.py --threshold 0.98 --workers 8
+    python dedup.py --lists 1                    # Exact blocked all-pairs (small collections)
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+
+from check_embeddings import id_ranges, range_filter
+from quantization import decode_embedding
+from vector_index import (ASSIGN_CHUNK, EMBEDDED_FILTER, KMEANS_SAMPLE_PER_LIST, MIN_TRAIN_SIZE,
+                          SCORE_BLOCK_ELEMENTS, normalize, spherical_kmeans)
+
+load_dotenv()
+
+# ── Configuration ─────────────────────────────────────────────
+MONGODB_URI = os.getenv("MONGODB_URI")
+DB_NAME = os.getenv("MONGODB_DB_NAME", "semantic_search_db")
+COLLECTION_NAME = os.getenv("MONGODB_COLLECTION_NAME", "documents")
+SCRATCH_PATH = os.getenv("DEDUP_SCRATCH_PATH", "data/dedup_vectors.npy")
+THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", 0.95))
+PROBES = 2
+SCAN_BATCH_SIZE = 1000
+WRITE_BATCH_SIZE = 1000
+TOP_CLUSTERS = 5
+
+DUPLICATE_FIELDS = ("duplicate_of", "duplicate_cluster", "duplicate_score")
+SCAN_PROJECTION = {"embedding": 1, "embedding_scale": 1, **{field: 1 for field in DUPLICATE_FIELDS}}
+
+
+# ── Scan ──────────────────────────────────────────────────────
+class Scratch:
+    """Normalized vectors streamed into a memory-mapped .npy file, with their _ids."""
+
+    def __init__(self, path, capacity):
+        self.path = path
+        self.capacity = capacity
+        self.vectors = None
+        self.ids = []
+        self.flags = {}                 # _id → (duplicate_of, duplicate_cluster, duplicate_score) as stored
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, docs):
+        """Decode one batch and write it after the rows already stored."""
+        decoded = [(d, decode_embedding(d)) for d in docs]
+        decoded = [(d, v) for d, v in decoded if v is not None]
+        with self._lock:
+            for d in docs:
+                if any(field in d for field in DUPLICATE_FIELDS):
+                    self.flags[d["_id"]] = tuple(d.get(field) for field in DUPLICATE_FIELDS)
+            if not decoded:
+                return
+            if self.vectors is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self.vectors = np.lib.format.open_memmap(self.path, mode="w+", dtype=np.float32,
+                                                         shape=(self.capacity, decoded[0][1].shape[0]))
+            dim = self.vectors.shape[1]
+            kept = [(d, v) for d, v in decoded if v.shape[0] == dim]
+            # Documents inserted after the count have no room; the next run picks them up
+            room = self.capacity - len(self.ids)
+            self.skipped += len(docs) - min(len(kept), room)
+            kept = kept[:room]
+            if kept:
+                start = len(self.ids)
+                self.vectors[start:start + len(kept)] = normalize(np.vstack([v for _, v in kept]))
+                self.ids.extend(d["_id"] for d, _ in kept)
+
+    def matrix(self):
+        return self.vectors[:len(self.ids)] if self.vectors is not None else np.empty((0, 0), np.float32)
+
+    def close(self, keep=False):
+        self.vectors = None
+        if not keep and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def scan_collection(collection, scratch, workers=1, batch_size=SCAN_BATCH_SIZE):
+    """Stream every embedded document into `scratch`, `workers` _id ranges at a time."""
+    def scan_range(bounds):
+        cursor = collection.find(range_filter(*bounds), dict(SCAN_PROJECTION), batch_size=batch_size)
+        batch = []
+        for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                scratch.append(batch)
+                batch = []
+        if batch:
+            scratch.append(batch)
+
+    ranges = id_ranges(collection, workers, collection.count_documents({})) if workers > 1 else [(None, None)]
+    with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+        list(executor.map(scan_range, ranges))
+
+
+# ── Candidate pairs ───────────────────────────────────────────
+def default_lists(n):
+    """About √n lists of about √n vectors; small collections are compared exactly."""
+    return 1 if n < MIN_TRAIN_SIZE else int(np.sqrt(n))
+
+
+def partition(vectors, lists, probes=PROBES, seed=0):
+    """Row arrays of the k-means lists, each row placed in its `probes` nearest lists."""
+    n = vectors.shape[0]
+    if lists <= 1 or n < 2:
+        return [np.arange(n)]
+    rng = np.random.default_rng(seed)
+    sample = np.asarray(vectors[np.sort(rng.choice(n, min(n, lists * KMEANS_SAMPLE_PER_LIST), replace=False))])
+    centroids = spherical_kmeans(sample, lists, seed=seed)
+    lists, probes = centroids.shape[0], min(probes, centroids.shape[0])
+
+    labels = np.empty((n, probes), dtype=np.int32)
+    for start in range(0, n, ASSIGN_CHUNK):
+        scores = np.asarray(vectors[start:start + ASSIGN_CHUNK]) @ centroids.T
+        labels[start:start + ASSIGN_CHUNK] = np.argpartition(-scores, probes - 1, axis=1)[:, :probes]
+    labels = labels.ravel()
+    order = np.argsort(labels, kind="stable")
+    rows = np.repeat(np.arange(n), probes)[order]
+    bounds = np.searchsorted(labels[order], np.arange(lists + 1))
+    return [rows[bounds[i]:bounds[i + 1]] for i in range(lists) if bounds[i + 1] - bounds[i] > 1]
+
+
+def list_pairs(vectors, rows, threshold):
+    """(left, right) rows of every pair in one list scoring ≥ threshold, left < right within the list."""
+    rows = np.sort(rows)
+    members = np.asarray(vectors[rows])
+    # Bound each score block to ~64 MB of float32; block i is scored against members i.. only
+    block = max(1, SCORE_BLOCK_ELEMENTS // rows.size)
+    left, right = [], []
+    for start in range(0, rows.size, block):
+        scores = members[start:start + block] @ members[start:].T
+        i, j = np.nonzero(scores >= threshold)
+        upper = j > i
+        left.append(rows[start + i[upper]])
+        right.append(rows[start + j[upper]])
+    return np.concatenate(left), np.concatenate(right)
+
+
+# ── Clustering ────────────────────────────────────────────────
+class DisjointSet:
+    """Union-find over row numbers; created lazily per row so memory follows the duplicates."""
+
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, x):
+        parent = self.parent
+        root = parent.setdefault(x, x)
+        while root != parent[root]:
+            parent[root] = parent[parent[root]]
+            root = parent[root]
+        return root
+
+    def union(self, left, right):
+        for a, b in zip(left.tolist(), right.tolist()):
+            ra, rb = self.find(a), self.find(b)
+            if ra != rb:
+                self.parent[max(ra, rb)] = min(ra, rb)
+
+    def groups(self):
+        groups = {}
+        for x in self.parent:
+            groups.setdefault(self.find(x), []).append(x)
+        return [rows for rows in groups.values() if len(rows) > 1]
+
+
+def find_clusters(vectors, threshold=THRESHOLD, lists=None, probes=PROBES, workers=1):
+    """(clusters as row lists, pairs found, lists compared); lists run on `workers` threads."""
+    parts = partition(vectors, default_lists(vectors.shape[0]) if lists is None else lists, probes)
+    # Largest lists first, so a long tail of small ones balances the threads
+    parts.sort(key=len, reverse=True)
+    sets, pairs = DisjointSet(), 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(list_pairs, vectors, rows, threshold) for rows in parts]
+        for future in as_completed(futures):
+            left, right = future.result()
+            pairs += left.size
+            sets.union(left, right)
+    return sets.groups(), pairs, len(parts)
+
+
+def cluster_members(vectors, ids, clusters):
+    """[(canonical row, [(copy row, similarity to canonical)])], oldest _id as the canonical."""
+    members = []
+    for rows in clusters:
+        canonical = min(rows, key=lambda r: ids[r])
+        copies = [r for r in rows if r != canonical]
+        scores = np.asarray(vectors[copies]) @ np.asarray(vectors[canonical])
+        members.append((canonical, list(zip(copies, scores.tolist()))))
+    return members
+
+
+# ── Write-back ────────────────────────────────────────────────
+def plan_updates(ids, members, flags):
+    """UpdateOnes that bring every document's duplicate fields to the new clustering."""
+    stale = dict(flags)
+    updates = []
+
+    def update(doc_id, fields):
+        wanted = tuple(fields.get(field) for field in DUPLICATE_FIELDS)
+        if stale.pop(doc_id, None) == wanted:
+            return
+        unset = {field: "" for field in DUPLICATE_FIELDS if field not in fields}
+        updates.append(UpdateOne({"_id": doc_id}, {"$set": fields, **({"$unset": unset} if unset else {})}))
+
+    for canonical, copies in members:
+        cluster = str(ids[canonical])
+        update(ids[canonical], {"duplicate_cluster": cluster})
+        for row, score in copies:
+            update(ids[row], {"duplicate_of": ids[canonical], "duplicate_cluster": cluster,
+                              "duplicate_score": round(score, 4)})
+    # Flagged by an earlier run but no longer part of any cluster
+    updates.extend(UpdateOne({"_id": doc_id}, {"$unset": {field: "" for field in DUPLICATE_FIELDS}})
+                   for doc_id in stale)
+    return updates
+
+
+def write_updates(collection, updates, workers=1, batch_size=WRITE_BATCH_SIZE):
+    """Apply the updates as unordered bulk_write batches on `workers` threads; returns documents modified."""
+    batches = [updates[i:i + batch_size] for i in range(0, len(updates), batch_size)]
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(batches)))) as executor:
+        results = executor.map(lambda batch: collection.bulk_write(batch, ordered=False), batches)
+        return sum(result.modified_count for result in results)
+
+
+def print_clusters(collection, ids, members, limit=TOP_CLUSTERS):
+    top = sorted(members, key=lambda m: len(m[1]), reverse=True)[:limit]
+    titles = {d["_id"]: d.get("title", "") for d in collection.find(
+        {"_id": {"$in": [ids[canonical] for canonical, _ in top]}}, {"title": 1})}
+    print("\n📚 Largest clusters:")
+    for canonical, copies in top:
+        lowest = min(score for _, score in copies)
+        print(f"   {len(copies) + 1:>5} docs  min sim {lowest:.3f}  {ids[canonical]}  "
+              f"{titles.get(ids[canonical], '')[:50]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="Cosine similarity of a duplicate")
+    parser.add_argument("--lists", type=int, default=None, help="k-means lists (default √n; 1 = all pairs)")
+    parser.add_argument("--probes", type=int, default=PROBES, help="Lists each vector joins")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=SCAN_BATCH_SIZE)
+    parser.add_argument("--scratch", default=SCRATCH_PATH, help="Memory-mapped vector file used during the run")
+    parser.add_argument("--keep-scratch", action="store_true")
+    parser.add_argument("--dry-run", action="store_true", help="Report clusters without writing")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🧬 SEMANTIC SEARCH ENGINE — NEAR-DUPLICATE DETECTION")
+    print("=" * 60)
+
+    try:
+        client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=5000)
+        client.admin.command("ping")
+        collection = client[DB_NAME][COLLECTION_NAME]
+        print(f"   ✅ Connected to {DB_NAME}/{COLLECTION_NAME}")
+    except Exception as e:
+        print(f"   ❌ Connection failed: {e}")
+        sys.exit(1)
+
+    total = collection.count_documents(EMBEDDED_FILTER)
+    if total == 0:
+        print("⚠️  No embedded documents — seed the collection first (python seed.py)")
+        return
+    print(f"   {total:,} embedded documents, threshold {args.threshold}, {args.workers} workers")
+
+    started = time.perf_counter()
+    timings = {}
+    scratch = Scratch(args.scratch, total)
+    try:
+        print("\n📥 Streaming embeddings...")
+        scan_collection(collection, scratch, args.workers, args.batch_size)
+        vectors = scratch.matrix()
+        timings["scan"] = time.perf_counter() - started
+        print(f"   {len(scratch):,} vectors × {vectors.shape[1]} dims"
+              + (f" ({scratch.skipped:,} skipped: other dimension or inserted during the scan)"
+                 if scratch.skipped else ""))
+
+        stage = time.perf_counter()
+        clusters, pairs, lists = find_clusters(vectors, args.threshold, args.lists, args.probes, args.workers)
+        members = cluster_members(vectors, scratch.ids, clusters)
+        timings["compare"] = time.perf_counter() - stage
+        copies = sum(len(c) for _, c in members)
+        print(f"🔎 {lists:,} lists compared: {pairs:,} pairs ≥ {args.threshold} → "
+              f"{len(members):,} clusters, {copies:,} duplicate documents")
+
+        if members:
+            print_clusters(collection, scratch.ids, members)
+
+        stage = time.perf_counter()
+        updates = plan_updates(scratch.ids, members, scratch.flags)
+        if args.dry_run:
+            print(f"\n📝 Dry run: {len(updates):,} documents would be updated")
+        else:
+            modified = write_updates(collection, updates, args.workers)
+            print(f"\n📝 Updated {modified:,} documents")
+        timings["write"] = time.perf_counter() - stage
+    finally:
+        scratch.close(keep=args.keep_scratch)
+
+    wall = time.perf_counter() - started
+    n = max(len(scratch), 1)
+    print("\n" + "=" * 60)
+    print(f"🎉 Done in {wall:.2f}s — {n / wall:,.0f} docs/s")
+    for name, seconds in timings.items():
+        print(f"   {name:>8}: {seconds:>7.2f}s  ({n / max(seconds, 1e-9):>10,.0f} docs/s)")
+    print("=" * 60)
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
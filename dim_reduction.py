@@ -0,0 +1,168 @@
+"""
+Dimension Reduction
+Low-dimensional projections of the embeddings for two-stage search: every
+row is scanned in, say, 64 dims, then only the best few hundred are
+re-scored with the full vectors (vector_index.ReducedIndex).
+
+  pca     the top principal directions of the corpus. The projection is
+          uncentered, so inner products are kept as well as any rank-d linear
+          map can keep them. It is fitted on a sample of the stored embeddings.
+  prefix  the first d coordinates, re-normalized. This is for
+          Matryoshka-trained models, whose leading dimensions are trained to
+          work on their own.
+
+`python dim_reduction.py` fits a projection on the collection and saves it to
+REDUCED_PROJECTION_PATH (.npz). The NLP service then reuses it instead of
+fitting its own when the index is built.
+`python bench_reduction.py` reports latency and memory against recall@10.
+
+Usage:
+    python dim_reduction.py                            # Fit a 64-d PCA on the stored embeddings
+    python dim_reduction.py --dim 128 --method prefix  # Matryoshka truncation
+    python dim_reduction.py --report 32 64 128 192     # Energy kept per target dimension
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+METHODS = ("pca", "prefix")
+DEFAULT_DIM = 64
+# Rows used to estimate the second-moment matrix
+FIT_SAMPLE = 50000
+
+
+def _unit(vectors):
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+class Projection:
+    """Linear map from `source_dim` to `dim` dimensions (PCA basis or prefix truncation)."""
+
+    def __init__(self, method, source_dim, dim, components=None):
+        if method not in METHODS:
+            raise ValueError(f"Unknown reduction method '{method}' (expected one of {METHODS})")
+        if not 0 < dim <= source_dim:
+            raise ValueError(f"Reduced dimension must be in 1..{source_dim}, got {dim}")
+        if method == "pca" and (components is None or components.shape != (dim, source_dim)):
+            raise ValueError(f"PCA projection needs ({dim}, {source_dim}) components")
+        self.method = method
+        self.source_dim = source_dim
+        self.dim = dim
+        self.components = None if components is None else np.ascontiguousarray(components, dtype=np.float32)
+
+    def apply(self, vectors):
+        """(n, dim) float32 reduced copies of (n, source_dim) normalized vectors."""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.source_dim)
+        if self.method == "prefix":
+            return _unit(vectors[:, :self.dim])
+        return vectors @ self.components.T
+
+    def retained_energy(self, vectors):
+        """Share of the vectors' squared norm the reduced coordinates keep (1.0 = lossless)."""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.source_dim)
+        reduced = vectors[:, :self.dim] if self.method == "prefix" else vectors @ self.components.T
+        return float(np.square(reduced).sum() / max(np.square(vectors).sum(), 1e-12))
+
+    # ── Persistence ──────────────────────────────────────────
+    def arrays(self, prefix="projection_"):
+        arrays = {
+            f"{prefix}method": np.array(self.method),
+            f"{prefix}source_dim": np.array(self.source_dim),
+            f"{prefix}dim": np.array(self.dim),
+        }
+        if self.components is not None:
+            arrays[f"{prefix}components"] = self.components
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, data, prefix="projection_"):
+        components = data[f"{prefix}components"] if f"{prefix}components" in data else None
+        return cls(str(data[f"{prefix}method"]), int(data[f"{prefix}source_dim"]), int(data[f"{prefix}dim"]),
+                   components)
+
+    def save(self, path):
+        """Write atomically to `path` (.npz)."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.tmp.npz"
+        np.savez(tmp, **self.arrays())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls.from_arrays(data)
+
+
+def principal_basis(vectors, sample=FIT_SAMPLE, seed=0):
+    """(eigenvalues, eigenvectors as rows), largest first, of the uncentered second-moment matrix."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.shape[0] > sample:
+        vectors = vectors[np.random.default_rng(seed).choice(vectors.shape[0], sample, replace=False)]
+    moment = (vectors.T.astype(np.float64) @ vectors.astype(np.float64)) / max(1, vectors.shape[0])
+    values, basis = np.linalg.eigh(moment)
+    return values[::-1], basis[:, ::-1].T
+
+
+def fit_projection(vectors, dim=DEFAULT_DIM, method="pca", sample=FIT_SAMPLE, seed=0):
+    """Projection of `vectors` (n, source_dim) down to `dim` dimensions."""
+    source_dim = np.asarray(vectors).shape[1]
+    if method == "prefix":
+        return Projection("prefix", source_dim, dim)
+    _, basis = principal_basis(vectors, sample, seed)
+    return Projection("pca", source_dim, dim, basis[:dim])
+
+
+def main():
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    from vector_index import load_from_collection
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dim", type=int, default=int(os.getenv("LOCAL_INDEX_REDUCED_DIM", DEFAULT_DIM)))
+    parser.add_argument("--method", choices=METHODS, default=os.getenv("LOCAL_INDEX_REDUCTION", "pca"))
+    parser.add_argument("--sample", type=int, default=FIT_SAMPLE, help="Rows used to fit the PCA basis")
+    parser.add_argument("--output", default=os.getenv("REDUCED_PROJECTION_PATH", "data/projection.npz"))
+    parser.add_argument("--report", type=int, nargs="+", default=[32, 64, 128, 192],
+                        help="Also print the energy kept at these dimensions")
+    args = parser.parse_args()
+
+    client = MongoClient(os.getenv("MONGODB_URI"), serverSelectionTimeoutMS=5000)
+    collection = client[os.getenv("MONGODB_DB_NAME", "semantic_search_db")][
+        os.getenv("MONGODB_COLLECTION_NAME", "documents")]
+    print("📊 Loading embeddings from MongoDB...")
+    _, vectors, _ = load_from_collection(collection)
+    client.close()
+    if vectors is None:
+        print("⚠️  No embedded documents — seed the collection first (python seed.py)")
+        return
+    vectors = _unit(vectors)
+    print(f"   {vectors.shape[0]:,} vectors × {vectors.shape[1]} dims")
+
+    started = time.perf_counter()
+    source_dim = vectors.shape[1]
+    if args.method == "pca":
+        values, basis = principal_basis(vectors, args.sample)
+        projection = Projection("pca", source_dim, args.dim, basis[:args.dim])
+        energy = lambda dim: float(values[:dim].sum() / values.sum())  # noqa: E731
+    else:
+        projection = Projection("prefix", source_dim, args.dim)
+        energy = lambda dim: Projection("prefix", source_dim, dim).retained_energy(vectors)  # noqa: E731
+    print(f"🧮 Fitted {args.method} → {args.dim} dims in {time.perf_counter() - started:.2f}s")
+
+    print(f"\n{'dims':>6} {'energy kept':>12}")
+    for dim in sorted(set(args.report) | {args.dim}):
+        if dim <= source_dim:
+            print(f"{dim:>6} {energy(dim):>11.1%}{'  ←' if dim == args.dim else ''}")
+
+    projection.save(args.output)
+    print(f"\n✅ Saved {args.method} projection ({vectors.shape[1]} → {args.dim}) to {args.output}")
+    print("   Use it with LOCAL_INDEX_TYPE=reduced (restart the NLP service to rebuild the index)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Content-Addressed Embedding Cache
+Keys embeddings by (model name, normalized text hash).
+
+Two tiers:
+  • memory — LRU bounded by the total bytes of the cached vectors
+  • disk   — optional SQLite table keyed by hash that survives restarts
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text):
+    """Canonical form used for hashing: NFC, trimmed, single-spaced."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def cache_key(model_name, text):
+    """Content address of a text for a given model."""
+    payload = f"{model_name}\0{normalize_text(text)}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+def content_hash(text):
+    """Model-independent hash of a document's text, stored as `content_hash`."""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class DiskTier:
+    """SQLite-backed persistent store of float32 vectors keyed by hash."""
+
+    def __init__(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, dim INTEGER NOT NULL, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get_many(self, keys):
+        if not keys:
+            return {}
+        found = {}
+        with self._lock:
+            # SQLite caps bound parameters; query in slices
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype="<f4")
+        return found
+
+    def put_many(self, items):
+        if not items:
+            return
+        rows = [(k, int(v.shape[0]), np.asarray(v, dtype="<f4").tobytes()) for k, v in items]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, dim, vector) VALUES (?, ?, ?)", rows
+            )
+            self._conn.commit()
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class EmbeddingCache:
+    """Byte-bounded LRU of embeddings with an optional persistent tier."""
+
+    def __init__(self, model_name, max_bytes=64 * 1024 * 1024, disk_path=None):
+        self.model_name = model_name
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.disk = DiskTier(disk_path) if disk_path else None
+
+        self.hits = REGISTRY.counter("embed_cache_hits_total", "Memory-tier hits")
+        self.disk_hits = REGISTRY.counter("embed_cache_disk_hits_total", "Disk-tier hits")
+        self.misses = REGISTRY.counter("embed_cache_misses_total", "Texts that had to be encoded")
+        self.evictions = REGISTRY.counter("embed_cache_evictions_total", "LRU evictions")
+        REGISTRY.gauge("embed_cache_bytes", "Bytes held in memory tier", func=lambda: self._bytes)
+        REGISTRY.gauge("embed_cache_entries", "Entries in memory tier", func=lambda: len(self._entries))
+
+    # ── Memory tier ──────────────────────────────────────────
+    def _mem_get(self, key):
+        with self._lock:
+            vec = self._entries.get(key)
+            if vec is not None:
+                self._entries.move_to_end(key)
+            return vec
+
+    def _mem_put(self, key, vec):
+        size = vec.nbytes
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[key] = vec
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions.inc()
+
+    # ── Public API ───────────────────────────────────────────
+    def lookup(self, texts):
+        """
+        Resolve texts against both tiers.
+        Returns (keys, vectors) where vectors[i] is None for a miss.
+        """
+        keys = [cache_key(self.model_name, t) for t in texts]
+        vectors = [self._mem_get(k) for k in keys]
+        self.hits.inc(sum(1 for v in vectors if v is not None))
+
+        missing = [k for k, v in zip(keys, vectors) if v is None]
+        if missing and self.disk:
+            from_disk = self.disk.get_many(list(set(missing)))
+            for i, k in enumerate(keys):
+                if vectors[i] is None and k in from_disk:
+                    vectors[i] = from_disk[k]
+                    self._mem_put(k, from_disk[k])
+                    self.disk_hits.inc()
+
+        self.misses.inc(sum(1 for v in vectors if v is None))
+        return keys, vectors
+
+    def store(self, keys, vectors):
+        """Insert freshly encoded vectors into both tiers."""
+        items = []
+        for k, v in zip(keys, vectors):
+            v = np.ascontiguousarray(v, dtype=np.float32)
+            self._mem_put(k, v)
+            items.append((k, v))
+        if self.disk:
+            self.disk.put_many(items)
+
+    def get_or_encode(self, texts, encode_fn):
+        """
+        Return an (n, dim) float32 array for texts, encoding only cache misses.
+        Duplicate misses within one call are encoded once.
+        """
+        keys, vectors = self.lookup(texts)
+        pending = {}
+        for i, (k, v) in enumerate(zip(keys, vectors)):
+            if v is None:
+                pending.setdefault(k, []).append(i)
+
+        if pending:
+            miss_keys = list(pending)
+            miss_texts = [texts[pending[k][0]] for k in miss_keys]
+            encoded = np.asarray(encode_fn(miss_texts), dtype=np.float32)
+            self.store(miss_keys, encoded)
+            for k, vec in zip(miss_keys, encoded):
+                for i in pending[k]:
+                    vectors[i] = vec
+
+        return np.vstack(vectors).astype(np.float32, copy=False)
+
+    def stats(self):
+        return {
+            "model": self.model_name,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits.value,
+            "disk_hits": self.disk_hits.value,
+            "misses": self.misses.value,
+            "evictions": self.evictions.value,
+            "disk_path": self.disk.path if self.disk else None,
+        }
@@ -0,0 +1,289 @@
+"""
+Embedding Store
+Append-only, memory-mapped float32 copy of the corpus vectors on local disk.
+
+MongoDB stays the source of truth, but reading every `embedding` out of it
+materializes each vector as a list of Python floats — slow at startup and
+several times the raw size in memory. The store keeps the same vectors as one
+raw float32 matrix that a search process maps with np.memmap: opening it is a
+few syscalls, pages are read lazily, and every process that maps the same
+files shares them through the OS page cache instead of holding its own copy.
+
+Layout of the store directory, for the current generation g:
+  meta.json            {"dim", "generation"}
+  vectors.<g>.f32      row-major float32 rows (L2-normalized), append-only
+  ids.<g>.txt          one id per line; line i names row i, optionally
+                       followed by a tab and its filter attributes as JSON
+  tombstones.<g>.u32   uint32 numbers of deleted rows, append-only
+
+Appending an id that is already stored supersedes its old row. Deletes are
+tombstones; compact() rewrites the live rows as generation g+1 and then swaps
+meta.json, so a reader still mapping generation g keeps a consistent view
+until its next refresh(). Writers in different processes serialize on a lock
+file (POSIX only; on Windows keep a single writer process).
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from vector_index import normalize
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+META_FILE = "meta.json"
+LOCK_FILE = "lock"
+COMPACT_BLOCK_ROWS = 65536
+
+
+def _line(doc_id, attributes):
+    """ids-file line for one row."""
+    if not attributes:
+        return f"{doc_id}\n"
+    return f"{doc_id}\t{json.dumps(attributes, separators=(',', ':'))}\n"
+
+
+class EmbeddingStore:
+    """
+    Memory-mapped (ids, vectors) store. `vectors` is a read-only memmap over
+    every row (tombstones included); `alive`, `ids` and `id_to_row` describe
+    which rows are live, and `attributes` holds each row's filter attributes.
+    Opening an existing store needs no `dim`; creating one does.
+    recreate=True discards a store whose dim does not match.
+    """
+
+    def __init__(self, path, dim=None, recreate=False):
+        self.path = path
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+        with self._file_lock():
+            meta = self._read_meta()
+            if meta is not None and dim is not None and meta["dim"] != dim:
+                if not recreate:
+                    raise ValueError(f"Embedding store at {path} holds {meta['dim']}-dim vectors, expected {dim}")
+                self._remove_generation(meta["generation"])
+                meta = None
+            if meta is None:
+                if dim is None:
+                    raise ValueError(f"No embedding store at {path}; pass dim to create one")
+                meta = {"dim": int(dim), "generation": 0}
+                self._create_generation(0)
+                self._write_meta(meta)
+        self.dim = meta["dim"]
+        self.row_bytes = self.dim * np.dtype(np.float32).itemsize
+        self._open(meta["generation"])
+
+    # ── Files ────────────────────────────────────────────────
+    def _file(self, kind, generation=None):
+        ext = {"vectors": "f32", "ids": "txt", "tombstones": "u32"}[kind]
+        return os.path.join(self.path, f"{kind}.{self.generation if generation is None else generation}.{ext}")
+
+    def _read_meta(self):
+        try:
+            with open(os.path.join(self.path, META_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self, meta):
+        path = os.path.join(self.path, META_FILE)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, path)
+
+    def _create_generation(self, generation):
+        for kind in ("vectors", "ids", "tombstones"):
+            open(self._file(kind, generation), "wb").close()
+
+    def _remove_generation(self, generation):
+        for kind in ("vectors", "ids", "tombstones"):
+            try:
+                os.remove(self._file(kind, generation))
+            except OSError:
+                pass        # missing, or still mapped on Windows
+
+    @contextmanager
+    def _file_lock(self):
+        """Cross-process writer lock."""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.path, LOCK_FILE), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    # ── Reading ──────────────────────────────────────────────
+    def _open(self, generation):
+        self.generation = generation
+        self.ids = []                  # row → id
+        self.id_to_row = {}            # id → live row
+        self.attributes = []           # row → filter attributes (or None)
+        self.alive = np.zeros(0, dtype=bool)
+        self.rows = 0
+        self.vectors = np.zeros((0, self.dim), dtype=np.float32)
+        self._ids_offset = 0
+        self._tombstones_offset = 0
+        self._read_tail()
+
+    def _read_tail(self):
+        """Pick up rows and tombstones appended since the last read; returns whether any were."""
+        try:
+            vector_rows = os.path.getsize(self._file("vectors")) // self.row_bytes
+            with open(self._file("ids"), "rb") as f:
+                f.seek(self._ids_offset)
+                data = f.read()
+            with open(self._file("tombstones"), "rb") as f:
+                f.seek(self._tombstones_offset)
+                dead = f.read()
+        except FileNotFoundError:
+            return False            # generation was just compacted away; refresh() reopens
+
+        # Only complete lines, and never more ids than fully written rows
+        lines = data[:data.rfind(b"\n") + 1].split(b"\n")[:-1]
+        lines = lines[:max(0, vector_rows - self.rows)]
+        dead = np.frombuffer(dead[:len(dead) - len(dead) % 4], dtype=np.uint32)
+        if not lines and not dead.size:
+            return False
+
+        if lines:
+            self._ids_offset += sum(len(line) + 1 for line in lines)
+            start, end = self.rows, self.rows + len(lines)
+            if end > self.alive.shape[0]:
+                alive = np.zeros(max(end, 2 * self.alive.shape[0], 1024), dtype=bool)
+                alive[:start] = self.alive[:start]
+                self.alive = alive
+            self.alive[start:end] = True
+            for row, line in enumerate(lines, start):
+                doc_id, _, attributes = line.decode().partition("\t")
+                self.attributes.append(json.loads(attributes) if attributes else None)
+                old = self.id_to_row.get(doc_id)
+                if old is not None:
+                    self.alive[old] = False
+                self.id_to_row[doc_id] = row
+                self.ids.append(doc_id)
+            self.rows = end
+            self.vectors = np.memmap(self._file("vectors"), dtype=np.float32, mode="r",
+                                     shape=(self.rows, self.dim))
+
+        self._tombstones_offset += dead.nbytes
+        for row in dead.tolist():
+            if row < self.rows and self.alive[row]:
+                self.alive[row] = False
+                doc_id = self.ids[row]
+                if self.id_to_row.get(doc_id) == row:
+                    del self.id_to_row[doc_id]
+        return True
+
+    def _sync(self):
+        meta = self._read_meta()
+        if meta is not None and meta["generation"] != self.generation:
+            self._open(meta["generation"])
+            return True
+        return self._read_tail()
+
+    def refresh(self):
+        """Catch up with writes (and compactions) made by other processes; returns whether anything changed."""
+        with self._lock:
+            return self._sync()
+
+    def __len__(self):
+        return len(self.id_to_row)
+
+    @property
+    def tombstones(self):
+        return self.rows - len(self.id_to_row)
+
+    def live_rows(self):
+        return np.flatnonzero(self.alive[:self.rows])
+
+    def live_ids(self):
+        with self._lock:
+            return [self.ids[r] for r in self.live_rows()]
+
+    def live(self):
+        """(ids, vectors, attributes) of the live rows; vectors is an (n, dim) float32 copy."""
+        with self._lock:
+            rows = self.live_rows()
+            return ([self.ids[r] for r in rows], np.asarray(self.vectors[rows]),
+                    [self.attributes[r] for r in rows])
+
+    # ── Writing ──────────────────────────────────────────────
+    def append(self, ids, vectors, attributes=None):
+        """
+        Append (or supersede) rows by id; vectors are L2-normalized on the way
+        in. `attributes` is one filter-attribute dict (or None) per id.
+        """
+        ids = [str(i) for i in ids]
+        if not ids:
+            return 0
+        if any("\n" in i or "\t" in i for i in ids):
+            raise ValueError("Embedding store ids cannot contain tabs or newlines")
+        lines = [_line(doc_id, a) for doc_id, a in zip(ids, attributes or [None] * len(ids))]
+        vectors = np.ascontiguousarray(normalize(vectors).reshape(-1, self.dim))
+        with self._lock, self._file_lock():
+            self._sync()
+            with open(self._file("vectors"), "r+b") as f:
+                # Drop a partial tail left by a writer that died before its ids landed
+                f.truncate(self.rows * self.row_bytes)
+                f.seek(0, os.SEEK_END)
+                f.write(vectors.tobytes())
+            with open(self._file("ids"), "ab") as f:
+                f.write("".join(lines).encode())
+            self._read_tail()
+        return len(ids)
+
+    def remove(self, ids):
+        """Tombstone rows by id; returns how many were live."""
+        with self._lock, self._file_lock():
+            self._sync()
+            rows = [self.id_to_row[i] for i in map(str, ids) if i in self.id_to_row]
+            if rows:
+                with open(self._file("tombstones"), "ab") as f:
+                    f.write(np.asarray(rows, dtype=np.uint32).tobytes())
+                self._read_tail()
+        return len(rows)
+
+    def compact(self):
+        """Rewrite the live rows as a new generation, dropping tombstones."""
+        with self._lock, self._file_lock():
+            self._sync()
+            self._rewrite(self.live_rows())
+
+    def clear(self):
+        """Drop every row."""
+        with self._lock, self._file_lock():
+            self._sync()
+            self._rewrite(np.zeros(0, dtype=np.int64))
+
+    def _rewrite(self, rows):
+        old, new = self.generation, self.generation + 1
+        with open(self._file("vectors", new), "wb") as f:
+            for start in range(0, rows.size, COMPACT_BLOCK_ROWS):
+                f.write(np.ascontiguousarray(self.vectors[rows[start:start + COMPACT_BLOCK_ROWS]]).tobytes())
+        with open(self._file("ids", new), "wb") as f:
+            f.write("".join(_line(self.ids[r], self.attributes[r]) for r in rows).encode())
+        open(self._file("tombstones", new), "wb").close()
+        self._write_meta({"dim": self.dim, "generation": new})
+        self._open(new)
+        # Readers mapping the old files keep them alive until they refresh
+        self._remove_generation(old)
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "generation": self.generation,
+            "size": len(self),
+            "rows": self.rows,
+            "tombstones": self.tombstones,
+            "dim": self.dim,
+            "file_bytes": self.rows * self.row_bytes,
+        }
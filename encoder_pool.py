@@ -0,0 +1,235 @@
+"""
+Multi-Process Encoder Pool
+Shards encode work across worker processes, each holding its own model.
+
+Every worker is pinned to its own slice of the CPUs (Linux
+sched_setaffinity) and sets its encoder's intra-op thread count (torch or
+ONNX Runtime, see encoders.py) to match, so N workers use N independent
+core groups instead of contending for one interpreter and one thread pool. Large batches are split into
+contiguous shards, encoded in parallel and reassembled in input order.
+
+Workers are forked as soon as the pool is constructed, before the parent
+imports torch or starts threads, so create the pool early.
+
+Each worker has its own task queue, so the pool knows which worker holds
+every task. If a worker process dies (OOM kill, crash in torch/ONNX), a
+monitor thread fails that worker's in-flight tasks, marks the pool unhealthy
+and sends further work to the workers still alive. encode() also takes a
+timeout, so a caller is never stuck on a lost task.
+"""
+import itertools
+import logging
+import math
+import multiprocessing as mp
+import multiprocessing.connection
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_EXCEPTION, Future, wait
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Don't split a batch into shards smaller than this
+MIN_SHARD_SIZE = 16
+
+
+def cpu_groups(workers):
+    """Split the CPUs this process may run on into `workers` disjoint groups."""
+    if hasattr(os, "sched_getaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+    else:
+        cpus = list(range(os.cpu_count() or 1))
+    if workers >= len(cpus):
+        return [[cpus[i % len(cpus)]] for i in range(workers)]
+    per = len(cpus) // workers
+    groups = [cpus[i * per:(i + 1) * per] for i in range(workers)]
+    # Spread leftover CPUs over the first groups
+    for i, cpu in enumerate(cpus[workers * per:]):
+        groups[i].append(cpu)
+    return groups
+
+
+def _worker_main(index, model_name, backend, cores, threads, tasks, results):
+    """Worker loop: pin, load the model, then encode shards until told to stop."""
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads)
+
+    try:
+        from encoders import load_encoder
+        model = load_encoder(model_name, backend, threads)
+        results.put(("ready", index, (model.get_sentence_embedding_dimension(), model.max_seq_length)))
+    except Exception as e:
+        results.put(("failed", index, repr(e)))
+        return
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        task_id, texts, batch_size = task
+        try:
+            emb = model.encode(texts, batch_size=batch_size, convert_to_tensor=False)
+            results.put(("ok", task_id, np.asarray(emb, dtype=np.float32)))
+        except Exception as e:
+            results.put(("error", task_id, repr(e)))
+
+
+class EncoderPool:
+    """Fan encode calls out to pinned worker processes."""
+
+    def __init__(self, model_name, workers, threads_per_worker=None, batch_size=32, backend=None):
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+        self.model_name = model_name
+        self.workers = workers
+        self.batch_size = batch_size
+        self.dimension = None
+        self.max_seq_length = None
+
+        ctx = mp.get_context("fork")
+        self._tasks = [ctx.Queue() for _ in range(workers)]
+        self._results = ctx.Queue()
+        self._pending = {}              # task_id → (future, worker index)
+        self._dead = set()
+        self._closing = False
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._ready_count = 0
+        self.error = None
+
+        self.core_groups = cpu_groups(workers)
+        self._procs = []
+        for i, cores in enumerate(self.core_groups):
+            threads = threads_per_worker or len(cores)
+            proc = ctx.Process(target=_worker_main, name=f"encoder-{i}", daemon=True,
+                               args=(i, model_name, backend, cores, threads, self._tasks[i], self._results))
+            proc.start()
+            self._procs.append(proc)
+
+        self._collector = threading.Thread(target=self._collect, name="encoder-pool-results", daemon=True)
+        self._collector.start()
+        self._monitor = threading.Thread(target=self._watch, name="encoder-pool-monitor", daemon=True)
+        self._monitor.start()
+        logger.info(f"Encoder pool: {workers} workers on CPU groups {self.core_groups}")
+
+    # ── Result routing ───────────────────────────────────────
+    def _collect(self):
+        while True:
+            kind, key, payload = self._results.get()
+            if kind == "ready":
+                self.dimension, self.max_seq_length = payload
+                self._ready_count += 1
+                if self._ready_count == self.workers:
+                    self._ready.set()
+                continue
+            if kind == "failed":
+                self.error = f"encoder-{key} failed to start: {payload}"
+                logger.error(self.error)
+                self._ready.set()
+                continue
+            with self._lock:
+                future, _ = self._pending.pop(key, (None, None))
+            if future is None:
+                continue                # abandoned after a timeout
+            if kind == "ok":
+                future.set_result(payload)
+            else:
+                future.set_exception(RuntimeError(payload))
+
+    def _watch(self):
+        """Wait on the worker processes' sentinels and handle each one that exits."""
+        live = {proc.sentinel: i for i, proc in enumerate(self._procs)}
+        while live:
+            for sentinel in mp.connection.wait(list(live)):
+                self._worker_exited(live.pop(sentinel))
+
+    def _worker_exited(self, index):
+        with self._lock:
+            self._dead.add(index)
+            orphaned = [task_id for task_id, (_, worker) in self._pending.items() if worker == index]
+            futures = [self._pending.pop(task_id)[0] for task_id in orphaned]
+        if self._closing:
+            return
+        self._procs[index].join(1)      # reap it, so exitcode is set
+        error = f"encoder-{index} exited with code {self._procs[index].exitcode}"
+        logger.error(f"{error}; failing {len(futures)} in-flight task(s)")
+        self.error = self.error or error
+        self._ready.set()               # wake wait_ready() if the pool was still starting
+        for future in futures:
+            future.set_exception(RuntimeError(error))
+
+    # ── Public API ───────────────────────────────────────────
+    def wait_ready(self, timeout=None):
+        """Block until every worker has loaded its model."""
+        if not self._ready.wait(timeout):
+            raise TimeoutError("Encoder workers did not start in time")
+        if self.error:
+            raise RuntimeError(self.error)
+        return self.dimension
+
+    @property
+    def is_ready(self):
+        return self._ready.is_set() and not self.error
+
+    def _submit(self, texts):
+        """(task_id, future) for one shard, queued on the live worker with the fewest tasks."""
+        future = Future()
+        task_id = next(self._ids)
+        with self._lock:
+            live = [i for i in range(self.workers) if i not in self._dead]
+            if not live:
+                raise RuntimeError(self.error or "No encoder workers alive")
+            load = Counter(worker for _, worker in self._pending.values())
+            worker = min(live, key=lambda i: load[i])
+            self._pending[task_id] = (future, worker)
+        self._tasks[worker].put((task_id, texts, self.batch_size))
+        return task_id, future
+
+    def encode(self, texts, timeout=None):
+        """
+        Encode texts across the workers; returns an (n, dim) array in input order.
+        Raises TimeoutError when the workers have not answered within `timeout` seconds.
+        """
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.dimension or 0), dtype=np.float32)
+        shards = min(self.workers, max(1, math.ceil(len(texts) / MIN_SHARD_SIZE)))
+        size = math.ceil(len(texts) / shards)
+        submitted = [self._submit(texts[i:i + size]) for i in range(0, len(texts), size)]
+        # A failed shard (e.g. its worker died) fails the call without waiting for the others
+        _, late = wait([future for _, future in submitted], timeout=timeout, return_when=FIRST_EXCEPTION)
+        if late:
+            with self._lock:
+                for task_id, _ in submitted:
+                    self._pending.pop(task_id, None)
+            failed = next((f for _, f in submitted if f.done() and f.exception()), None)
+            if failed is not None:
+                raise failed.exception()
+            raise TimeoutError(f"Encoder workers did not answer within {timeout}s")
+        return np.vstack([future.result() for _, future in submitted])
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "ready_workers": self._ready_count,
+            "dead_workers": sorted(self._dead),
+            "error": self.error,
+            "core_groups": self.core_groups,
+            "in_flight": len(self._pending),
+        }
+
+    def close(self, timeout=5):
+        self._closing = True
+        for tasks in self._tasks:
+            tasks.put(None)
+        deadline = time.monotonic() + timeout
+        for proc in self._procs:
+            proc.join(max(0.0, deadline - time.monotonic()))
+            if proc.is_alive():
+                proc.terminate()
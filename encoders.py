@@ -0,0 +1,242 @@
+"""
+Encoders
+One place to load the sentence encoder, with selectable CPU backends:
+
+  torch      sentence-transformers on eager PyTorch fp32 (the reference)
+  onnx       the transformer exported to an ONNX Runtime graph
+  onnx-int8  the same graph with dynamically int8-quantized weights
+
+The ONNX backends run only the transformer in the graph; tokenization
+(same tokenizer, lower-casing, truncation at max_seq_length) and pooling
+(mean / CLS / max over the attention mask, then L2 normalization when the
+model has a Normalize module) are replayed in numpy from the model's own
+configuration, so outputs match the torch path up to float rounding.
+`python bench_encoders.py` checks the cosine agreement and compares speed.
+
+Export needs torch + sentence-transformers and happens once, on first load,
+into ENCODER_ONNX_DIR/<model>/ (or ahead of time with `python encoders.py`).
+Serving from an exported directory needs only onnxruntime and transformers.
+
+Every encoder exposes the subset of the SentenceTransformer API the scripts
+use: encode(), get_sentence_embedding_dimension(), max_seq_length,
+tokenizer, and tokenize() / forward() per batch (for tracing).
+
+Usage:
+    python encoders.py                          # export onnx + onnx-int8 for EMBEDDING_MODEL
+    python encoders.py --backend onnx-int8 --force
+"""
+import argparse
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+BACKENDS = ("torch", "onnx", "onnx-int8")
+ONNX_FILES = {"onnx": "model.onnx", "onnx-int8": "model_int8.onnx"}
+CONFIG_FILE = "encoder.json"
+POOLING_MODES = ("mean", "cls", "max")
+ONNX_OPSET = 14
+
+
+def resolve_backend(backend=None):
+    """Validated backend name; defaults to ENCODER_BACKEND (read at call time, after .env is loaded)."""
+    backend = (backend or os.getenv("ENCODER_BACKEND", "torch")).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown ENCODER_BACKEND '{backend}' (expected {', '.join(BACKENDS)})")
+    return backend
+
+
+def encoder_id(model_name, backend=None):
+    """Model identity for caches: quantized outputs must not be served as fp32 ones."""
+    backend = resolve_backend(backend)
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+
+def export_dir(model_name):
+    return os.path.join(os.getenv("ENCODER_ONNX_DIR", "data/onnx"), model_name.replace("/", "__"))
+
+
+def load_encoder(model_name, backend=None, threads=None):
+    """Encoder for `model_name` on the chosen backend, exporting the ONNX graph if needed."""
+    backend = resolve_backend(backend)
+    if backend == "torch":
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+
+    directory = export_dir(model_name)
+    if not os.path.exists(os.path.join(directory, ONNX_FILES[backend])):
+        export_onnx(model_name, directory, quantize=(backend == "onnx-int8"))
+    return OnnxEncoder(directory, backend, threads)
+
+
+# ── Export ───────────────────────────────────────────────────
+def _pipeline_config(model):
+    """Tokenizer / pooling / normalization settings of a SentenceTransformer."""
+    modules = list(model)
+    names = [type(m).__name__ for m in modules]
+    if names[0] != "Transformer" or any(n not in ("Transformer", "Pooling", "Normalize") for n in names):
+        raise ValueError(f"ONNX export supports Transformer → Pooling → Normalize models, got {' → '.join(names)}")
+    pooling = next((m for m in modules if type(m).__name__ == "Pooling"), None)
+    if pooling is None:
+        raise ValueError("ONNX export needs a Pooling module")
+    modes = [mode for mode in POOLING_MODES if getattr(pooling, f"pooling_mode_{mode}_tokens", False)
+             or getattr(pooling, f"pooling_mode_{mode}_token", False)]
+    if len(modes) != 1:
+        raise ValueError(f"ONNX export supports exactly one of {POOLING_MODES} pooling, got {modes or 'none'}")
+    return {
+        "dim": model.get_sentence_embedding_dimension(),
+        "max_seq_length": model.max_seq_length,
+        "do_lower_case": bool(getattr(modules[0], "do_lower_case", False)),
+        "pooling": modes[0],
+        "normalize": "Normalize" in names,
+    }
+
+
+def export_onnx(model_name, directory=None, quantize=True, force=False):
+    """
+    Export the transformer of `model_name` to <directory>/model.onnx (token
+    embeddings out), plus model_int8.onnx when `quantize`; returns the directory.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    directory = directory or export_dir(model_name)
+    os.makedirs(directory, exist_ok=True)
+    fp32_path = os.path.join(directory, ONNX_FILES["onnx"])
+
+    if force or not os.path.exists(fp32_path):
+        logger.info(f"Exporting {model_name} to ONNX in {directory} ...")
+        started = time.perf_counter()
+        model = SentenceTransformer(model_name, device="cpu")
+        config = _pipeline_config(model)
+        transformer = model[0].auto_model.eval()
+        features = model.tokenize(["Semantic search finds documents by meaning."])
+        input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in features]
+
+        class TokenEmbeddings(torch.nn.Module):
+            def __init__(self):
+                super().__init__()
+                self.transformer = transformer
+
+            def forward(self, *inputs):
+                return self.transformer(**dict(zip(input_names, inputs)), return_dict=True).last_hidden_state
+
+        tmp_path = f"{fp32_path}.tmp"
+        with torch.no_grad():
+            torch.onnx.export(
+                TokenEmbeddings(), tuple(features[n] for n in input_names), tmp_path,
+                input_names=input_names, output_names=["token_embeddings"],
+                dynamic_axes={**{n: {0: "batch", 1: "sequence"} for n in input_names},
+                              "token_embeddings": {0: "batch", 1: "sequence"}},
+                opset_version=ONNX_OPSET, do_constant_folding=True,
+            )
+        os.replace(tmp_path, fp32_path)
+        model.tokenizer.save_pretrained(directory)
+        with open(os.path.join(directory, CONFIG_FILE), "w") as f:
+            json.dump({"model": model_name, **config}, f, indent=2)
+        # A stale int8 graph would no longer match the new export
+        if os.path.exists(os.path.join(directory, ONNX_FILES["onnx-int8"])):
+            os.remove(os.path.join(directory, ONNX_FILES["onnx-int8"]))
+        logger.info(f"ONNX export done in {time.perf_counter() - started:.1f}s")
+
+    int8_path = os.path.join(directory, ONNX_FILES["onnx-int8"])
+    if quantize and (force or not os.path.exists(int8_path)):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        logger.info("Quantizing ONNX weights to int8 ...")
+        quantize_dynamic(fp32_path, f"{int8_path}.tmp", weight_type=QuantType.QInt8, per_channel=True)
+        os.replace(f"{int8_path}.tmp", int8_path)
+    return directory
+
+
+# ── ONNX Runtime encoder ─────────────────────────────────────
+class OnnxEncoder:
+    """SentenceTransformer-compatible encoder over an exported ONNX graph."""
+
+    def __init__(self, directory, backend="onnx", threads=None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(directory, CONFIG_FILE)) as f:
+            self.config = json.load(f)
+        self.backend = backend
+        self.max_seq_length = self.config["max_seq_length"]
+        self.tokenizer = AutoTokenizer.from_pretrained(directory)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(os.path.join(directory, ONNX_FILES[backend]), options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def get_sentence_embedding_dimension(self):
+        return self.config["dim"]
+
+    def tokenize(self, texts):
+        texts = [t.strip() for t in texts]
+        if self.config["do_lower_case"]:
+            texts = [t.lower() for t in texts]
+        features = self.tokenizer(texts, padding=True, truncation="longest_first",
+                                  max_length=self.max_seq_length, return_tensors="np")
+        return {name: features[name].astype(np.int64) for name in self.input_names}
+
+    def forward(self, features):
+        tokens = self.session.run(None, features)[0]
+        mask = features["attention_mask"][..., None].astype(tokens.dtype)
+        pooling = self.config["pooling"]
+        if pooling == "mean":
+            pooled = (tokens * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        elif pooling == "cls":
+            pooled = tokens[:, 0]
+        else:
+            pooled = np.where(mask > 0, tokens, -1e9).max(axis=1)
+        if self.config["normalize"]:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return {"sentence_embedding": pooled.astype(np.float32)}
+
+    def encode(self, sentences, batch_size=32, normalize_embeddings=False, **_):
+        """Same contract as SentenceTransformer.encode with convert_to_numpy."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        # Longest first, like sentence-transformers, so batches pad to similar lengths
+        order = np.argsort([-len(t) for t in texts], kind="stable")
+        out = np.zeros((len(texts), self.config["dim"]), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            rows = order[start:start + batch_size]
+            out[rows] = self.forward(self.tokenize([texts[i] for i in rows]))["sentence_embedding"]
+        if normalize_embeddings:
+            out /= np.clip(np.linalg.norm(out, axis=1, keepdims=True), 1e-12, None)
+        return out[0] if single else out
+
+
+def main():
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=os.getenv("EMBEDDING_MODEL", DEFAULT_MODEL))
+    parser.add_argument("--backend", choices=["onnx", "onnx-int8"], default="onnx-int8",
+                        help="onnx exports the fp32 graph only; onnx-int8 also quantizes it")
+    parser.add_argument("--force", action="store_true", help="Re-export even if the files exist")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    directory = export_onnx(args.model, quantize=(args.backend == "onnx-int8"), force=args.force)
+    print(f"✅ Exported {args.model} → {directory}")
+    for backend, name in ONNX_FILES.items():
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            print(f"   {backend:>10}: {path} ({os.path.getsize(path) / 2**20:,.1f}MB)")
+
+
+if __name__ == "__main__":
+    main()
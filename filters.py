@@ -0,0 +1,149 @@
+"""
+Search Filters
+Categorical document attributes kept per index row, for filtered vector and
+BM25 search.
+
+Documents carry `category` (seed.py) or `metadata.category` and
+`metadata.difficulty` (the Express routes). FILTER_FIELDS maps each filterable
+attribute to the document paths it is read from, first match wins. Every
+index keeps one int32 code column per attribute (RowAttributes), so a filter
+such as {"category": ["AI", "Data"], "difficulty": "advanced"} becomes a few
+vectorized comparisons: a bitmap over the rows that the search then scans,
+instead of scanning everything and dropping hits afterwards.
+"""
+import numpy as np
+
+# attribute → document paths it is read from
+FILTER_FIELDS = {
+    "category": ("category", "metadata.category"),
+    "difficulty": ("metadata.difficulty", "difficulty"),
+}
+FILTER_PROJECTION = {path: 1 for paths in FILTER_FIELDS.values() for path in paths}
+
+
+def _lookup(doc, path):
+    for key in path.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(key)
+    return doc
+
+
+def document_attributes(doc):
+    """{attribute: value} for the filterable attributes a MongoDB document has."""
+    attributes = {}
+    for field, paths in FILTER_FIELDS.items():
+        for path in paths:
+            value = _lookup(doc, path)
+            if value not in (None, ""):
+                attributes[field] = str(value)
+                break
+    return attributes
+
+
+def parse_filter(spec):
+    """
+    Validate a request filter {attribute: value | [values]} into
+    {attribute: [values]}; None when there is nothing to filter on.
+    Raises ValueError for unknown attributes or malformed values.
+    """
+    if spec in (None, {}):
+        return None
+    if not isinstance(spec, dict):
+        raise ValueError("'filter' must be an object of attribute → value(s)")
+    filters = {}
+    for field, values in spec.items():
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Unknown filter attribute '{field}' (filterable: {', '.join(FILTER_FIELDS)})")
+        values = values if isinstance(values, list) else [values]
+        if not values or any(not isinstance(v, str) or not v for v in values):
+            raise ValueError(f"Filter '{field}' needs a non-empty string or array of strings")
+        filters[field] = values
+    return filters
+
+
+class RowAttributes:
+    """
+    Per-row categorical attributes as int32 code columns (-1 = missing).
+    Rows line up with the owning index's rows; columns grow on demand.
+    """
+
+    def __init__(self):
+        self.vocab = {field: {} for field in FILTER_FIELDS}      # value → code
+        self.codes = {field: np.zeros(0, dtype=np.int32) for field in FILTER_FIELDS}
+        self.size = 0
+
+    def _reserve(self, end):
+        capacity = next(iter(self.codes.values())).shape[0]
+        if end <= capacity:
+            return
+        capacity = max(end, 2 * capacity, 1024)
+        for field, column in self.codes.items():
+            grown = np.full(capacity, -1, dtype=np.int32)
+            grown[:self.size] = column[:self.size]
+            self.codes[field] = grown
+
+    def set(self, start, attributes):
+        """Assign attribute dicts (or None) to rows start, start+1, ..."""
+        end = start + len(attributes)
+        self._reserve(end)
+        for field, column in self.codes.items():
+            vocab = self.vocab[field]
+            column[start:end] = [
+                vocab.setdefault(a[field], len(vocab)) if a and a.get(field) is not None else -1
+                for a in attributes
+            ]
+        self.size = max(self.size, end)
+
+    def take(self, rows):
+        """Keep only `rows`, renumbered from 0 (index compaction)."""
+        for field, column in self.codes.items():
+            self.codes[field] = self._padded(column, rows)[rows]
+        self.size = len(rows)
+
+    def _padded(self, column, rows):
+        """Column long enough for every row in `rows`; rows never set read as missing."""
+        rows = np.asarray(rows)
+        size = max(self.size, int(rows.max()) + 1 if rows.size else 0)
+        if column.shape[0] >= size:
+            return column[:size]
+        return np.concatenate([column, np.full(size - column.shape[0], -1, dtype=np.int32)])
+
+    def mask(self, filters, size):
+        """Bool bitmap over `size` rows: True where every filtered attribute has one of its values."""
+        allowed = np.ones(size, dtype=bool)
+        for field, values in filters.items():
+            vocab = self.vocab[field]
+            # Lookup table over codes; its last slot (index -1) is "missing"
+            table = np.zeros(len(vocab) + 1, dtype=bool)
+            table[[vocab[v] for v in values if v in vocab]] = True
+            column = self.codes[field][:size]
+            allowed[:column.shape[0]] &= table[column]
+            allowed[column.shape[0]:] = False
+        return allowed
+
+    def _names(self, field):
+        names = [None] * len(self.vocab[field])
+        for value, code in self.vocab[field].items():
+            names[code] = value
+        return names
+
+    def stats(self):
+        return {field: len(vocab) for field, vocab in self.vocab.items()}
+
+    # ── Persistence ──────────────────────────────────────────
+    def arrays(self, rows):
+        """npz arrays for the given rows."""
+        arrays = {}
+        for field, column in self.codes.items():
+            arrays[f"attr_{field}"] = self._padded(column, rows)[rows]
+            arrays[f"attr_{field}_values"] = np.array(self._names(field), dtype=str)
+        return arrays
+
+    def load(self, data, size):
+        for field in FILTER_FIELDS:
+            if f"attr_{field}" not in data:
+                continue
+            self.vocab[field] = {v: i for i, v in enumerate(data[f"attr_{field}_values"].tolist())}
+            self.codes[field] = data[f"attr_{field}"].astype(np.int32)
+        self.size = size
@@ -0,0 +1,195 @@
+"""
+Lightweight in-process metrics for the NLP microservice.
+Thread-safe counters, gauges and fixed-bucket histograms that can be
+dumped as a JSON-friendly snapshot or in the Prometheus text format.
+"""
+import re
+import threading
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _metric_name(name):
+    return re.sub(r"[^a-zA-Z0-9_:]", "_", name)
+
+
+def _header(metric, kind):
+    name = _metric_name(metric.name)
+    lines = [f"# HELP {name} {metric.help}"] if metric.help else []
+    lines.append(f"# TYPE {name} {kind}")
+    return name, lines
+
+
+def _number(value):
+    return "+Inf" if value == float("inf") else repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonically increasing counter."""
+
+    def __init__(self, name, help_text=""):
+        self.name = name
+        self.help = help_text
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def snapshot(self):
+        return self._value
+
+    def prometheus(self):
+        name, lines = _header(self, "counter")
+        lines.append(f"{name} {_number(self.value)}")
+        return lines
+
+
+class Gauge:
+    """Value that can go up and down, or be read from a callback."""
+
+    def __init__(self, name, help_text="", func=None):
+        self.name = name
+        self.help = help_text
+        self._value = 0
+        self._func = func
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self._value -= amount
+
+    @property
+    def value(self):
+        return self._func() if self._func else self._value
+
+    def snapshot(self):
+        return self.value
+
+    def prometheus(self):
+        name, lines = _header(self, "gauge")
+        lines.append(f"{name} {_number(self.value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative histogram over fixed upper bounds (Prometheus-style buckets)."""
+
+    def __init__(self, name, buckets, help_text=""):
+        self.name = name
+        self.help = help_text
+        self.buckets = sorted(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self._sum += value
+            self._count += 1
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self._counts[i] += 1
+                    return
+            self._counts[-1] += 1
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket containing it."""
+        with self._lock:
+            if self._count == 0:
+                return None
+            target = q * self._count
+            running = 0
+            for i, c in enumerate(self._counts):
+                running += c
+                if running >= target:
+                    return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+    def snapshot(self):
+        with self._lock:
+            cumulative, running = {}, 0
+            for bound, c in zip(self.buckets, self._counts):
+                running += c
+                cumulative[str(bound)] = running
+            cumulative["+Inf"] = running + self._counts[-1]
+            count, total = self._count, self._sum
+        return {
+            "count": count,
+            "sum": round(total, 6),
+            "mean": round(total / count, 6) if count else None,
+            "buckets": cumulative,
+        }
+
+    def prometheus(self):
+        name, lines = _header(self, "histogram")
+        with self._lock:
+            running = 0
+            for bound, c in zip(self.buckets, self._counts):
+                running += c
+                lines.append(f'{name}_bucket{{le="{_number(bound)}"}} {running}')
+            lines.append(f'{name}_bucket{{le="+Inf"}} {running + self._counts[-1]}')
+            lines.append(f"{name}_sum {_number(float(self._sum))}")
+            lines.append(f"{name}_count {self._count}")
+        return lines
+
+
+class Registry:
+    """Named collection of metrics."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help_text=""):
+        return self._register(Counter(name, help_text))
+
+    def gauge(self, name, help_text="", func=None):
+        return self._register(Gauge(name, help_text, func))
+
+    def histogram(self, name, buckets, help_text=""):
+        return self._register(Histogram(name, buckets, help_text))
+
+    def snapshot(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {m.name: m.snapshot() for m in metrics}
+
+    def prometheus(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        return "\n".join(line for m in metrics for line in m.prometheus()) + "\n"
+
+
+def wants_prometheus(accept, fmt=None):
+    """/metrics negotiation: ?format=json|prometheus wins, else JSON only when asked for."""
+    if fmt:
+        return fmt != "json"
+    return "application/json" not in (accept or "")
+
+
+# Default registry shared by the service modules
+REGISTRY = Registry()
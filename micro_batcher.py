@@ -0,0 +1,172 @@
+"""
+Dynamic Micro-Batching Scheduler
+Coalesces concurrent single-text encode requests into one model.encode call.
+
+Requests are queued; a background worker takes the first pending request,
+keeps collecting until either `max_batch_size` texts are queued or
+`max_wait_ms` has elapsed since that first request arrived, then encodes the
+whole group in a single forward pass and hands each caller its own row.
+
+Threaded callers block in encode(); coroutines await submit_async(), which
+the worker resolves on the caller's event loop, so one loop can keep many
+texts in the queue without holding a thread for each.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import tracing
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+WAIT_MS_BUCKETS = (0.5, 1, 2, 5, 10, 20, 50, 100, 250, 1000)
+
+
+def _relay(waiter, future):
+    """Copy a finished batcher Future onto an asyncio future (on the loop's thread)."""
+    if waiter.done():
+        return                          # the caller gave up (deadline or disconnect)
+    if future.exception() is not None:
+        waiter.set_exception(future.exception())
+    else:
+        waiter.set_result(future.result())
+
+
+class MicroBatcher:
+    """Queue single texts and encode them in dynamically sized batches."""
+
+    def __init__(self, encode_fn, max_batch_size=32, max_wait_ms=5.0, name="embed"):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.name = name
+
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self.queue_depth = REGISTRY.gauge(
+            f"{name}_batcher_queue_depth", "Texts waiting to be batched",
+            func=lambda: len(self._pending))
+        self.batch_size = REGISTRY.histogram(
+            f"{name}_batcher_batch_size", BATCH_SIZE_BUCKETS, "Texts per model.encode call")
+        self.wait_ms = REGISTRY.histogram(
+            f"{name}_batcher_wait_ms", WAIT_MS_BUCKETS, "Time a text waited in the queue")
+        self.encode_ms = REGISTRY.histogram(
+            f"{name}_batcher_encode_ms", WAIT_MS_BUCKETS, "model.encode time per batch")
+        self.batches = REGISTRY.counter(f"{name}_batcher_batches_total", "Batches encoded")
+        self.errors = REGISTRY.counter(f"{name}_batcher_errors_total", "Batches that raised")
+
+        self._worker = threading.Thread(target=self._run, name=f"{name}-batcher", daemon=True)
+        self._worker.start()
+
+    # ── Public API ───────────────────────────────────────────
+    def submit(self, text):
+        """Queue one text and return a Future resolving to its embedding row."""
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            self._pending.append((text, future, time.perf_counter()))
+            self._cond.notify()
+        return future
+
+    def submit_async(self, text):
+        """
+        Queue one text from a coroutine. Returns (awaitable, Future): await the
+        first for the embedding row; the second carries wait_ms and trace once done.
+        """
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        future = self.submit(text)
+        future.add_done_callback(lambda f: loop.call_soon_threadsafe(_relay, waiter, f))
+        return waiter, future
+
+    @property
+    def depth(self):
+        """Texts waiting to be batched."""
+        return len(self._pending)
+
+    def encode(self, text, timeout=None):
+        """Blocking helper: submit a text and wait for its embedding."""
+        future = self.submit(text)
+        embedding = future.result(timeout=timeout)
+        # Credit the caller's trace with its queue wait and the batch's stages
+        trace = tracing.current()
+        if trace is not None:
+            trace.add("queue", future.wait_ms)
+            trace.merge(future.trace)
+        return embedding
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._worker.join(timeout=5)
+
+    def stats(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": len(self._pending),
+            "batches": self.batches.value,
+            "batch_size": self.batch_size.snapshot(),
+            "wait_ms": self.wait_ms.snapshot(),
+            "encode_ms": self.encode_ms.snapshot(),
+        }
+
+    # ── Worker loop ──────────────────────────────────────────
+    def _collect(self):
+        """Block until a batch is ready; return it (empty list on shutdown)."""
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            if not self._pending:
+                return []
+
+            deadline = self._pending[0][2] + self.max_wait
+            while len(self._pending) < self.max_batch_size and not self._closed:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            size = min(self.max_batch_size, len(self._pending))
+            return [self._pending.popleft() for _ in range(size)]
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if not batch:
+                return
+
+            started = time.perf_counter()
+            for _, _, enqueued in batch:
+                self.wait_ms.observe((started - enqueued) * 1000.0)
+
+            texts = [text for text, _, _ in batch]
+            batch_trace = tracing.Trace()
+            try:
+                embeddings = tracing.bind(batch_trace, self.encode_fn)(texts)
+            except Exception as e:
+                self.errors.inc()
+                logger.exception(f"Batch encode of {len(texts)} texts failed")
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            self.encode_ms.observe((time.perf_counter() - started) * 1000.0)
+            self.batch_size.observe(len(batch))
+            self.batches.inc()
+            batch_trace.count("batch_size", len(batch))
+            for (_, future, enqueued), emb in zip(batch, embeddings):
+                future.trace = batch_trace
+                future.wait_ms = (started - enqueued) * 1000.0
+                future.set_result(emb)
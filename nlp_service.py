@@ -6,9 +6,27 @@ Runs on port 5001 and is called by the Express.js API.
 import sys
 import os
 import logging
-from flask import Flask, request, jsonify
+import threading
+import time
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
 from dotenv import load_dotenv
+import numpy as np
+
+from bm25_index import BM25Index, document_text, load_texts_from_collection
+from chunking import CHUNK_ID_SEP, DEFAULT_MAX_TOKENS, DEFAULT_OVERLAP, Chunker, collapse_hits, parent_id
+from embedding_cache import EmbeddingCache
+from embedding_store import EmbeddingStore
+from encoders import encoder_id, load_encoder, resolve_backend
+from filters import document_attributes, parse_filter
+import tracing
+from metrics import PROMETHEUS_CONTENT_TYPE, REGISTRY, wants_prometheus
+from micro_batcher import MicroBatcher
+from dim_reduction import Projection
+from shard_search import ShardedIndex
+from vector_index import (INDEX_TYPES, RERANK_CANDIDATES, RESCORE_FACTOR, IVFIndex, QuantizedIndex, ReducedIndex,
+                          count_index_entries, load_from_collection, load_index, settings_match)
+from wire_format import MEDIA_TYPE, negotiate, pack_embeddings
 
 load_dotenv()
 
@@ -18,23 +36,649 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)
 
-# ── Load embedding model at startup ──────────────────────────
+# ── Embedding model (eager, background or lazy startup) ──────
 MODEL_NAME = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+# torch (default) | onnx | onnx-int8 — see encoders.py
+ENCODER_BACKEND = resolve_backend()
+PROCESS_START = time.perf_counter()
+
+# eager: load before serving; background: serve immediately, load in a thread;
+# lazy: load on the first request that needs the model
+STARTUP_MODE = os.getenv("NLP_STARTUP_MODE", "background").lower()
+WARMUP_ENABLED = os.getenv("NLP_WARMUP", "true").lower() in ("1", "true", "yes")
+WARMUP_BATCH_SIZES = [int(n) for n in os.getenv("NLP_WARMUP_BATCH_SIZES", "1,8,32").split(",") if n.strip()]
+MODEL_LOAD_TIMEOUT = float(os.getenv("NLP_MODEL_LOAD_TIMEOUT", 300))
+
+# NLP_ENCODER_WORKERS > 0 shards encoding across pinned worker processes
+ENCODER_WORKERS = int(os.getenv("NLP_ENCODER_WORKERS", 0))
+ENCODER_THREADS = int(os.getenv("NLP_ENCODER_THREADS", 0)) or None
+# Longest wait for the encoder workers before an encode call fails
+ENCODE_TIMEOUT = float(os.getenv("NLP_ENCODE_TIMEOUT", 60))
+# LOCAL_INDEX_SHARDS > 1 splits the local index across shard worker processes;
+# a search waits at most LOCAL_SHARD_DEADLINE_MS for them
+LOCAL_INDEX_SHARDS = int(os.getenv("LOCAL_INDEX_SHARDS", 1))
+LOCAL_SHARD_DEADLINE_MS = float(os.getenv("LOCAL_SHARD_DEADLINE_MS", 200))
+
+# Long inputs are split into token windows and pooled unless EMBEDDING_CHUNKING=off
+EMBEDDING_CHUNKING = os.getenv("EMBEDDING_CHUNKING", "pooled").lower()
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", 0)) or None
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", DEFAULT_OVERLAP))
+
+encoder_pool = None
+shard_pool = None
+chunker = None
+model = None
+EMBEDDING_DIM = None
+model_ready = threading.Event()          # set once the model loaded successfully
+model_load_started = threading.Event()
+model_load_done = threading.Event()      # set when loading finished, success or not
+model_load_lock = threading.Lock()
+startup_error = None
+startup_timings = {}
+
+if ENCODER_WORKERS > 0:
+    # Fork workers now, before torch is imported or threads are started
+    from encoder_pool import EncoderPool
+    logger.info(f"Starting {ENCODER_WORKERS} encoder workers for {MODEL_NAME} ...")
+    encoder_pool = EncoderPool(MODEL_NAME, ENCODER_WORKERS, ENCODER_THREADS, backend=ENCODER_BACKEND)
+
+if LOCAL_INDEX_SHARDS > 1:
+    # Shard workers are forked early for the same reason
+    from shard_search import ShardPool
+    logger.info(f"Starting {LOCAL_INDEX_SHARDS} local index shards ...")
+    shard_pool = ShardPool(LOCAL_INDEX_SHARDS)
+
+WARMUP_TEXT = ("Semantic search finds documents by meaning rather than by keywords, "
+               "using sentence embeddings and vector similarity. ")
+
+
+def warm_up(encode_fn):
+    """Encode representative batch shapes so first requests don't pay for lazy init."""
+    for size in WARMUP_BATCH_SIZES:
+        short = ["warm-up query"] * (size // 2 or 1)
+        long = [WARMUP_TEXT * 8] * (size - len(short))
+        encode_fn(short + long)
+
+
+def load_chunker():
+    """Chunker using the model's tokenizer (loaded separately when a worker pool encodes)."""
+    if model is not None:
+        return Chunker.from_model(model, CHUNK_MAX_TOKENS, CHUNK_OVERLAP)
+    max_tokens = CHUNK_MAX_TOKENS or (encoder_pool.max_seq_length - 2 if encoder_pool.max_seq_length else None)
+    try:
+        return Chunker.from_pretrained(MODEL_NAME, max_tokens, CHUNK_OVERLAP)
+    except Exception as e:
+        logger.warning(f"Tokenizer unavailable ({e}); chunking by words instead")
+        return Chunker(None, max_tokens or DEFAULT_MAX_TOKENS, CHUNK_OVERLAP)
+
+
+def load_model():
+    """Import, load and warm up the encoder, recording each phase's duration."""
+    global model, chunker, EMBEDDING_DIM, startup_error
+    with model_load_lock:
+        if model_ready.is_set():
+            return
+        model_load_started.set()
+        timings = {}
+        started = time.perf_counter()
+        try:
+            if encoder_pool:
+                t0 = time.perf_counter()
+                EMBEDDING_DIM = encoder_pool.wait_ready(MODEL_LOAD_TIMEOUT)
+                timings["workers_ready_s"] = time.perf_counter() - t0
+                encode_fn = lambda texts: encoder_pool.encode(texts, timeout=ENCODE_TIMEOUT)  # noqa: E731
+            else:
+                logger.info(f"Loading embedding model: {MODEL_NAME} ({ENCODER_BACKEND} backend) ...")
+                t0 = time.perf_counter()
+                loaded = load_encoder(MODEL_NAME, ENCODER_BACKEND)
+                timings["load_s"] = time.perf_counter() - t0
+
+                # Read the dimension from the model config — no dummy forward pass
+                t0 = time.perf_counter()
+                EMBEDDING_DIM = loaded.get_sentence_embedding_dimension()
+                timings["dimension_s"] = time.perf_counter() - t0
+                # Time tokenization and the forward pass separately inside encode()
+                model = tracing.instrument_model(loaded)
+                encode_fn = lambda texts: model.encode(texts, convert_to_tensor=False, batch_size=BATCH_MAX_SIZE)
+
+            if EMBEDDING_CHUNKING != "off":
+                chunker = load_chunker()
+
+            if WARMUP_ENABLED:
+                t0 = time.perf_counter()
+                warm_up(encode_fn)
+                timings["warmup_s"] = time.perf_counter() - t0
+        except Exception as e:
+            startup_error = repr(e)
+            logger.exception("Model loading failed")
+            model_load_done.set()
+            return
+
+        timings["total_s"] = time.perf_counter() - started
+        timings["process_start_to_ready_s"] = time.perf_counter() - PROCESS_START
+        startup_timings.update({k: round(v, 4) for k, v in timings.items()})
+        model_ready.set()
+        model_load_done.set()
+        logger.info(f"Model ready. Embedding dimension: {EMBEDDING_DIM} — startup timings: {startup_timings}")
+
+
+def ensure_model():
+    """Block until the model is ready, loading it now in lazy mode."""
+    if model_ready.is_set():
+        return
+    if startup_error:
+        raise RuntimeError(f"Model failed to load: {startup_error}")
+    if not model_load_started.is_set():
+        load_model()
+    elif not model_load_done.wait(MODEL_LOAD_TIMEOUT):
+        raise TimeoutError("Timed out waiting for the model to load")
+    if startup_error:
+        raise RuntimeError(f"Model failed to load: {startup_error}")
+
+
+# ── Micro-batching for single-text /embed calls ──────────────
+MICRO_BATCHING = os.getenv("EMBED_MICRO_BATCHING", "true").lower() in ("1", "true", "yes")
+BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", 32))
+BATCH_MAX_WAIT_MS = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", 5))
+
+
+def encode_texts(texts):
+    """Encode a list of texts in one forward pass (or one shard per pool worker)."""
+    ensure_model()
+    tracing.count("encoded", len(texts))
+    with tracing.stage("encode"):
+        if encoder_pool:
+            return encoder_pool.encode(texts, timeout=ENCODE_TIMEOUT)
+        return model.encode(texts, convert_to_tensor=False, batch_size=BATCH_MAX_SIZE)
+
+
+batcher = MicroBatcher(encode_texts, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS) if MICRO_BATCHING else None
+if batcher:
+    logger.info(f"Micro-batching enabled: max {BATCH_MAX_SIZE} texts / {BATCH_MAX_WAIT_MS} ms")
+
+# ── Embedding cache (memory LRU + optional SQLite tier) ──────
+CACHE_MAX_MB = float(os.getenv("EMBED_CACHE_MAX_MB", 64))
+CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "")
+
+# Chunking changes the vector of a long text (pooled windows vs. truncation), so it is part of the key
+CHUNKING_ID = "off" if EMBEDDING_CHUNKING == "off" else \
+    f"{EMBEDDING_CHUNKING}:{CHUNK_MAX_TOKENS or 'auto'}:{CHUNK_OVERLAP}"
+embed_cache = EmbeddingCache(f"{encoder_id(MODEL_NAME, ENCODER_BACKEND)}#{CHUNKING_ID}",
+                             int(CACHE_MAX_MB * 1024 * 1024), CACHE_PATH or None) \
+    if CACHE_MAX_MB > 0 else None
+if embed_cache:
+    logger.info(f"Embedding cache enabled: {CACHE_MAX_MB} MB in memory, disk tier: {CACHE_PATH or 'off'}")
+
+
+def _encode_single(texts):
+    """Encode path for /embed: routed through the micro-batcher when enabled."""
+    if batcher:
+        return [batcher.encode(t) for t in texts]
+    return encode_texts(texts)
+
+
+def _encode_documents(texts):
+    """Encode path for full documents: texts longer than the model window are chunked and pooled."""
+    ensure_model()
+    if chunker:
+        return chunker.embed_pooled(texts, encode_texts)
+    return encode_texts(texts)
+
+
+request_texts = REGISTRY.histogram("nlp_request_texts", (1, 2, 4, 8, 16, 32, 64, 128, 256, 1024),
+                                   "Texts per embedding request")
+
+
+def embed_texts(texts, single=False):
+    """Return an (n, dim) array for texts, encoding only cache misses."""
+    if single and chunker and any(chunker.needs_split(t) for t in texts):
+        single = False
+    encode_fn = _encode_single if single else _encode_documents
+    tracing.count("texts", len(texts))
+    request_texts.observe(len(texts))
+    with tracing.stage("embed"):
+        if embed_cache:
+            return embed_cache.get_or_encode(texts, encode_fn)
+        return encode_fn(texts)
+
+
+if STARTUP_MODE == "eager":
+    load_model()
+elif STARTUP_MODE == "background":
+    threading.Thread(target=load_model, name="model-loader", daemon=True).start()
+
+
+# ── Local vector index (exact + IVF-flat / int8 over NumPy) ──
+LOCAL_INDEX_ENABLED = os.getenv("LOCAL_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", "data/vector_index.npz")
+# "ivf_flat" (float32 rows + IVF lists), "int8_binary" (int8 codes + sign-bit sketch)
+# or "reduced" (float32 rows + a low-dimensional copy scanned first)
+LOCAL_INDEX_TYPE = os.getenv("LOCAL_INDEX_TYPE", "ivf_flat")
+LOCAL_INDEX_NPROBE = int(os.getenv("LOCAL_INDEX_NPROBE", 8))
+LOCAL_INDEX_RESCORE = int(os.getenv("LOCAL_INDEX_RESCORE", RESCORE_FACTOR))
+LOCAL_INDEX_REDUCED_DIM = int(os.getenv("LOCAL_INDEX_REDUCED_DIM", 64))
+LOCAL_INDEX_REDUCTION = os.getenv("LOCAL_INDEX_REDUCTION", "pca")
+LOCAL_INDEX_RERANK = int(os.getenv("LOCAL_INDEX_RERANK", RERANK_CANDIDATES))
+# Projection fitted by `python dim_reduction.py`; without one the index fits its own PCA
+REDUCED_PROJECTION_PATH = os.getenv("REDUCED_PROJECTION_PATH", "data/projection.npz")
+LOCAL_INDEX_SAVE_INTERVAL = float(os.getenv("LOCAL_INDEX_SAVE_INTERVAL", 30))
+# Default /search mode: "exact" (full scan) or "ann" (IVF probe / Hamming shortlist / reduced scan)
+LOCAL_SEARCH_MODE = os.getenv("LOCAL_SEARCH_MODE", "exact")
+# Candidates fetched per requested hit when documents are indexed per chunk
+CHUNK_OVERSAMPLE = 4
+# Memory-mapped embedding store backing the index ("" keeps .npz persistence)
+EMBEDDING_STORE_PATH = os.getenv("EMBEDDING_STORE_PATH", "")
+# Compact the store once tombstones exceed this multiple of the live rows
+EMBEDDING_STORE_COMPACT_RATIO = float(os.getenv("EMBEDDING_STORE_COMPACT_RATIO", 1.0))
+
+vector_index = None
+embedding_store = None
+chunked_index = False                   # True once any "<id>#<n>" chunk entry is indexed
+chunk_children = {}                     # parent id → ids of its chunk entries in the index
+entries_lock = threading.RLock()        # serialises index writes and chunk_children
+index_ready = threading.Event()
+index_dirty = threading.Event()
+
+
+def get_collection():
+    """MongoDB collection holding the documents and their embeddings."""
+    from pymongo import MongoClient
+    client = MongoClient(os.getenv("MONGODB_URI"), serverSelectionTimeoutMS=5000)
+    db = client[os.getenv("MONGODB_DB_NAME", "semantic_search_db")]
+    return db[os.getenv("MONGODB_COLLECTION_NAME", "documents")]
+
+
+def reduced_projection():
+    """The saved dim_reduction projection, if there is one for this model's dimension."""
+    if not os.path.exists(REDUCED_PROJECTION_PATH):
+        return None
+    projection = Projection.load(REDUCED_PROJECTION_PATH)
+    if projection.source_dim != EMBEDDING_DIM:
+        logger.warning(f"Ignoring {REDUCED_PROJECTION_PATH}: it maps {projection.source_dim} dims, "
+                       f"the model has {EMBEDDING_DIM}")
+        return None
+    return projection
+
+
+def index_spec():
+    """(index type, constructor settings) for the configured LOCAL_INDEX_TYPE."""
+    if LOCAL_INDEX_TYPE == "int8_binary":
+        return "int8_binary", {"rescore": LOCAL_INDEX_RESCORE}
+    if LOCAL_INDEX_TYPE == "reduced":
+        return "reduced", {"reduced_dim": LOCAL_INDEX_REDUCED_DIM, "method": LOCAL_INDEX_REDUCTION,
+                           "rerank": LOCAL_INDEX_RERANK, "projection": reduced_projection()}
+    return "ivf_flat", {"nprobe": LOCAL_INDEX_NPROBE}
+
+
+def new_vector_index():
+    """Empty index of the configured LOCAL_INDEX_TYPE, split over the shard pool when there is one."""
+    index_type, settings = index_spec()
+    if shard_pool is not None:
+        return ShardedIndex(shard_pool, index_type, EMBEDDING_DIM, LOCAL_SHARD_DEADLINE_MS, **settings)
+    return INDEX_TYPES[index_type](EMBEDDING_DIM, **settings)
+
+
+def index_settings_match(index):
+    """False when a persisted reduced index was built with another projection than configured now."""
+    return not isinstance(index, ReducedIndex) or settings_match(index, new_vector_index())
+
+
+def init_vector_index():
+    """Load the persisted index if it matches the collection, else rebuild from MongoDB."""
+    global vector_index
+    started = time.perf_counter()
+    try:
+        ensure_model()
+        collection = get_collection()
+        expected = count_index_entries(collection)
+        if EMBEDDING_STORE_PATH:
+            vector_index = open_store_index(collection, expected)
+        elif shard_pool is not None:
+            index = new_vector_index()
+            try:
+                loaded = index.load(LOCAL_INDEX_PATH)
+            except (RuntimeError, TimeoutError) as e:
+                # Another index type, dimension or projection than configured now
+                logger.info(f"Persisted shards don't match the current settings ({e}), rebuilding")
+            else:
+                if loaded and len(index) == expected:
+                    vector_index = index
+                    logger.info(f"Vector index loaded from {LOCAL_INDEX_SHARDS} shard files ({len(index)} vectors)")
+                else:
+                    logger.info(f"Persisted shards are missing or stale ({len(index)} vs {expected} entries), "
+                                f"rebuilding")
+        elif os.path.exists(LOCAL_INDEX_PATH):
+            loaded = load_index(LOCAL_INDEX_PATH)
+            if len(loaded) == expected and loaded.dim == EMBEDDING_DIM and loaded.index_type == LOCAL_INDEX_TYPE \
+                    and index_settings_match(loaded):
+                if isinstance(loaded, IVFIndex):
+                    loaded.nprobe = LOCAL_INDEX_NPROBE
+                elif isinstance(loaded, QuantizedIndex):
+                    loaded.rescore = LOCAL_INDEX_RESCORE
+                elif isinstance(loaded, ReducedIndex):
+                    loaded.rerank = LOCAL_INDEX_RERANK
+                vector_index = loaded
+                logger.info(f"Vector index loaded from {LOCAL_INDEX_PATH} ({len(loaded)} vectors)")
+            else:
+                logger.info(f"Persisted index is stale ({loaded.index_type}, {len(loaded)} vs {expected} entries), "
+                            f"rebuilding as {LOCAL_INDEX_TYPE}")
+
+        if vector_index is None:
+            ids, vectors, attributes = load_from_collection(collection)
+            index = new_vector_index()
+            if vectors is not None:
+                index.build(ids, vectors, attributes)
+            index.save(LOCAL_INDEX_PATH)
+            vector_index = index
+            logger.info(f"Vector index built from MongoDB ({len(index)} vectors)")
+        reset_chunk_map(vector_index.live_ids())
+    except Exception as e:
+        logger.error(f"Vector index initialisation failed, starting empty: {e}")
+        if EMBEDDING_DIM is None:
+            return
+        vector_index = new_vector_index()
+    logger.info(f"Vector index ready in {time.perf_counter() - started:.2f}s")
+    index_ready.set()
+    if isinstance(vector_index, (IVFIndex, ReducedIndex)) and vector_index.store is not None:
+        # Attached untrained: queries scan exactly until the IVF lists / PCA projection exist
+        vector_index.train()
+
+
+def open_store_index(collection, expected):
+    """Index over the memory-mapped embedding store, refilled from MongoDB if it is stale."""
+    global embedding_store
+    store = EmbeddingStore(EMBEDDING_STORE_PATH, EMBEDDING_DIM, recreate=True)
+    if len(store) != expected:
+        logger.info(f"Embedding store is stale ({len(store)} vs {expected} entries), refilling from MongoDB")
+        ids, vectors, attributes = load_from_collection(collection)
+        store.clear()
+        if vectors is not None:
+            store.append(ids, vectors, attributes)
+    embedding_store = store
+    index = new_vector_index()
+    if index.attachable:
+        index.attach(store)
+    else:
+        index.build(*store.live())
+    logger.info(f"Vector index opened on {EMBEDDING_STORE_PATH} ({len(index)} vectors, "
+                f"{'memory-mapped' if index.store else 'copied'})")
+    return index
+
+
+# ── Chunk entries per document ───────────────────────────────
+def track_chunks(added=(), removed=()):
+    """Keep chunk_children in step with the entry ids written to / removed from the index."""
+    global chunked_index
+    with entries_lock:
+        for i in added:
+            if CHUNK_ID_SEP in i:
+                chunk_children.setdefault(parent_id(i), set()).add(i)
+                chunked_index = True
+        for i in removed:
+            children = chunk_children.get(parent_id(i)) if CHUNK_ID_SEP in i else None
+            if children is not None:
+                children.discard(i)
+                if not children:
+                    del chunk_children[parent_id(i)]
+
+
+def reset_chunk_map(ids):
+    """Rebuild chunk_children from every live index id (startup, or after another process wrote the store)."""
+    with entries_lock:
+        chunk_children.clear()
+        track_chunks(added=ids)
+
+
+def chunk_entries(parents):
+    """Index ids of every chunk entry belonging to the given parent document ids."""
+    with entries_lock:
+        return [i for parent in parents for i in chunk_children.get(parent, ())]
+
+
+def add_entries(ids, vectors, attributes=None):
+    """Insert into the local index, writing through the embedding store when one is open."""
+    with entries_lock:
+        track_chunks(added=ids)
+        if embedding_store is not None:
+            embedding_store.append(ids, vectors, attributes)
+            if vector_index.store is embedding_store:
+                vector_index.attach(embedding_store)
+                return
+        vector_index.add(ids, vectors, attributes)
+
+
+def remove_entries(ids):
+    """Tombstone entries in the local index (and the store); returns how many were present."""
+    with entries_lock:
+        track_chunks(removed=ids)
+        if embedding_store is not None:
+            removed = embedding_store.remove(ids)
+            if vector_index.store is embedding_store:
+                vector_index.attach(embedding_store)
+                return removed
+        return vector_index.remove(ids)
+
+
+def clear_entries():
+    with entries_lock:
+        chunk_children.clear()
+        if embedding_store is not None:
+            embedding_store.clear()
+            if vector_index.store is embedding_store:
+                vector_index.attach(embedding_store)
+                return
+        vector_index.build([], np.zeros((0, vector_index.dim), dtype=np.float32))
+
+
+def compact_entries():
+    """Reclaim tombstones once they outnumber the live entries."""
+    if embedding_store is not None and \
+            embedding_store.tombstones > EMBEDDING_STORE_COMPACT_RATIO * len(embedding_store):
+        embedding_store.compact()
+        if vector_index.store is embedding_store:
+            vector_index.attach(embedding_store)
+    if vector_index.store is None and vector_index.tombstones > len(vector_index):
+        vector_index.compact()
+
+
+def store_syncer():
+    """Follow writes other processes make to the embedding store, and compact it periodically."""
+    while True:
+        time.sleep(LOCAL_INDEX_SAVE_INTERVAL)
+        if not index_ready.is_set() or embedding_store is None:
+            continue
+        try:
+            with entries_lock:
+                if embedding_store.refresh() and vector_index.store is embedding_store:
+                    vector_index.attach(embedding_store)
+                    reset_chunk_map(vector_index.live_ids())
+                compact_entries()
+        except Exception as e:
+            logger.error(f"Embedding store sync failed: {e}")
+
+
+def index_saver(get_index, path, dirty, label):
+    """Persist an index periodically when it has changed."""
+    while True:
+        time.sleep(LOCAL_INDEX_SAVE_INTERVAL)
+        if dirty.is_set():
+            dirty.clear()
+            try:
+                get_index().save(path)
+            except Exception as e:
+                dirty.set()
+                logger.error(f"{label} save failed: {e}")
+
+
+if LOCAL_INDEX_ENABLED:
+    threading.Thread(target=init_vector_index, name="index-init", daemon=True).start()
+    if EMBEDDING_STORE_PATH:
+        # Every write lands in the store immediately; nothing to save
+        threading.Thread(target=store_syncer, name="store-syncer", daemon=True).start()
+    else:
+        threading.Thread(target=index_saver, name="index-saver", daemon=True,
+                         args=(lambda: vector_index, LOCAL_INDEX_PATH, index_dirty, "Vector index")).start()
+
+
+# ── Local BM25 index (lexical leg of hybrid search) ──────────
+LEXICAL_INDEX_ENABLED = os.getenv("LEXICAL_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", "data/bm25_index.npz")
+
+lexical_index = None
+lexical_ready = threading.Event()
+lexical_dirty = threading.Event()
 
-logger.info(f"Loading embedding model: {MODEL_NAME} ...")
-from sentence_transformers import SentenceTransformer
-model = SentenceTransformer(MODEL_NAME)
-EMBEDDING_DIM = len(model.encode("test"))
-logger.info(f"Model loaded. Embedding dimension: {EMBEDDING_DIM}")
+
+def init_lexical_index():
+    """Load the persisted BM25 index if it matches the collection, else rebuild from MongoDB."""
+    global lexical_index
+    started = time.perf_counter()
+    try:
+        collection = get_collection()
+        expected = collection.count_documents({})
+        if os.path.exists(LEXICAL_INDEX_PATH):
+            loaded = BM25Index.load(LEXICAL_INDEX_PATH)
+            if len(loaded) == expected:
+                lexical_index = loaded
+                logger.info(f"BM25 index loaded from {LEXICAL_INDEX_PATH} ({len(loaded)} documents)")
+            else:
+                logger.info(f"Persisted BM25 index is stale ({len(loaded)} vs {expected} documents), rebuilding")
+
+        if lexical_index is None:
+            index = BM25Index()
+            index.build(*load_texts_from_collection(collection))
+            index.save(LEXICAL_INDEX_PATH)
+            lexical_index = index
+            logger.info(f"BM25 index built from MongoDB ({len(index)} documents)")
+    except Exception as e:
+        logger.error(f"BM25 index initialisation failed, starting empty: {e}")
+        lexical_index = BM25Index()
+    logger.info(f"BM25 index ready in {time.perf_counter() - started:.2f}s")
+    lexical_ready.set()
+
+
+if LEXICAL_INDEX_ENABLED:
+    threading.Thread(target=init_lexical_index, name="lexical-init", daemon=True).start()
+    threading.Thread(target=index_saver, name="lexical-saver", daemon=True,
+                     args=(lambda: lexical_index, LEXICAL_INDEX_PATH, lexical_dirty, "BM25 index")).start()
+
+
+def index_unavailable():
+    """Error response when the local index is disabled or still loading."""
+    if not LOCAL_INDEX_ENABLED:
+        return jsonify({"error": "Local vector index is disabled"}), 404
+    if not index_ready.is_set():
+        return jsonify({"error": "Local vector index is still loading"}), 503
+    return None
+
+
+def lexical_unavailable():
+    """Error response when the BM25 index is disabled or still loading."""
+    if not LEXICAL_INDEX_ENABLED:
+        return jsonify({"error": "Local BM25 index is disabled"}), 404
+    if not lexical_ready.is_set():
+        return jsonify({"error": "Local BM25 index is still loading"}), 503
+    return None
+
+
+def binary_response(embeddings):
+    """
+    Return embeddings as a packed little-endian buffer if the client asked
+    for application/octet-stream, else None (caller falls back to JSON).
+    """
+    dtype = negotiate(request.headers.get("Accept"))
+    if not dtype:
+        return None
+    body = pack_embeddings(embeddings, dtype)
+    return Response(body, status=200, mimetype=MEDIA_TYPE,
+                    headers={"X-Embedding-Dtype": dtype})
+
+
+# ── Request tracing (X-Trace-Id in, Server-Timing out) ───────
+REQUEST_MS_BUCKETS = (0.5, 1, 2, 5, 10, 20, 50, 100, 250, 500, 1000, 2500, 10000)
+
+
+@app.before_request
+def start_trace():
+    g.trace = tracing.Trace(request.headers.get(tracing.TRACE_HEADER))
+    g.trace_token = tracing.begin(g.trace)
+    g.started = time.perf_counter()
+
+
+@app.after_request
+def finish_trace(response):
+    trace = g.get("trace")
+    if trace is None:
+        return response
+    elapsed_ms = (time.perf_counter() - g.started) * 1000.0
+    trace.add("total", elapsed_ms)
+    if request.endpoint and request.endpoint not in ("metrics", "livez", "readyz", "health"):
+        REGISTRY.histogram(f"nlp_request_{request.endpoint}_ms", REQUEST_MS_BUCKETS,
+                           f"{request.path} request duration").observe(elapsed_ms)
+    response.headers[tracing.TRACE_HEADER] = trace.id
+    response.headers["Server-Timing"] = trace.server_timing()
+    return response
+
+
+@app.teardown_request
+def end_trace(_exc):
+    token = g.pop("trace_token", None)
+    if token is not None:
+        tracing.end(token)
+
+
+@app.route("/livez", methods=["GET"])
+def livez():
+    """Liveness: the process is up and serving HTTP."""
+    return jsonify({"status": "alive", "uptime_s": round(time.perf_counter() - PROCESS_START, 3)}), 200
+
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    """Readiness: the model is loaded and warmed up."""
+    if model_ready.is_set():
+        return jsonify({"status": "ready", "startup_timings": startup_timings}), 200
+    status = "failed" if startup_error else ("loading" if model_load_started.is_set() else "idle")
+    return jsonify({"status": status, "error": startup_error, "startup_mode": STARTUP_MODE}), 503
+
+
+def health_status():
+    """Body of /health (shared with the async service)."""
+    status = "ok" if model_ready.is_set() else ("error" if startup_error else "loading")
+    if status == "ok" and encoder_pool and not encoder_pool.is_ready:
+        status = "degraded"             # an encoder worker died; the others keep serving
+    if status == "ok" and shard_pool and shard_pool.error:
+        status = "degraded"             # a shard died; searches answer from the others
+    return {
+        "status": status,
+        "startup_mode": STARTUP_MODE,
+        "startup_timings": startup_timings,
+        "model": MODEL_NAME,
+        "encoder_backend": ENCODER_BACKEND,
+        "embedding_dim": EMBEDDING_DIM,
+        "micro_batching": batcher.stats() if batcher else None,
+        "encoder_pool": encoder_pool.stats() if encoder_pool else None,
+        "cache": embed_cache.stats() if embed_cache else None,
+        "vector_index": vector_index.stats() if index_ready.is_set() else None,
+        "embedding_store": embedding_store.stats() if embedding_store else None,
+        "lexical_index": lexical_index.stats() if lexical_ready.is_set() else None,
+    }
 
 
 @app.route("/health", methods=["GET"])
 def health():
-    return jsonify({
-        "status": "ok",
-        "model": MODEL_NAME,
-        "embedding_dim": EMBEDDING_DIM
-    }), 200
+    return jsonify(health_status()), 200
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Service metrics: batcher, cache, per-stage and per-endpoint histograms.
+    Prometheus text by default; JSON with ?format=json or Accept: application/json.
+    """
+    if wants_prometheus(request.headers.get("Accept"), request.args.get("format")):
+        return Response(REGISTRY.prometheus(), status=200, content_type=PROMETHEUS_CONTENT_TYPE)
+    return jsonify(REGISTRY.snapshot()), 200
 
 
 @app.route("/embed", methods=["POST"])
@@ -48,7 +692,12 @@ def embed():
     if not text or not isinstance(text, str):
         return jsonify({"error": "'text' must be a non-empty string"}), 400
 
-    embedding = model.encode(text, convert_to_tensor=False).tolist()
+    embeddings = embed_texts([text], single=True)
+    binary = binary_response(embeddings)
+    if binary is not None:
+        return binary
+
+    embedding = embeddings[0].tolist()
     return jsonify({"embedding": embedding, "dimension": len(embedding)}), 200
 
 
@@ -62,16 +711,295 @@ def embed_batch():
     texts = data["texts"]
     if not isinstance(texts, list) or len(texts) == 0:
         return jsonify({"error": "'texts' must be a non-empty array"}), 400
+    if not all(isinstance(t, str) for t in texts):
+        return jsonify({"error": "'texts' must contain only strings"}), 400
+
+    embeddings = embed_texts(texts)
+    binary = binary_response(embeddings)
+    if binary is not None:
+        return binary
 
-    embeddings = model.encode(texts, convert_to_tensor=False, batch_size=32)
     result = [emb.tolist() for emb in embeddings]
     return jsonify({
         "embeddings": result,
         "count": len(result),
-        "dimension": EMBEDDING_DIM
+        "dimension": len(result[0])
     }), 200
 
 
+def parse_queries(data):
+    """
+    Read query vectors from a /search body: 'vector' / 'text' for one query,
+    'vectors' / 'texts' for a batch. Returns (matrix, is_batch) or an error string.
+    """
+    dim = vector_index.dim
+    if "vectors" in data or "vector" in data:
+        is_batch = "vectors" in data
+        vectors = data["vectors"] if is_batch else [data["vector"]]
+        if not isinstance(vectors, list) or not vectors or \
+                any(not isinstance(v, list) or len(v) != dim for v in vectors):
+            return f"Query vectors must be arrays of {dim} numbers", None
+        return np.asarray(vectors, dtype=np.float32), is_batch
+
+    if "texts" in data or "text" in data:
+        is_batch = "texts" in data
+        texts = data["texts"] if is_batch else [data["text"]]
+        if not isinstance(texts, list) or not texts or \
+                any(not t or not isinstance(t, str) for t in texts):
+            return "Query texts must be non-empty strings", None
+        return embed_texts(texts, single=not is_batch), is_batch
+
+    return "Provide 'text', 'texts', 'vector' or 'vectors'", None
+
+
+@app.route("/search", methods=["POST"])
+def search():
+    """
+    Top-k nearest documents from the local index.
+    Accepts one query ('text' / 'vector') or a batch ('texts' / 'vectors');
+    'mode' is "exact" (scan the whole corpus) or "ann" (IVF probe, Hamming
+    shortlist + int8 re-score for the int8_binary index, or reduced-dimension
+    scan + full re-score of 'rerank' candidates for the reduced index). With
+    LOCAL_INDEX_SHARDS > 1 every shard is searched in parallel and the response
+    reports how many answered within 'deadline_ms'. 'filter'
+    ({ category, difficulty }: value or array) restricts the rows searched.
+    """
+    unavailable = index_unavailable()
+    if unavailable:
+        return unavailable
+
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "Missing request body"}), 400
+    queries, is_batch = parse_queries(data)
+    if is_batch is None:
+        return jsonify({"error": queries}), 400
+
+    mode = data.get("mode", LOCAL_SEARCH_MODE)
+    if mode not in ("exact", "ann"):
+        return jsonify({"error": "'mode' must be 'exact' or 'ann'"}), 400
+    top_k = int(data.get("top_k", 10))
+    nprobe = data.get("nprobe")
+    rescore = data.get("rescore")
+    rerank = data.get("rerank")
+    deadline_ms = data.get("deadline_ms")
+    threshold = data.get("threshold")
+    try:
+        filters = parse_filter(data.get("filter"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    started = time.perf_counter()
+    # Chunk entries are collapsed to their parent document, so fetch extra candidates
+    k = top_k * CHUNK_OVERSAMPLE if chunked_index else top_k
+    with tracing.stage("search"):
+        options = dict(nprobe=int(nprobe) if nprobe else None, rescore=int(rescore) if rescore else None,
+                       rerank=int(rerank) if rerank else None, exact=(mode == "exact"), filters=filters)
+        if isinstance(vector_index, ShardedIndex):
+            batches, answered = vector_index.scatter(queries, k, float(deadline_ms) if deadline_ms else None,
+                                                     **options)
+        else:
+            batches = vector_index.search_batch(queries, k, **options)
+        if chunked_index:
+            batches = [collapse_hits(hits, top_k) for hits in batches]
+    elapsed_ms = (time.perf_counter() - started) * 1000.0
+
+    results = [
+        [{"id": doc_id, "score": score} for doc_id, score in hits
+         if threshold is None or score >= threshold]
+        for hits in batches
+    ]
+    body = {
+        "mode": mode,
+        "index_size": len(vector_index),
+        "search_ms": round(elapsed_ms, 3),
+    }
+    if isinstance(vector_index, ShardedIndex):
+        body["shards"] = {"answered": answered, "total": vector_index.shards}
+    if is_batch:
+        body["batch_results"] = results
+    else:
+        body["results"] = results[0]
+        body["count"] = len(results[0])
+    return jsonify(body), 200
+
+
+@app.route("/index/upsert", methods=["POST"])
+def index_upsert():
+    """
+    Insert or replace documents in the local index: { documents: [{ id, embedding }] }.
+    Per-chunk entries use "<document id>#<n>" ids; upserting them replaces the
+    document's plain entry, and the other way round. Filter attributes are read
+    from each entry's 'category' / 'difficulty' / 'metadata' fields.
+    """
+    unavailable = index_unavailable()
+    if unavailable:
+        return unavailable
+
+    data = request.get_json()
+    docs = (data or {}).get("documents")
+    if not isinstance(docs, list) or not docs:
+        return jsonify({"error": "'documents' must be a non-empty array"}), 400
+    if any(not d.get("id") or len(d.get("embedding") or []) != vector_index.dim for d in docs):
+        return jsonify({"error": f"Each document needs an 'id' and a {vector_index.dim}-dim 'embedding'"}), 400
+
+    ids = [str(d["id"]) for d in docs]
+    with entries_lock:
+        # Replacing a document drops chunk entries it no longer has, and chunk entries
+        # replace the document's plain (pooled) entry
+        stale = set(chunk_entries({parent_id(i) for i in ids})) - set(ids)
+        stale |= {parent_id(i) for i in ids if CHUNK_ID_SEP in i} - set(ids)
+        if stale:
+            remove_entries(list(stale))
+        add_entries(ids, np.asarray([d["embedding"] for d in docs], dtype=np.float32),
+                    [document_attributes(d) for d in docs])
+    index_dirty.set()
+    return jsonify({"upserted": len(docs), "index_size": len(vector_index)}), 200
+
+
+@app.route("/index/delete", methods=["POST"])
+def index_delete():
+    """Remove documents (and any of their chunk entries) from the local index: { ids: [...] }."""
+    unavailable = index_unavailable()
+    if unavailable:
+        return unavailable
+
+    data = request.get_json()
+    ids = (data or {}).get("ids")
+    if not isinstance(ids, list):
+        return jsonify({"error": "'ids' must be an array"}), 400
+
+    ids = [str(i) for i in ids]
+    with entries_lock:
+        removed = remove_entries(ids + chunk_entries(set(ids)))
+        compact_entries()
+    index_dirty.set()
+    return jsonify({"deleted": removed, "index_size": len(vector_index)}), 200
+
+
+@app.route("/index/clear", methods=["POST"])
+def index_clear():
+    """Drop every vector from the local index."""
+    unavailable = index_unavailable()
+    if unavailable:
+        return unavailable
+
+    clear_entries()
+    index_dirty.set()
+    return jsonify({"index_size": 0}), 200
+
+
+@app.route("/index/stats", methods=["GET"])
+def index_stats():
+    unavailable = index_unavailable()
+    if unavailable:
+        return unavailable
+    stats = vector_index.stats()
+    if embedding_store is not None:
+        stats["store"] = embedding_store.stats()
+    return jsonify(stats), 200
+
+
+@app.route("/lexical/search", methods=["POST"])
+def lexical_search():
+    """
+    BM25 top-k over document title + content.
+    Accepts one query ('query') or a batch ('queries'); scores are raw BM25.
+    'filter' restricts the documents scored, as for /search.
+    """
+    unavailable = lexical_unavailable()
+    if unavailable:
+        return unavailable
+
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "Missing request body"}), 400
+    is_batch = "queries" in data
+    queries = data["queries"] if is_batch else [data.get("query")]
+    if not isinstance(queries, list) or not queries or \
+            any(not q or not isinstance(q, str) for q in queries):
+        return jsonify({"error": "Provide a non-empty 'query' string or 'queries' array"}), 400
+    top_k = int(data.get("top_k", 10))
+    try:
+        filters = parse_filter(data.get("filter"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    started = time.perf_counter()
+    with tracing.stage("bm25"):
+        batches = lexical_index.search_batch(queries, top_k, filters)
+    elapsed_ms = (time.perf_counter() - started) * 1000.0
+
+    results = [[{"id": doc_id, "score": score} for doc_id, score in hits] for hits in batches]
+    body = {"index_size": len(lexical_index), "search_ms": round(elapsed_ms, 3)}
+    if is_batch:
+        body["batch_results"] = results
+    else:
+        body["results"] = results[0]
+        body["count"] = len(results[0])
+    return jsonify(body), 200
+
+
+@app.route("/lexical/upsert", methods=["POST"])
+def lexical_upsert():
+    """
+    Insert or replace documents in the BM25 index: { documents: [{ id, title, content }] },
+    plus optional 'category' / 'difficulty' / 'metadata' filter attributes.
+    """
+    unavailable = lexical_unavailable()
+    if unavailable:
+        return unavailable
+
+    data = request.get_json()
+    docs = (data or {}).get("documents")
+    if not isinstance(docs, list) or not docs or any(not d.get("id") for d in docs):
+        return jsonify({"error": "'documents' must be a non-empty array of { id, title, content }"}), 400
+
+    lexical_index.add([str(d["id"]) for d in docs], [document_text(d) for d in docs],
+                      [document_attributes(d) for d in docs])
+    lexical_dirty.set()
+    return jsonify({"upserted": len(docs), "index_size": len(lexical_index)}), 200
+
+
+@app.route("/lexical/delete", methods=["POST"])
+def lexical_delete():
+    """Remove documents from the BM25 index: { ids: [...] }."""
+    unavailable = lexical_unavailable()
+    if unavailable:
+        return unavailable
+
+    data = request.get_json()
+    ids = (data or {}).get("ids")
+    if not isinstance(ids, list):
+        return jsonify({"error": "'ids' must be an array"}), 400
+
+    removed = lexical_index.remove([str(i) for i in ids])
+    if lexical_index.tombstones > len(lexical_index):
+        lexical_index.compact()
+    lexical_dirty.set()
+    return jsonify({"deleted": removed, "index_size": len(lexical_index)}), 200
+
+
+@app.route("/lexical/clear", methods=["POST"])
+def lexical_clear():
+    """Drop every document from the BM25 index."""
+    unavailable = lexical_unavailable()
+    if unavailable:
+        return unavailable
+
+    lexical_index.build([], [])
+    lexical_dirty.set()
+    return jsonify({"index_size": 0}), 200
+
+
+@app.route("/lexical/stats", methods=["GET"])
+def lexical_stats():
+    unavailable = lexical_unavailable()
+    if unavailable:
+        return unavailable
+    return jsonify(lexical_index.stats()), 200
+
+
 if __name__ == "__main__":
     port = int(os.getenv("NLP_SERVICE_PORT", 5001))
     logger.info(f"NLP Microservice starting on port {port}")
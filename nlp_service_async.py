@@ -0,0 +1,379 @@
+"""
+Async NLP Microservice (ASGI)
+asyncio serving mode with backpressure, native for /embed, /embed-batch and /health.
+
+Reuses the model, cache and micro-batcher from nlp_service. A single /embed
+text goes straight to the micro-batcher and the handler awaits an asyncio
+future the batcher thread resolves, so one event loop keeps the batcher fed
+with as many concurrent queries as arrive. Other encoding runs on the
+AdmissionQueue's thread pool so the event loop never blocks:
+  • interactive lane — small /embed-batch calls (search queries), and /embed
+                       when micro-batching is off
+  • bulk lane        — large /embed-batch calls, split into chunks so
+                       interactive work is scheduled between them
+A full lane answers 429, a model that is not loaded yet answers 503, both
+with Retry-After. `X-Request-Timeout-Ms` sets the request's deadline (504
+when it passes); `X-Priority: interactive|bulk` overrides the lane.
+`X-Trace-Id` is echoed back with a `Server-Timing` stage breakdown.
+
+Every other path (/search, /index/*, /lexical/*) is handed to the Flask app
+from nlp_service as WSGI, run on the same executor: reads and searches in the
+interactive lane, index writes in the bulk lane.
+
+Run:
+    python nlp_service_async.py
+    uvicorn nlp_service_async:app --port 5001
+"""
+import asyncio
+import io
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from urllib.parse import parse_qs
+
+import numpy as np
+
+import nlp_service as svc
+import tracing
+from admission import AdmissionQueue, DeadlineExceeded, Overloaded
+from metrics import PROMETHEUS_CONTENT_TYPE, REGISTRY, wants_prometheus
+from wire_format import MEDIA_TYPE, negotiate, pack_embeddings
+
+logger = logging.getLogger(__name__)
+
+# ── Configuration ─────────────────────────────────────────────
+EXECUTOR_WORKERS = int(os.getenv("ASYNC_EXECUTOR_WORKERS", 4))
+RESERVED_INTERACTIVE = int(os.getenv("ASYNC_RESERVED_INTERACTIVE", 1))
+INTERACTIVE_QUEUE = int(os.getenv("ASYNC_INTERACTIVE_QUEUE", 256))
+BULK_QUEUE = int(os.getenv("ASYNC_BULK_QUEUE", 4096))
+# /embed-batch calls with at most this many texts use the interactive lane
+INTERACTIVE_MAX_TEXTS = int(os.getenv("ASYNC_INTERACTIVE_MAX_TEXTS", 8))
+BULK_CHUNK_SIZE = int(os.getenv("ASYNC_BULK_CHUNK_SIZE", 64))
+DEFAULT_DEADLINE_MS = float(os.getenv("ASYNC_DEFAULT_DEADLINE_MS", 30000))
+MAX_BODY_BYTES = int(os.getenv("ASYNC_MAX_BODY_MB", 32)) * 1024 * 1024
+MODEL_RETRY_AFTER_S = 5
+
+admission = AdmissionQueue(
+    EXECUTOR_WORKERS, RESERVED_INTERACTIVE,
+    {"interactive": INTERACTIVE_QUEUE, "bulk": BULK_QUEUE}, name="nlp_async")
+deadline_exceeded = REGISTRY.counter("nlp_async_deadline_exceeded_total", "Requests answered 504")
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+# ── ASGI plumbing ────────────────────────────────────────────
+async def read_body(receive):
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise HTTPError(499, "Client disconnected")
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise HTTPError(413, "Request body too large")
+        chunks.append(chunk)
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def send_response(send, status, body, content_type="application/json", headers=None):
+    raw = [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode()),
+           (b"access-control-allow-origin", b"*")]
+    raw += [(k.lower().encode(), str(v).encode()) for k, v in (headers or {}).items()]
+    await send({"type": "http.response.start", "status": status, "headers": raw})
+    await send({"type": "http.response.body", "body": body})
+
+
+def json_body(payload):
+    return json.dumps(payload).encode("utf-8")
+
+
+async def parse_json(receive):
+    try:
+        return json.loads(await read_body(receive) or b"null")
+    except ValueError:
+        raise HTTPError(400, "Request body must be JSON") from None
+
+
+def embeddings_response(embeddings, accept, single):
+    """(body, content type, headers) honouring binary negotiation like the Flask service."""
+    dtype = negotiate(accept)
+    if dtype:
+        return pack_embeddings(embeddings, dtype), MEDIA_TYPE, {"X-Embedding-Dtype": dtype}
+    if single:
+        embedding = embeddings[0].tolist()
+        return json_body({"embedding": embedding, "dimension": len(embedding)}), "application/json", {}
+    result = [emb.tolist() for emb in embeddings]
+    return json_body({"embeddings": result, "count": len(result), "dimension": len(result[0])}), \
+        "application/json", {}
+
+
+def require_model():
+    """503 + Retry-After until the model is ready (starting a lazy load if needed)."""
+    if svc.model_ready.is_set():
+        return
+    if svc.startup_error:
+        raise HTTPError(503, f"Model failed to load: {svc.startup_error}")
+    if not svc.model_load_started.is_set():
+        threading.Thread(target=svc.load_model, name="model-loader", daemon=True).start()
+    raise HTTPError(503, "Model is still loading", {"Retry-After": MODEL_RETRY_AFTER_S})
+
+
+def request_timeout(headers):
+    """Seconds left for this request, from X-Request-Timeout-Ms or the default."""
+    value = headers.get("x-request-timeout-ms")
+    try:
+        ms = float(value) if value else DEFAULT_DEADLINE_MS
+    except ValueError:
+        raise HTTPError(400, "X-Request-Timeout-Ms must be a number") from None
+    return max(ms, 1.0) / 1000.0
+
+
+def choose_lane(headers, n_texts):
+    lane = headers.get("x-priority")
+    if lane in ("interactive", "bulk"):
+        return lane
+    return "interactive" if n_texts <= INTERACTIVE_MAX_TEXTS else "bulk"
+
+
+# ── Handlers ─────────────────────────────────────────────────
+async def embed_batched(text, timeout, trace):
+    """One text through the cache and micro-batcher, awaited on the loop rather than a thread."""
+    loop = asyncio.get_running_loop()
+    cache = svc.embed_cache
+    trace.count("texts", 1)
+    svc.request_texts.observe(1)
+    if cache:
+        # The disk tier is SQLite behind a lock: keep it off the event loop
+        keys, vectors = await loop.run_in_executor(admission.executor, cache.lookup, [text]) \
+            if cache.disk else cache.lookup([text])
+        if vectors[0] is not None:
+            return np.asarray(vectors, dtype=np.float32)
+    if svc.batcher.depth >= INTERACTIVE_QUEUE:
+        admission.rejected["interactive"].inc()
+        raise Overloaded(f"micro-batcher queue is full ({svc.batcher.depth} texts queued)",
+                         admission.retry_after("interactive"))
+
+    waiter, future = svc.batcher.submit_async(text)
+    try:
+        embedding = await asyncio.wait_for(waiter, timeout)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(f"Deadline of {timeout * 1000:.0f} ms exceeded") from None
+    trace.add("queue", future.wait_ms)
+    trace.merge(future.trace)
+    embeddings = np.asarray([embedding], dtype=np.float32)
+    if cache:
+        if cache.disk:
+            admission.executor.submit(cache.store, keys, embeddings)
+        else:
+            cache.store(keys, embeddings)
+    return embeddings
+
+
+async def handle_embed(receive, headers, trace):
+    data = await parse_json(receive)
+    if not data or "text" not in data:
+        raise HTTPError(400, "Missing 'text' field")
+    text = data["text"]
+    if not text or not isinstance(text, str):
+        raise HTTPError(400, "'text' must be a non-empty string")
+
+    require_model()
+    lane = choose_lane(headers, 1)
+    if svc.batcher and lane == "interactive" and not (svc.chunker and svc.chunker.needs_split(text)):
+        embeddings = await embed_batched(text, request_timeout(headers), trace)
+    else:
+        embeddings = await admission.run(lane, tracing.bind(trace, svc.embed_texts), [text], True,
+                                         timeout=request_timeout(headers))
+    return embeddings_response(embeddings, headers.get("accept"), single=True)
+
+
+async def handle_embed_batch(receive, headers, trace):
+    data = await parse_json(receive)
+    if not data or "texts" not in data:
+        raise HTTPError(400, "Missing 'texts' field")
+    texts = data["texts"]
+    if not isinstance(texts, list) or len(texts) == 0:
+        raise HTTPError(400, "'texts' must be a non-empty array")
+    if not all(isinstance(t, str) for t in texts):
+        raise HTTPError(400, "'texts' must contain only strings")
+
+    require_model()
+    lane = choose_lane(headers, len(texts))
+    size = BULK_CHUNK_SIZE if lane == "bulk" else len(texts)
+    chunks = [texts[i:i + size] for i in range(0, len(texts), size)]
+    parts = await admission.run_many(lane, tracing.bind(trace, svc.embed_texts), [(c,) for c in chunks],
+                                     [len(c) for c in chunks],
+                                     timeout=request_timeout(headers))
+    return embeddings_response(np.vstack(parts), headers.get("accept"), single=False)
+
+
+# ── WSGI fallback (the Flask app) ────────────────────────────
+# Answered by send_response itself
+HOP_HEADERS = {"content-type", "content-length", "access-control-allow-origin"}
+
+
+def wsgi_environ(scope, headers, body):
+    server_name, server_port = scope.get("server") or ("localhost", 80)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", ""),
+        "PATH_INFO": scope["path"],
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin1"),
+        "SERVER_NAME": server_name,
+        "SERVER_PORT": str(server_port),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "CONTENT_TYPE": headers.get("content-type", ""),
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for name, value in headers.items():
+        if name not in ("content-type", "content-length"):
+            environ["HTTP_" + name.upper().replace("-", "_")] = value
+    return environ
+
+
+def call_wsgi(environ):
+    """Run the Flask app on one request; returns (status, headers, body)."""
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response["status"], response["headers"] = int(status.split(" ", 1)[0]), headers
+
+    chunks = svc.app(environ, start_response)
+    try:
+        body = b"".join(chunks)
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+    return response["status"], response["headers"], body
+
+
+def wsgi_lane(method, path, headers):
+    lane = headers.get("x-priority")
+    if lane in ("interactive", "bulk"):
+        return lane
+    return "interactive" if method == "GET" or path.endswith("/search") else "bulk"
+
+
+async def handle_wsgi(scope, receive, headers):
+    method, path = scope["method"], scope["path"]
+    environ = wsgi_environ(scope, headers, await read_body(receive))
+    status, raw_headers, body = await admission.run(wsgi_lane(method, path, headers), call_wsgi, environ,
+                                                    timeout=request_timeout(headers))
+    response_headers = dict(raw_headers)
+    content_type = response_headers.get("Content-Type", "application/json")
+    extra = {k: v for k, v in raw_headers if k.lower() not in HOP_HEADERS}
+    return status, body, content_type, extra
+
+
+def handle_health():
+    status = svc.health_status()
+    status["serving"] = "asgi"
+    status["admission"] = admission.stats()
+    return json_body(status), "application/json", {}
+
+
+def handle_readyz():
+    if svc.model_ready.is_set():
+        return 200, json_body({"status": "ready", "startup_timings": svc.startup_timings})
+    status = "failed" if svc.startup_error else ("loading" if svc.model_load_started.is_set() else "idle")
+    return 503, json_body({"status": status, "error": svc.startup_error, "startup_mode": svc.STARTUP_MODE})
+
+
+ROUTES = {
+    ("POST", "/embed"): handle_embed,
+    ("POST", "/embed-batch"): handle_embed_batch,
+}
+
+
+async def handle_http(scope, receive, send):
+    method, path = scope["method"], scope["path"]
+    headers = {k.decode("latin1").lower(): v.decode("latin1") for k, v in scope["headers"]}
+
+    if method == "OPTIONS":
+        return await send_response(send, 204, b"", headers={
+            "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+            "Access-Control-Allow-Headers": "Content-Type, Accept, X-Request-Timeout-Ms, X-Priority, X-Trace-Id",
+        })
+    if method == "GET" and path == "/livez":
+        uptime = round(time.perf_counter() - svc.PROCESS_START, 3)
+        return await send_response(send, 200, json_body({"status": "alive", "uptime_s": uptime}))
+    if method == "GET" and path == "/readyz":
+        status, body = handle_readyz()
+        return await send_response(send, status, body)
+    if method == "GET" and path == "/health":
+        body, content_type, extra = handle_health()
+        return await send_response(send, 200, body, content_type, extra)
+    if method == "GET" and path == "/metrics":
+        fmt = parse_qs(scope.get("query_string", b"").decode("latin1")).get("format", [None])[0]
+        if wants_prometheus(headers.get("accept"), fmt):
+            return await send_response(send, 200, REGISTRY.prometheus().encode("utf-8"), PROMETHEUS_CONTENT_TYPE)
+        return await send_response(send, 200, json_body(REGISTRY.snapshot()))
+
+    handler = ROUTES.get((method, path))
+    trace = tracing.Trace(headers.get(tracing.TRACE_HEADER.lower()))
+    started = time.perf_counter()
+    try:
+        if handler is None:
+            # The Flask app traces its own requests
+            status, body, content_type, extra = await handle_wsgi(scope, receive, headers)
+        else:
+            body, content_type, extra = await handler(receive, headers, trace)
+            trace.add("total", (time.perf_counter() - started) * 1000.0)
+            status, extra = 200, {**extra, tracing.TRACE_HEADER: trace.id, "Server-Timing": trace.server_timing()}
+        await send_response(send, status, body, content_type, extra)
+    except HTTPError as e:
+        if e.status != 499:
+            await send_response(send, e.status, json_body({"error": str(e)}), headers=e.headers)
+    except Overloaded as e:
+        await send_response(send, 429, json_body({"error": str(e), "retry_after_s": e.retry_after}),
+                            headers={"Retry-After": e.retry_after})
+    except DeadlineExceeded as e:
+        deadline_exceeded.inc()
+        await send_response(send, 504, json_body({"error": str(e)}))
+    except Exception as e:
+        logger.error(f"{method} {path} failed: {e}")
+        await send_response(send, 500, json_body({"error": str(e)}))
+
+
+async def handle_lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await admission.start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await admission.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await handle_lifespan(receive, send)
+    if scope["type"] == "http":
+        return await handle_http(scope, receive, send)
+
+
+if __name__ == "__main__":
+    import uvicorn
+    port = int(os.getenv("NLP_SERVICE_PORT", 5001))
+    logger.info(f"Async NLP Microservice starting on port {port}")
+    uvicorn.run(app, host="0.0.0.0", port=port, log_level="info")
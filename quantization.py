@@ -0,0 +1,133 @@
+"""
+Compact Embedding Storage
+int8 (per-vector scale), float16 and binary sign-bit codes, plus their
+BSON encodings.
+
+Storage modes (EMBEDDING_STORAGE):
+  • float32 — `embedding` is a list of BSON doubles (8 bytes/dim, default)
+  • int8    — `embedding` is a BSON vector (binary subtype 9, INT8 dtype),
+              which Atlas $vectorSearch indexes natively; `embedding_scale`
+              holds the per-vector dequantization scale
+  • float16 — `embedding` is generic binary of little-endian halves; Atlas
+              cannot index it, so these documents are served by the local index
+`embedding_storage` records the mode, so the re-embedding job can migrate
+documents between modes. Both compact modes add `embedding_bits`, a packed sign-bit sketch (BSON
+vector, PACKED_BIT dtype) used for a first-pass Hamming prefilter.
+"""
+import numpy as np
+
+STORAGE_MODES = ("float32", "int8", "float16")
+
+# BSON binary subtype 9 ("vector") header: dtype byte + padding byte
+BSON_VECTOR_SUBTYPE = 9
+DTYPE_INT8 = 0x03
+DTYPE_PACKED_BIT = 0x10
+
+# popcount of every byte value, for Hamming distance over packed bits
+POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint16)
+
+
+# ── Quantizers ───────────────────────────────────────────────
+def quantize_int8(vectors):
+    """Symmetric per-vector int8: x ≈ codes * scale. Returns (codes, scales)."""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def dequantize_int8(codes, scales):
+    return codes.astype(np.float32) * np.asarray(scales, dtype=np.float32)[:, None]
+
+
+def sign_bits(vectors):
+    """Packed sign-bit sketch: bit i is 1 where component i > 0."""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    return np.packbits(vectors > 0, axis=1)
+
+
+def _words(bits):
+    """View packed bits as uint64 words when the row length allows (fewer XORs/popcounts)."""
+    bits = np.ascontiguousarray(bits)
+    if bits.shape[-1] % 8 == 0:
+        return bits.view(np.uint64)
+    return bits
+
+
+def hamming_distances(query_bits, bits):
+    """Hamming distance from one packed query sketch to every row of `bits`."""
+    diff = np.bitwise_xor(_words(bits), _words(query_bits))
+    if hasattr(np, "bitwise_count"):  # NumPy >= 2.0
+        return np.bitwise_count(diff).sum(axis=1, dtype=np.int32)
+    return POPCOUNT[diff.view(np.uint8)].sum(axis=1, dtype=np.int32)
+
+
+# ── BSON encoding ────────────────────────────────────────────
+def _bson_binary(data, subtype):
+    from bson.binary import Binary
+    return Binary(data, subtype)
+
+
+def encode_embedding(vector, mode="float32"):
+    """Fields to store for one embedding in the given storage mode."""
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    if mode == "float32":
+        return {"embedding": vector.tolist(), "embedding_storage": mode}
+
+    dim = vector.shape[0]
+    padding = (8 - dim % 8) % 8
+    fields = {
+        "embedding_storage": mode,
+        "embedding_bits": _bson_binary(bytes([DTYPE_PACKED_BIT, padding]) + sign_bits(vector).tobytes(),
+                                       BSON_VECTOR_SUBTYPE),
+    }
+    if mode == "int8":
+        codes, scales = quantize_int8(vector)
+        fields["embedding"] = _bson_binary(bytes([DTYPE_INT8, 0]) + codes.tobytes(), BSON_VECTOR_SUBTYPE)
+        fields["embedding_scale"] = float(scales[0])
+    elif mode == "float16":
+        fields["embedding"] = _bson_binary(vector.astype("<f2").tobytes(), 0)
+    else:
+        raise ValueError(f"Unknown storage mode '{mode}' (expected one of {STORAGE_MODES})")
+    return fields
+
+
+def decode_embedding(doc):
+    """Float32 vector from a stored document in any storage mode (None if absent)."""
+    stored = doc.get("embedding")
+    if stored is None:
+        return None
+    if isinstance(stored, list):
+        return np.asarray(stored, dtype=np.float32) if stored else None
+
+    data = bytes(stored)
+    if getattr(stored, "subtype", 0) == BSON_VECTOR_SUBTYPE:
+        if data[0] != DTYPE_INT8:
+            raise ValueError(f"Unsupported BSON vector dtype 0x{data[0]:02x} in 'embedding'")
+        codes = np.frombuffer(data, dtype=np.int8, offset=2)
+        return codes.astype(np.float32) * np.float32(doc.get("embedding_scale", 1.0))
+    return np.frombuffer(data, dtype="<f2").astype(np.float32)
+
+
+def decode_int8(doc):
+    """(codes, scale) stored in an int8-mode document, or None for other modes."""
+    stored = doc.get("embedding")
+    if getattr(stored, "subtype", None) != BSON_VECTOR_SUBTYPE:
+        return None
+    data = bytes(stored)
+    if data[0] != DTYPE_INT8:
+        return None
+    return np.frombuffer(data, dtype=np.int8, offset=2), float(doc.get("embedding_scale", 1.0))
+
+
+def stored_dimension(doc):
+    """Embedding dimension of a stored document without full decoding."""
+    stored = doc.get("embedding")
+    if stored is None:
+        return 0
+    if isinstance(stored, list):
+        return len(stored)
+    if getattr(stored, "subtype", 0) == BSON_VECTOR_SUBTYPE:
+        return len(stored) - 2
+    return len(stored) // 2
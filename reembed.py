@@ -0,0 +1,262 @@
+"""
+Semantic Search Engine — Incremental Re-Embedding Job
+Re-encodes only documents whose content, embedding model or storage mode changed.
+
+Each document carries `content_hash`, `embedding_model`,
+`embedding_model_version`, `embedding_storage` and `embedding_chunking`. The job walks the
+collection in `_id` order, re-embeds the stale documents in batches,
+writes them back with batched `bulk_write` updates and checkpoints the
+last processed `_id`, so an interrupted run resumes where it stopped.
+Documents stay searchable the whole time: each one's embedding is
+replaced in a single update.
+
+Usage:
+    python reembed.py                  # Resume (or start) a run for EMBEDDING_MODEL
+    python reembed.py --restart        # Ignore the checkpoint and rescan from the start
+    python reembed.py --dry-run        # Count stale documents without writing
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.request
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+
+from chunking import Chunker, chunk_id, chunk_records
+from embedding_cache import content_hash
+from encoders import load_encoder, resolve_backend
+from filters import FILTER_PROJECTION, document_attributes
+from quantization import encode_embedding
+
+load_dotenv()
+
+# ── Configuration ─────────────────────────────────────────────
+MONGODB_URI = os.getenv("MONGODB_URI")
+DB_NAME = os.getenv("MONGODB_DB_NAME", "semantic_search_db")
+COLLECTION_NAME = os.getenv("MONGODB_COLLECTION_NAME", "documents")
+MODEL_NAME = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+MODEL_VERSION = os.getenv("EMBEDDING_MODEL_VERSION", "1")
+CHECKPOINT_PATH = os.getenv("REEMBED_CHECKPOINT_PATH", "data/reembed_checkpoint.json")
+NLP_URL = os.getenv("NLP_SERVICE_URL", "http://localhost:5001")
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "float32")
+EMBEDDING_CHUNKING = os.getenv("EMBEDDING_CHUNKING", "pooled")
+SCAN_BATCH_SIZE = 1000
+ENCODE_BATCH_SIZE = 32
+
+PROJECTION = {"title": 1, "content": 1, "content_hash": 1, "embedding_model": 1, "embedding_model_version": 1,
+              "embedding_storage": 1, "embedding_chunking": 1, "chunks.start": 1, **FILTER_PROJECTION}
+
+
+def embedding_fields(content, embedding, now=None):
+    """Fields written alongside a freshly computed embedding."""
+    return {
+        **encode_embedding(embedding, EMBEDDING_STORAGE),
+        "content_hash": content_hash(content),
+        "embedding_model": MODEL_NAME,
+        "embedding_model_version": MODEL_VERSION,
+        "embedding_chunking": EMBEDDING_CHUNKING,
+        "updated_at": now or datetime.now(timezone.utc),
+    }
+
+
+def chunking_mode(doc):
+    """Chunking mode of a stored embedding (inferred for documents written before it was recorded)."""
+    return doc.get("embedding_chunking") or ("chunks" if doc.get("chunks") else "pooled")
+
+
+def is_stale(doc):
+    """True when the stored embedding no longer matches the content, model, storage or chunking mode."""
+    return (
+        doc.get("content_hash") != content_hash(doc.get("content") or "")
+        or doc.get("embedding_model") != MODEL_NAME
+        or doc.get("embedding_model_version") != MODEL_VERSION
+        or doc.get("embedding_storage", "float32") != EMBEDDING_STORAGE
+        or chunking_mode(doc) != EMBEDDING_CHUNKING
+    )
+
+
+def index_entries(docs, embeddings, windows=None):
+    """
+    (id, vector, attributes) for the local index: one per chunk in "chunks"
+    mode, else one per document; chunks share their document's filter attributes.
+    """
+    entries = []
+    for i, (doc, emb) in enumerate(zip(docs, embeddings)):
+        attributes = document_attributes(doc)
+        if windows is not None and len(windows[i]) > 1:
+            entries.extend((chunk_id(doc["_id"], n), vec, attributes) for n, (_, _, vec) in enumerate(windows[i]))
+        else:
+            entries.append((str(doc["_id"]), emb, attributes))
+    return entries
+
+
+def post_nlp(path, payload):
+    """Best-effort JSON POST to the NLP service; returns whether it succeeded."""
+    body = json.dumps(payload).encode("utf-8")
+    req = urllib.request.Request(f"{NLP_URL}{path}", data=body,
+                                 headers={"Content-Type": "application/json"})
+    try:
+        urllib.request.urlopen(req, timeout=10).close()
+        return True
+    except Exception:
+        return False
+
+
+def sync_index(entries, docs):
+    """Push new vectors, and the changed text, to the NLP service's local vector and BM25 indexes."""
+    vectors_ok = post_nlp("/index/upsert", {"documents": [
+        {"id": entry_id, "embedding": vec.tolist(), **attributes} for entry_id, vec, attributes in entries
+    ]})
+    lexical_ok = post_nlp("/lexical/upsert", {"documents": [
+        {"id": str(d["_id"]), "title": d.get("title", ""), "content": d["content"], **document_attributes(d)}
+        for d in docs
+    ]})
+    return vectors_ok and lexical_ok
+
+
+# ── Checkpointing ────────────────────────────────────────────
+def load_checkpoint(path):
+    """Return the saved progress for this model, or a fresh one."""
+    fresh = {"model": MODEL_NAME, "version": MODEL_VERSION, "storage": EMBEDDING_STORAGE,
+             "chunking": EMBEDDING_CHUNKING, "last_id": None, "scanned": 0, "updated": 0, "completed": False}
+    if not os.path.exists(path):
+        return fresh
+    with open(path, encoding="utf-8") as f:
+        saved = json.load(f)
+    if saved.get("completed") or saved.get("model") != MODEL_NAME or saved.get("version") != MODEL_VERSION \
+            or saved.get("storage", "float32") != EMBEDDING_STORAGE or saved.get("chunking") != EMBEDDING_CHUNKING:
+        return fresh
+    return saved
+
+
+def save_checkpoint(path, checkpoint):
+    """Write atomically so a crash never leaves a torn checkpoint."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp, path)
+
+
+# ── Job ──────────────────────────────────────────────────────
+def reembed(collection, model, checkpoint, checkpoint_path, batch_size=SCAN_BATCH_SIZE,
+            dry_run=False, sync=True):
+    """
+    Scan from the checkpoint, re-embedding stale documents batch by batch.
+    With `sync`, updated vectors are also pushed to the NLP service's local index.
+    """
+    encode_s = write_s = 0.0
+    started = time.perf_counter()
+    chunker = Chunker.from_model(model) if model is not None and EMBEDDING_CHUNKING != "off" else None
+
+    while True:
+        query = {}
+        if checkpoint["last_id"]:
+            query["_id"] = {"$gt": ObjectId(checkpoint["last_id"])}
+        batch = list(collection.find(query, PROJECTION).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+
+        stale = [d for d in batch if d.get("content") and is_stale(d)]
+        if stale and not dry_run:
+            t0 = time.perf_counter()
+            contents = [d["content"] for d in stale]
+            encode_fn = lambda texts: model.encode(texts, batch_size=ENCODE_BATCH_SIZE)
+            if chunker:
+                embeddings, windows = chunker.embed_documents(contents, encode_fn)
+                windows = windows if EMBEDDING_CHUNKING == "chunks" else None
+            else:
+                embeddings, windows = encode_fn(contents), None
+            encode_s += time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            now = datetime.now(timezone.utc)
+            updates = []
+            for i, (d, emb) in enumerate(zip(stale, embeddings)):
+                fields = embedding_fields(d["content"], emb, now)
+                if windows is not None:
+                    fields["chunks"] = chunk_records(windows[i], EMBEDDING_STORAGE)
+                    update = {"$set": fields}
+                else:
+                    # Chunk vectors of an earlier model or mode would otherwise be indexed instead
+                    update = {"$set": fields, "$unset": {"chunks": ""}}
+                updates.append(UpdateOne({"_id": d["_id"]}, update))
+            collection.bulk_write(updates, ordered=False)
+            write_s += time.perf_counter() - t0
+            if sync and not sync_index(index_entries(stale, embeddings, windows), stale):
+                sync = False
+                print("\n   ⚠️  NLP service index sync failed; it will rebuild from MongoDB on restart")
+
+        checkpoint["last_id"] = str(batch[-1]["_id"])
+        checkpoint["scanned"] += len(batch)
+        checkpoint["updated"] += len(stale)
+        if not dry_run:
+            save_checkpoint(checkpoint_path, checkpoint)
+
+        elapsed = time.perf_counter() - started
+        print(f"\r   ⏳ scanned {checkpoint['scanned']:,} — re-embedded {checkpoint['updated']:,} "
+              f"({checkpoint['scanned'] / elapsed:,.0f} docs/s)", end="", flush=True)
+
+    print()
+    checkpoint["completed"] = True
+    if not dry_run:
+        save_checkpoint(checkpoint_path, checkpoint)
+    return {"wall_s": time.perf_counter() - started, "encode_s": encode_s, "write_s": write_s}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-embed documents whose content or model changed")
+    parser.add_argument("--restart", action="store_true", help="Ignore any saved checkpoint")
+    parser.add_argument("--dry-run", action="store_true", help="Count stale documents without writing")
+    parser.add_argument("--batch-size", type=int, default=SCAN_BATCH_SIZE)
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    parser.add_argument("--no-index-sync", action="store_true",
+                        help="Don't push updated vectors to the NLP service's local index")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🔁 SEMANTIC SEARCH ENGINE — INCREMENTAL RE-EMBEDDING")
+    print("=" * 60)
+    print(f"   Model: {MODEL_NAME} (version {MODEL_VERSION}), storage: {EMBEDDING_STORAGE}, "
+          f"chunking: {EMBEDDING_CHUNKING}")
+
+    try:
+        client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=5000)
+        client.admin.command("ping")
+        collection = client[DB_NAME][COLLECTION_NAME]
+        print(f"   ✅ Connected to {DB_NAME}/{COLLECTION_NAME}")
+    except Exception as e:
+        print(f"   ❌ Connection failed: {e}")
+        sys.exit(1)
+
+    checkpoint = load_checkpoint(args.checkpoint)
+    if args.restart:
+        checkpoint.update({"last_id": None, "scanned": 0, "updated": 0, "completed": False})
+    if checkpoint["last_id"]:
+        print(f"   ↪️  Resuming after _id {checkpoint['last_id']} "
+              f"({checkpoint['scanned']:,} scanned, {checkpoint['updated']:,} re-embedded so far)")
+
+    model = None
+    if not args.dry_run:
+        print(f"\n🤖 Loading embedding model: {MODEL_NAME} ({resolve_backend()} backend)")
+        model = load_encoder(MODEL_NAME)
+
+    print("\n📝 Scanning collection...")
+    stats = reembed(collection, model, checkpoint, args.checkpoint, args.batch_size,
+                    args.dry_run, sync=not args.no_index_sync)
+
+    print("\n" + "=" * 60)
+    verb = "would re-embed" if args.dry_run else "re-embedded"
+    print(f"🎉 Done: scanned {checkpoint['scanned']:,}, {verb} {checkpoint['updated']:,}")
+    print(f"   wall {stats['wall_s']:.2f}s — encode {stats['encode_s']:.2f}s, write {stats['write_s']:.2f}s")
+    print("=" * 60)
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,13 +5,30 @@ Populates MongoDB with diverse documents and pre-computed embeddings.
 Usage:
     python seed.py              # Clear existing docs, then seed
     python seed.py --no-clear   # Seed without clearing existing docs
+    python seed.py --input corpus.jsonl --no-clear --chunk-size 512
+                                # Stream a JSONL/CSV corpus in bounded memory
+    python seed.py --store data/embedding_store
+                                # Also write the memory-mapped embedding store
 """
+import argparse
+import csv
+import json
+import queue
 import sys
 import os
+import threading
+import time
 from datetime import datetime, timezone
 
 from dotenv import load_dotenv
 from pymongo import MongoClient
+from pymongo.errors import BulkWriteError
+
+from chunking import CHUNKING_MODES, Chunker, chunk_id, chunk_records
+from embedding_cache import content_hash
+from encoders import load_encoder, resolve_backend
+from filters import document_attributes
+from quantization import STORAGE_MODES, encode_embedding
 
 load_dotenv()
 
@@ -20,6 +37,16 @@ MONGODB_URI = os.getenv("MONGODB_URI")
 DB_NAME = os.getenv("MONGODB_DB_NAME", "semantic_search_db")
 COLLECTION_NAME = os.getenv("MONGODB_COLLECTION_NAME", "documents")
 MODEL_NAME = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+MODEL_VERSION = os.getenv("EMBEDDING_MODEL_VERSION", "1")
+# How `embedding` is stored: float32 (BSON doubles), int8 or float16 (compact BSON binary)
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "float32")
+# Long documents: off (model truncates), pooled (one vector from token windows),
+# chunks (pooled vector plus per-window vectors for the local index)
+EMBEDDING_CHUNKING = os.getenv("EMBEDDING_CHUNKING", "pooled")
+# Memory-mapped embedding store the NLP service opens instead of reading MongoDB ("" = off)
+EMBEDDING_STORE_PATH = os.getenv("EMBEDDING_STORE_PATH", "")
+DEFAULT_CHUNK_SIZE = 256
+ENCODE_BATCH_SIZE = 32
 
 # ── Seed Data ─────────────────────────────────────────────────
 SEED_DOCUMENTS = [
@@ -212,8 +239,212 @@ SEED_DOCUMENTS = [
 ]
 
 
+# ── Streaming ingestion ───────────────────────────────────────
+def read_documents(path):
+    """
+    Yield {title, content, category} dicts from a .jsonl/.ndjson or .csv file
+    one at a time, so the corpus is never held in memory.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, encoding="utf-8", newline="") as f:
+        if ext == ".csv":
+            rows = csv.DictReader(f)
+        elif ext in (".jsonl", ".ndjson"):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            raise ValueError(f"Unsupported input format '{ext}' (use .jsonl, .ndjson or .csv)")
+
+        for row in rows:
+            title, content = row.get("title"), row.get("content")
+            if not title or not content:
+                continue
+            yield {
+                "title": title,
+                "content": content,
+                "category": row.get("category") or "Uncategorized",
+            }
+
+
+def chunked(iterable, size):
+    """Yield lists of up to `size` items from any iterable."""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def build_records(docs, embeddings, storage=EMBEDDING_STORAGE, windows=None, chunking=EMBEDDING_CHUNKING):
+    """MongoDB documents for a chunk of source docs and their embeddings (plus per-window vectors)."""
+    now = datetime.now(timezone.utc)
+    records = [{
+        "title": doc["title"],
+        "content": doc["content"],
+        "category": doc["category"],
+        **encode_embedding(emb, storage),
+        "content_hash": content_hash(doc["content"]),
+        "embedding_model": MODEL_NAME,
+        "embedding_model_version": MODEL_VERSION,
+        "embedding_chunking": chunking,
+        "created_at": now,
+        "updated_at": now,
+    } for doc, emb in zip(docs, embeddings)]
+    if windows is not None:
+        for record, doc_windows in zip(records, windows):
+            record["chunks"] = chunk_records(doc_windows, storage)
+    return records
+
+
+def encode_documents(model, contents, chunking=EMBEDDING_CHUNKING, chunker=None):
+    """
+    Embed document contents. Returns (vectors, windows); windows holds each
+    document's (start, end, vector) token windows in "chunks" mode, else None.
+    """
+    encode_fn = lambda texts: model.encode(texts, batch_size=ENCODE_BATCH_SIZE)
+    if chunking == "off":
+        return encode_fn(contents), None
+    chunker = chunker or Chunker.from_model(model)
+    pooled, windows = chunker.embed_documents(contents, encode_fn)
+    return pooled, (windows if chunking == "chunks" else None)
+
+
+def store_entries(records, embeddings, windows, failed=()):
+    """
+    (ids, vectors, attributes) of inserted records for the embedding store: one
+    entry per chunk in "chunks" mode, as the local index holds them, else the
+    pooled vector. Chunk entries share their document's filter attributes.
+    """
+    ids, vectors, attributes = [], [], []
+    for i, record in enumerate(records):
+        if i in failed:
+            continue
+        record_attributes = document_attributes(record)
+        if record.get("chunks"):
+            for n, (_, _, vector) in enumerate(windows[i]):
+                ids.append(chunk_id(record["_id"], n))
+                vectors.append(vector)
+                attributes.append(record_attributes)
+        else:
+            ids.append(str(record["_id"]))
+            vectors.append(embeddings[i])
+            attributes.append(record_attributes)
+    return ids, vectors, attributes
+
+
+def ingest_stream(collection, model, docs, chunk_size=DEFAULT_CHUNK_SIZE, progress=True,
+                  storage=EMBEDDING_STORAGE, chunking=EMBEDDING_CHUNKING, store=None):
+    """
+    Encode and insert a document stream chunk by chunk.
+
+    The main thread encodes chunk N+1 while a writer thread runs an unordered
+    insert_many for chunk N. The hand-off queue holds a single chunk, so at most
+    three chunks (reading, queued, writing) are alive regardless of corpus size.
+    With an EmbeddingStore, the writer also appends the float32 vectors of the
+    inserted documents to it. Returns throughput stats.
+    """
+    handoff = queue.Queue(maxsize=1)
+    stats = {"inserted": 0, "failed": 0, "encode_s": 0.0, "write_s": 0.0}
+    writer_error = []
+
+    def writer():
+        while True:
+            item = handoff.get()
+            if item is None:
+                return
+            records, embeddings, windows = item
+            started = time.perf_counter()
+            try:
+                failed = set()
+                try:
+                    result = collection.insert_many(records, ordered=False)
+                    stats["inserted"] += len(result.inserted_ids)
+                except BulkWriteError as e:
+                    failed = {err["index"] for err in e.details.get("writeErrors", [])}
+                    stats["inserted"] += e.details.get("nInserted", 0)
+                    stats["failed"] += len(failed)
+                if store is not None:
+                    # insert_many assigned each record its _id
+                    ids, vectors, attributes = store_entries(records, embeddings, windows, failed)
+                    if ids:
+                        store.append(ids, vectors, attributes)
+            except Exception as e:
+                writer_error.append(e)
+                return
+            finally:
+                stats["write_s"] += time.perf_counter() - started
+
+    def hand_off(item):
+        """Queue `item` for the writer; False once the writer has exited and nothing will take it."""
+        while thread.is_alive():
+            try:
+                handoff.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    chunker = Chunker.from_model(model) if chunking != "off" else None
+    thread = threading.Thread(target=writer, name="seed-writer", daemon=True)
+    thread.start()
+    wall_start = time.perf_counter()
+    encoded = 0
+
+    try:
+        for chunk in chunked(docs, chunk_size):
+            if writer_error:
+                break
+            started = time.perf_counter()
+            embeddings, windows = encode_documents(model, [d["content"] for d in chunk], chunking, chunker)
+            stats["encode_s"] += time.perf_counter() - started
+            encoded += len(chunk)
+
+            if not hand_off((build_records(chunk, embeddings, storage, windows, chunking), embeddings, windows)) \
+                    or writer_error:
+                break
+            if progress:
+                elapsed = time.perf_counter() - wall_start
+                print(f"\r   ⏳ {encoded:,} docs encoded — {encoded / elapsed:,.0f} docs/s", end="", flush=True)
+    finally:
+        hand_off(None)
+        thread.join()
+        if progress:
+            print()
+
+    if writer_error:
+        raise writer_error[0]
+
+    stats["encoded"] = encoded
+    stats["wall_s"] = time.perf_counter() - wall_start
+    stats["docs_per_s"] = stats["inserted"] / stats["wall_s"] if stats["wall_s"] else 0.0
+    return stats
+
+
+def print_throughput(stats):
+    print(f"   📈 Throughput: {stats['docs_per_s']:,.0f} docs/s "
+          f"({stats['inserted']:,} docs in {stats['wall_s']:.2f}s)")
+    print(f"      encode: {stats['encode_s']:.2f}s   write: {stats['write_s']:.2f}s "
+          f"(overlapped on a writer thread)")
+    if stats["failed"]:
+        print(f"   ⚠️  {stats['failed']:,} document(s) failed to insert")
+
+
 def main():
-    no_clear = "--no-clear" in sys.argv
+    parser = argparse.ArgumentParser(description="Seed MongoDB with documents and embeddings")
+    parser.add_argument("--no-clear", action="store_true", help="Keep existing documents")
+    parser.add_argument("--input", help="Stream documents from a .jsonl/.ndjson/.csv file")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Documents encoded and inserted per chunk")
+    parser.add_argument("--storage", choices=STORAGE_MODES, default=EMBEDDING_STORAGE,
+                        help="Embedding storage format (default: EMBEDDING_STORAGE or float32)")
+    parser.add_argument("--chunking", choices=CHUNKING_MODES, default=EMBEDDING_CHUNKING,
+                        help="Long-document handling (default: EMBEDDING_CHUNKING or pooled)")
+    parser.add_argument("--store", default=EMBEDDING_STORE_PATH,
+                        help="Embedding store directory to write as well (default: EMBEDDING_STORE_PATH)")
+    args = parser.parse_args()
+    no_clear = args.no_clear
 
     print("=" * 60)
     print("🌱 SEMANTIC SEARCH ENGINE — DATA SEED SCRIPT")
@@ -242,40 +473,45 @@ def main():
         print("\n⏭️  Skipping clear (--no-clear flag set)")
 
     # ── Load embedding model ──────────────────────────────────
-    print(f"\n🤖 Loading embedding model: {MODEL_NAME}")
+    print(f"\n🤖 Loading embedding model: {MODEL_NAME} ({resolve_backend()} backend)")
     print("   (this may take a moment on first run)...")
-    from sentence_transformers import SentenceTransformer
-    model = SentenceTransformer(MODEL_NAME)
+    model = load_encoder(MODEL_NAME)
     test_vec = model.encode("test")
     dim = len(test_vec)
     print(f"   ✅ Model loaded — output dimension: {dim}")
 
+    # ── Open the embedding store ──────────────────────────────
+    store = None
+    if args.store:
+        from embedding_store import EmbeddingStore
+        store = EmbeddingStore(args.store, dim, recreate=True)
+        if not no_clear:
+            store.clear()
+        print(f"\n💾 Embedding store: {args.store} ({len(store):,} vectors kept)")
+
     # ── Generate embeddings and insert ────────────────────────
+    if args.input:
+        print(f"\n📝 Streaming documents from {args.input} (chunks of {args.chunk_size})...\n")
+        stats = ingest_stream(collection, model, read_documents(args.input), args.chunk_size,
+                              storage=args.storage, chunking=args.chunking, store=store)
+        print_throughput(stats)
+        print("=" * 60)
+        print(f"🎉 SUCCESS: Inserted {stats['inserted']:,} documents")
+        print("=" * 60)
+        print(f"\n📦 Total documents in collection: {collection.count_documents({}):,}")
+        print(f"🔑 Embedding dimensions: {dim}")
+        client.close()
+        return
+
     total = len(SEED_DOCUMENTS)
     print(f"\n📝 Seeding {total} documents...\n")
-
-    # Batch-encode all content for efficiency
-    texts = [doc["content"] for doc in SEED_DOCUMENTS]
-    print("   Generating embeddings (batch)...")
-    embeddings = model.encode(texts, show_progress_bar=True, batch_size=32)
-    print(f"   ✅ Generated {len(embeddings)} embeddings\n")
-
-    # Build documents for insertion
-    now = datetime.now(timezone.utc)
-    docs_to_insert = []
-    for i, doc in enumerate(SEED_DOCUMENTS):
-        docs_to_insert.append({
-            "title": doc["title"],
-            "content": doc["content"],
-            "category": doc["category"],
-            "embedding": embeddings[i].tolist(),
-            "created_at": now,
-            "updated_at": now,
-        })
-
-    # Insert all at once
-    result = collection.insert_many(docs_to_insert)
-    inserted_count = len(result.inserted_ids)
+    print("   Generating embeddings and inserting (chunked)...")
+    stats = ingest_stream(collection, model, iter(SEED_DOCUMENTS), args.chunk_size, progress=False,
+                          storage=args.storage, chunking=args.chunking, store=store)
+    inserted_count = stats["inserted"]
+    print(f"   ✅ Generated {stats['encoded']} embeddings")
+    print_throughput(stats)
+    print()
 
     # ── Summary ───────────────────────────────────────────────
     print("=" * 60)
@@ -0,0 +1,406 @@
+"""
+Sharded Vector Search
+Scatter-gather search over the local index split across worker processes.
+
+Entries go to shards by a stable hash of their document id, so a document's
+chunk entries share one shard. Each shard is its own process holding its
+own slice in any local index type (vector_index.INDEX_TYPES), pinned to its
+own CPU group like the encoder pool. N shards scan with N cores and their
+memory bandwidth instead of one.
+
+A query, or a whole batch, goes to every shard at once. Each shard returns
+its own top-k, and the coordinator merges the sorted lists with a heap.
+Shards that have not answered by the deadline are left out. The result is
+then the best of the shards that did answer, and the caller learns how many
+did (a late answer is discarded). Writes go only to the owning shards and
+wait for their acknowledgement.
+
+ShardPool owns the processes. Like EncoderPool, create it early, before the
+parent starts threads. Also like EncoderPool, a monitor thread watches the
+shard processes: when one dies, its in-flight tasks fail at once, searches
+carry on over the remaining shards and stats() reports the shard as dead. ShardedIndex presents the pool as one index with the
+interface nlp_service uses (search_batch, add, remove, build, save, stats, ...).
+`python bench_shards.py` measures throughput against the shard count.
+"""
+import heapq
+import itertools
+import logging
+import multiprocessing as mp
+import multiprocessing.connection
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import Future, wait
+
+import numpy as np
+
+from chunking import parent_id
+from encoder_pool import cpu_groups
+
+logger = logging.getLogger(__name__)
+
+DEADLINE_MS = 200
+WRITE_TIMEOUT = 60.0
+# stats() is on the /health path, so it never waits long for a shard
+STATS_TIMEOUT = 2.0
+# Operations a shard will run on its index
+SHARD_OPS = ("init", "load", "search_batch", "add", "remove", "build", "train", "compact", "save",
+             "live_ids", "stats")
+# Settings re-applied to an index loaded from disk (they are not part of its data)
+RUNTIME_SETTINGS = ("nprobe", "rescore", "rerank")
+
+
+def shard_of(entry_id, shards):
+    """Stable shard number for an entry id; chunk entries follow their document."""
+    return zlib.crc32(parent_id(entry_id).encode("utf-8")) % shards
+
+
+def shard_path(path, shard):
+    """Per-shard file next to `path`: data/vector_index.npz → data/vector_index.shard0.npz."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard{shard}{ext or '.npz'}"
+
+
+def merge_hits(per_shard, k):
+    """Global top-k from per-shard [(id, score)] lists, each sorted best first."""
+    return list(itertools.islice(heapq.merge(*per_shard, key=lambda hit: -hit[1]), k))
+
+
+def _shard_main(shard, cores, threads, delay_ms, tasks, results):
+    """Shard loop: pin, then run index operations until told to stop."""
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+
+    from vector_index import INDEX_TYPES, load_index, settings_match
+
+    index, settings = None, {}
+    results.put(("ready", shard, None))
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        task_id, op, args, kwargs, expires = task
+        if expires is not None and time.monotonic() > expires:
+            results.put(("error", task_id, "deadline passed before the shard got to it"))
+            continue                    # a backed-up shard skips searches nobody is waiting for
+        try:
+            if op == "init":
+                index_type, dim, settings = args
+                index, result = INDEX_TYPES[index_type](dim, **settings), None
+            elif op == "load":
+                loaded = load_index(args[0])
+                if (loaded.index_type, loaded.dim) != (index.index_type, index.dim):
+                    raise ValueError(f"{args[0]} holds a {loaded.dim}-dim {loaded.index_type} index")
+                if not settings_match(loaded, index):
+                    raise ValueError(f"{args[0]} was built with another projection")
+                for name in RUNTIME_SETTINGS:
+                    if name in settings and hasattr(loaded, name):
+                        setattr(loaded, name, settings[name])
+                index, result = loaded, None
+            else:
+                if op == "search_batch" and delay_ms:
+                    time.sleep(delay_ms / 1000.0)
+                result = getattr(index, op)(*args, **kwargs)
+            sizes = (len(index), index.tombstones) if index is not None else (0, 0)
+            results.put(("ok", task_id, (result, sizes)))
+        except Exception as e:
+            results.put(("error", task_id, repr(e)))
+
+
+class ShardPool:
+    """Shard worker processes and the request/response plumbing to them."""
+
+    def __init__(self, shards, threads_per_shard=None, delays_ms=None):
+        """`delays_ms` ({shard: ms}) slows searches on chosen shards, for deadline benchmarks."""
+        if shards < 1:
+            raise ValueError("shards must be >= 1")
+        self.shards = shards
+
+        ctx = mp.get_context("fork")
+        self._tasks = [ctx.Queue() for _ in range(shards)]
+        self._results = ctx.Queue()
+        self._pending = {}              # task_id → (future, shard)
+        self._dead = set()
+        self._closing = False
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._ready_count = 0
+        self.error = None
+
+        self.core_groups = cpu_groups(shards)
+        self._procs = []
+        for i, cores in enumerate(self.core_groups):
+            proc = ctx.Process(target=_shard_main, name=f"shard-{i}", daemon=True,
+                               args=(i, cores, threads_per_shard or len(cores), (delays_ms or {}).get(i),
+                                     self._tasks[i], self._results))
+            proc.start()
+            self._procs.append(proc)
+
+        self._collector = threading.Thread(target=self._collect, name="shard-pool-results", daemon=True)
+        self._collector.start()
+        self._monitor = threading.Thread(target=self._watch, name="shard-pool-monitor", daemon=True)
+        self._monitor.start()
+        logger.info(f"Shard pool: {shards} shards on CPU groups {self.core_groups}")
+
+    def _collect(self):
+        while True:
+            kind, key, payload = self._results.get()
+            if kind == "ready":
+                self._ready_count += 1
+                if self._ready_count == self.shards:
+                    self._ready.set()
+                continue
+            with self._lock:
+                future, _ = self._pending.pop(key, (None, None))
+            if future is None:
+                continue                # answered after its deadline
+            if kind == "ok":
+                future.set_result(payload)
+            else:
+                future.set_exception(RuntimeError(payload))
+
+    def _watch(self):
+        """Wait on the shard processes' sentinels and handle each one that exits."""
+        live = {proc.sentinel: i for i, proc in enumerate(self._procs)}
+        while live:
+            for sentinel in mp.connection.wait(list(live)):
+                self._shard_exited(live.pop(sentinel))
+
+    def _shard_exited(self, shard):
+        with self._lock:
+            self._dead.add(shard)
+            orphaned = [task_id for task_id, (_, owner) in self._pending.items() if owner == shard]
+            futures = [self._pending.pop(task_id)[0] for task_id in orphaned]
+        if self._closing:
+            return
+        self._procs[shard].join(1)      # reap it, so exitcode is set
+        error = f"shard-{shard} exited with code {self._procs[shard].exitcode}"
+        logger.error(f"{error}; failing {len(futures)} in-flight task(s)")
+        self.error = self.error or error
+        self._ready.set()               # wake wait_ready() if the pool was still starting
+        for future in futures:
+            future.set_exception(RuntimeError(error))
+
+    def wait_ready(self, timeout=None):
+        if not self._ready.wait(timeout):
+            raise TimeoutError("Shard workers did not start in time")
+        if self.error:
+            raise RuntimeError(self.error)
+
+    @property
+    def dead(self):
+        return sorted(self._dead)
+
+    def submit(self, shard, op, *args, expires=None, **kwargs):
+        """
+        Future for (result, (size, tombstones)) of `op` on one shard. A task
+        still queued at `expires` (time.monotonic()) is skipped. The future
+        fails straight away when the shard's process has died.
+        """
+        if op not in SHARD_OPS:
+            raise ValueError(f"Unknown shard operation '{op}'")
+        future = Future()
+        task_id = next(self._ids)
+        with self._lock:
+            if shard in self._dead:
+                future.set_exception(RuntimeError(f"shard-{shard} is dead"))
+                return future, task_id
+            self._pending[task_id] = (future, shard)
+        self._tasks[shard].put((task_id, op, args, kwargs, expires))
+        return future, task_id
+
+    def abandon(self, task_id):
+        """Stop waiting for a task; its answer will be dropped."""
+        with self._lock:
+            self._pending.pop(task_id, None)
+
+    def alive(self):
+        return [proc.is_alive() for proc in self._procs]
+
+    def close(self, timeout=5):
+        self._closing = True
+        for tasks in self._tasks:
+            tasks.put(None)
+        deadline = time.monotonic() + timeout
+        for proc in self._procs:
+            proc.join(max(0.0, deadline - time.monotonic()))
+            if proc.is_alive():
+                proc.terminate()
+
+
+class ShardedIndex:
+    """
+    One logical index over every shard of a ShardPool. Searches return what
+    the shards answered within `deadline_ms`; writes wait for every shard
+    they touch (up to WRITE_TIMEOUT) and raise if one fails.
+    """
+
+    attachable = False
+    store = None
+
+    def __init__(self, pool, index_type, dim, deadline_ms=DEADLINE_MS, **settings):
+        self.pool = pool
+        self.shards = pool.shards
+        self.index_type = index_type
+        self.dim = dim
+        self.deadline_ms = deadline_ms
+        self._sizes = [0] * self.shards
+        self._tombstones = [0] * self.shards
+        self.partial_searches = 0
+        pool.wait_ready(WRITE_TIMEOUT)
+        self._all("init", index_type, dim, settings)
+
+    # ── Plumbing ─────────────────────────────────────────────
+    def _record(self, shard, sizes):
+        self._sizes[shard], self._tombstones[shard] = sizes
+
+    def _call(self, calls):
+        """Run {shard: (op, args)} in parallel, waiting for all; returns {shard: result}."""
+        submitted = {shard: self.pool.submit(shard, op, *args) for shard, (op, args) in calls.items()}
+        results = {}
+        try:
+            for shard, (future, _) in submitted.items():
+                result, sizes = future.result(timeout=WRITE_TIMEOUT)
+                self._record(shard, sizes)
+                results[shard] = result
+        except BaseException:
+            for _, task_id in submitted.values():
+                self.pool.abandon(task_id)
+            raise
+        return results
+
+    def _all(self, op, *args):
+        return self._call({shard: (op, args) for shard in range(self.shards)})
+
+    def _partition(self, ids):
+        """{shard: row indices} for a list of entry ids."""
+        owners = np.fromiter((shard_of(i, self.shards) for i in ids), dtype=np.int64, count=len(ids))
+        return {shard: np.flatnonzero(owners == shard) for shard in range(self.shards)}
+
+    # ── Size / bookkeeping ───────────────────────────────────
+    def __len__(self):
+        return sum(self._sizes)
+
+    @property
+    def tombstones(self):
+        return sum(self._tombstones)
+
+    def live_ids(self):
+        return [i for ids in self._all("live_ids").values() for i in ids]
+
+    # ── Mutations ────────────────────────────────────────────
+    def _split(self, op, ids, vectors, attributes, every_shard=False):
+        ids = list(ids)
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        calls = {}
+        for shard, rows in self._partition(ids).items():
+            if rows.size or every_shard:
+                calls[shard] = (op, ([ids[r] for r in rows], vectors[rows],
+                                     [attributes[r] for r in rows] if attributes is not None else None))
+        self._call(calls)
+
+    def build(self, ids, vectors, attributes=None):
+        """Replace the contents of every shard with its slice of the entries."""
+        self._split("build", ids, vectors, attributes, every_shard=True)
+
+    def add(self, ids, vectors, attributes=None):
+        """Insert or replace entries on their owning shards."""
+        self._split("add", ids, vectors, attributes)
+
+    def remove(self, ids):
+        ids = list(ids)
+        calls = {shard: ("remove", ([ids[r] for r in rows],))
+                 for shard, rows in self._partition(ids).items() if rows.size}
+        return sum(self._call(calls).values())
+
+    def train(self):
+        """Train every shard's index on its own slice (no-op for index types without training)."""
+        from vector_index import INDEX_TYPES
+
+        if hasattr(INDEX_TYPES[self.index_type], "train"):
+            self._all("train")
+
+    def compact(self):
+        self._all("compact")
+
+    # ── Search ───────────────────────────────────────────────
+    def scatter(self, queries, k=10, deadline_ms=None, **options):
+        """
+        (results, shards answered) for a batch of queries. `options` (nprobe,
+        rescore, rerank, exact, filters) are passed to every shard's search.
+        """
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        timeout = (deadline_ms or self.deadline_ms) / 1000.0
+        expires = time.monotonic() + timeout
+        submitted = [self.pool.submit(shard, "search_batch", queries, k, expires=expires, **options)
+                     for shard in range(self.shards)]
+        done, _ = wait([future for future, _ in submitted], timeout=timeout)
+        per_shard = []
+        for shard, (future, task_id) in enumerate(submitted):
+            if future not in done:
+                self.pool.abandon(task_id)
+                continue
+            try:
+                batches, sizes = future.result()
+            except RuntimeError as e:
+                logger.warning(f"Shard {shard} search failed: {e}")
+                continue
+            self._record(shard, sizes)
+            per_shard.append(batches)
+        if len(per_shard) < self.shards:
+            self.partial_searches += 1
+        results = [merge_hits([batches[q] for batches in per_shard], k) for q in range(queries.shape[0])]
+        return results, len(per_shard)
+
+    def search_batch(self, queries, k=10, **options):
+        return self.scatter(queries, k, **options)[0]
+
+    def search(self, query, k=10, **options):
+        return self.search_batch(np.atleast_2d(query), k, **options)[0]
+
+    def stats(self):
+        """Index stats without blocking: dead or slow shards are reported, not waited on."""
+        submitted = [self.pool.submit(shard, "stats") for shard in range(self.shards)]
+        done, _ = wait([future for future, _ in submitted], timeout=STATS_TIMEOUT)
+        per_shard = []
+        for shard, (future, task_id) in enumerate(submitted):
+            if future not in done:
+                self.pool.abandon(task_id)
+                per_shard.append({"error": f"no answer within {STATS_TIMEOUT}s"})
+            elif future.exception() is not None:
+                per_shard.append({"error": str(future.exception())})
+            else:
+                stats, sizes = future.result()
+                self._record(shard, sizes)
+                per_shard.append(stats)
+        alive = self.pool.alive()
+        return {
+            "type": self.index_type,
+            "size": len(self),
+            "tombstones": self.tombstones,
+            "dim": self.dim,
+            "shards": self.shards,
+            "shards_alive": sum(alive),
+            "dead_shards": self.pool.dead,
+            "error": self.pool.error,
+            "deadline_ms": self.deadline_ms,
+            "partial_searches": self.partial_searches,
+            "core_groups": self.pool.core_groups,
+            "per_shard": per_shard,
+        }
+
+    # ── Persistence ──────────────────────────────────────────
+    def save(self, path):
+        """Each shard writes its slice to shard_path(path, shard)."""
+        self._call({shard: ("save", (shard_path(path, shard),)) for shard in range(self.shards)})
+
+    def load(self, path):
+        """Load every shard's file; False (shards left empty) when any is missing."""
+        if not all(os.path.exists(shard_path(path, shard)) for shard in range(self.shards)):
+            return False
+        self._call({shard: ("load", (shard_path(path, shard),)) for shard in range(self.shards)})
+        return True
@@ -0,0 +1,155 @@
+"""
+Request Tracing
+Per-request stage timings for the NLP service, propagated through headers.
+
+The Express API sends `X-Trace-Id` with each call; the service records how
+long every stage of the request took (micro-batch queue wait, tokenization,
+forward pass, index search ...) on the request's Trace and returns them in a
+standard `Server-Timing` header, so the caller can break a slow search down
+stage by stage. Each stage also feeds an `nlp_stage_<name>_ms` histogram.
+
+The active Trace lives in a ContextVar: set per request by the Flask hooks,
+and carried onto executor / micro-batcher threads explicitly (`bind`,
+`Trace.merge`), since threads do not inherit it.
+"""
+import contextvars
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from metrics import REGISTRY
+
+TRACE_HEADER = "X-Trace-Id"
+STAGE_MS_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 50, 100, 250, 500, 1000, 5000)
+TOKEN_BUCKETS = (4, 8, 16, 32, 64, 128, 256, 512)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+_current = contextvars.ContextVar("trace", default=None)
+_stage_histograms = {}
+
+tokens_per_text = REGISTRY.histogram("nlp_tokens_per_text", TOKEN_BUCKETS, "Tokens per text after truncation")
+tokens_per_batch = REGISTRY.histogram("nlp_padded_tokens_per_batch", (64, 256, 1024, 4096, 16384, 65536),
+                                      "Padded tokens per forward pass")
+forward_batch_size = REGISTRY.histogram("nlp_forward_batch_size", BATCH_SIZE_BUCKETS, "Texts per forward pass")
+
+
+class Trace:
+    """Stage durations (ms, summed when a stage repeats) and counts for one request."""
+
+    def __init__(self, trace_id=None):
+        self.id = trace_id or uuid.uuid4().hex[:16]
+        self.stages = {}
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, ms):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + ms
+
+    def count(self, name, n):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def merge(self, other):
+        """Fold in another trace's stages (e.g. the micro-batch a request rode in)."""
+        if other is None:
+            return
+        for name, ms in other.stages.items():
+            self.add(name, ms)
+        for name, n in other.counts.items():
+            self.count(name, n)
+
+    def server_timing(self):
+        """`Server-Timing` header value: stages as dur=ms, counts as desc."""
+        parts = [f"{name};dur={ms:.3f}" for name, ms in self.stages.items()]
+        parts += [f'{name};desc="{n}"' for name, n in self.counts.items()]
+        return ", ".join(parts)
+
+
+def current():
+    return _current.get()
+
+
+def begin(trace):
+    """Make `trace` current; returns a token for `end`."""
+    return _current.set(trace)
+
+
+def end(token):
+    _current.reset(token)
+
+
+def bind(trace, fn):
+    """Wrap fn so it runs with `trace` current (for executor threads)."""
+    def run(*args, **kwargs):
+        token = _current.set(trace)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return run
+
+
+def stage_histogram(name):
+    histogram = _stage_histograms.get(name)
+    if histogram is None:
+        histogram = _stage_histograms[name] = REGISTRY.histogram(
+            f"nlp_stage_{name}_ms", STAGE_MS_BUCKETS, f"Time spent in the {name} stage")
+    return histogram
+
+
+def record(name, ms):
+    stage_histogram(name).observe(ms)
+    trace = _current.get()
+    if trace is not None:
+        trace.add(name, ms)
+
+
+def count(name, n):
+    trace = _current.get()
+    if trace is not None:
+        trace.count(name, n)
+
+
+@contextmanager
+def stage(name):
+    """Time a block into the `name` stage histogram and the current trace."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, (time.perf_counter() - started) * 1000.0)
+
+
+def instrument_model(model):
+    """
+    Split SentenceTransformer.encode into tokenize / forward stages and count
+    tokens. encode() calls self.tokenize and self.forward per batch, so
+    instance-level wrappers see every batch. Models without them are left as is.
+    """
+    tokenize = getattr(model, "tokenize", None)
+    forward = getattr(model, "forward", None)
+    if tokenize is None or forward is None:
+        return model
+
+    def timed_tokenize(texts, *args, **kwargs):
+        with stage("tokenize"):
+            features = tokenize(texts, *args, **kwargs)
+        mask = features.get("attention_mask") if hasattr(features, "get") else None
+        if mask is not None:
+            lengths = mask.sum(dim=1).tolist() if hasattr(mask, "dim") else mask.sum(axis=1).tolist()
+            for n in lengths:
+                tokens_per_text.observe(n)
+            tokens_per_batch.observe(mask.shape[0] * mask.shape[1])
+            forward_batch_size.observe(mask.shape[0])
+            count("tokens", int(sum(lengths)))
+        return features
+
+    def timed_forward(features, *args, **kwargs):
+        with stage("forward"):
+            return forward(features, *args, **kwargs)
+
+    model.tokenize = timed_tokenize
+    model.forward = timed_forward
+    return model
@@ -0,0 +1,947 @@
+"""
+Local Vector Index
+In-process exact and IVF-flat nearest-neighbour search over NumPy.
+
+Vectors are L2-normalized so inner product equals cosine similarity.
+  • ExactIndex — one contiguous float32 matrix; a query is a single
+    matrix-vector product and top-k uses argpartition (no full sort)
+  • IVFIndex   — adds a spherical k-means quantizer with `nlist` inverted
+    lists; a query probes the `nprobe` closest lists and scores only the
+    vectors in them. Small corpora (or an untrained index) are scanned exactly.
+  • QuantizedIndex — keeps int8 codes plus a packed sign-bit sketch instead
+    of float32 rows; a query shortlists by Hamming distance and re-scores
+    the shortlist with the int8 codes.
+  • ReducedIndex — adds a low-dimensional copy of every row (PCA or
+    Matryoshka prefix, see dim_reduction.py); a query scans the reduced
+    rows and re-scores only the best `rerank` candidates at full dimension.
+
+Supports incremental upsert/delete (deletes are tombstones, reclaimed on
+compaction) and persistence to a single .npz file. Exact and IVF indexes can
+instead attach an EmbeddingStore and search its memory-mapped rows in place.
+Every index also keeps per-row filter attributes (filters.RowAttributes), so
+a filtered search scores only the rows whose category/difficulty match.
+"""
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from chunking import chunk_id
+from dim_reduction import DEFAULT_DIM as REDUCED_DIM
+from dim_reduction import FIT_SAMPLE, Projection, fit_projection
+from filters import FILTER_PROJECTION, RowAttributes, document_attributes
+from quantization import decode_embedding, hamming_distances, quantize_int8, sign_bits
+
+logger = logging.getLogger(__name__)
+
+# Below this many vectors a full scan is as fast as probing lists
+MIN_TRAIN_SIZE = 1024
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 64
+ASSIGN_CHUNK = 16384
+SCORE_BLOCK_ELEMENTS = 16 * 1024 * 1024
+# QuantizedIndex shortlist size, as a multiple of k
+RESCORE_FACTOR = 16
+# ReducedIndex candidates re-scored at full dimension per query
+RERANK_CANDIDATES = 256
+# A filter matching more than this fraction of rows is applied as a mask over
+# a full scan; a narrower one gathers and scores only the matching rows
+FILTER_GATHER_FRACTION = 0.5
+
+
+def normalize(vectors):
+    """Row-wise L2 normalization (zero rows stay zero)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k(scores, k):
+    """Indices of the k largest scores, best first, without a full sort."""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < scores.shape[0]:
+        idx = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx = np.arange(scores.shape[0])
+    return idx[np.argsort(-scores[idx], kind="stable")]
+
+
+def default_nlist(n):
+    """Rule of thumb: about 4·√n lists."""
+    return max(1, int(4 * np.sqrt(max(n, 1))))
+
+
+def spherical_kmeans(vectors, k, iterations=KMEANS_ITERATIONS, seed=0):
+    """Cosine k-means on normalized vectors; returns (k, dim) unit centroids."""
+    rng = np.random.default_rng(seed)
+    n = vectors.shape[0]
+    k = min(k, n)
+    centroids = vectors[rng.choice(n, size=k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = np.argmax(vectors @ centroids.T, axis=1)
+        counts = np.bincount(labels, minlength=k)
+        order = np.argsort(labels, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        sums = np.zeros_like(centroids)
+        present = counts > 0
+        sums[present] = np.add.reduceat(vectors[order], starts[present], axis=0)
+        empty = ~present
+        if empty.any():
+            # Re-seed empty clusters from random points
+            sums[empty] = vectors[rng.choice(n, size=int(empty.sum()), replace=False)]
+        centroids = normalize(sums)
+    return centroids
+
+
+class ExactIndex:
+    """
+    Exact top-k search over one contiguous, L2-normalized float32 matrix.
+    A query is one matrix-vector product plus argpartition; a batch of
+    queries is one matrix-matrix product.
+    """
+
+    index_type = "exact"
+    attachable = True
+
+    def __init__(self, dim):
+        self.dim = dim
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._size = 0                 # rows used in _vectors
+        self.ids = []                  # row → external id
+        self.id_to_row = {}            # external id → live row
+        self.attributes = RowAttributes()
+        self.store = None              # attached EmbeddingStore, if any
+        self._store_generation = None
+        self._lock = threading.RLock()
+
+    # ── Size / bookkeeping ───────────────────────────────────
+    def __len__(self):
+        return len(self.id_to_row)
+
+    @property
+    def tombstones(self):
+        return self._size - len(self.id_to_row)
+
+    @property
+    def matrix(self):
+        """Row-major view of every stored row (including tombstones)."""
+        return self._vectors[:self._size]
+
+    def _grow(self, capacity):
+        grown = np.zeros((capacity, self.dim), dtype=np.float32)
+        grown[:self._size] = self._vectors[:self._size]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+        self._vectors, self._alive = grown, alive
+
+    def _reserve(self, extra):
+        needed = self._size + extra
+        capacity = self._alive.shape[0]
+        if needed > capacity:
+            self._grow(max(needed, 2 * capacity, 1024))
+
+    def _reset(self):
+        self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._size = 0
+        self.ids, self.id_to_row = [], {}
+        self.attributes = RowAttributes()
+        self.store = None
+
+    # ── Attached store ───────────────────────────────────────
+    def attach(self, store):
+        """
+        Serve an EmbeddingStore's rows in place: the matrix becomes the store's
+        read-only memmap and the id bookkeeping is shared with it, so nothing
+        is copied. Write through the store, then attach again; only rows added
+        since the last attach are new to the index.
+        """
+        with self._lock:
+            same = self.store is store and self._store_generation == store.generation
+            start = self._size if same else 0
+            self.store, self._store_generation = store, store.generation
+            self._vectors, self._alive = store.vectors, store.alive
+            self.ids, self.id_to_row = store.ids, store.id_to_row
+            self._size = store.rows
+            self._attached(start)
+
+    def _attached(self, start):
+        """Rows [start, _size) became visible through the store."""
+        if not start:
+            self.attributes = RowAttributes()
+        self.attributes.set(start, self.store.attributes[start:self._size])
+
+    def _own(self):
+        """Take a private copy of attached state before mutating the index directly."""
+        if self.store is None:
+            return
+        self._vectors = np.array(self._vectors[:self._size])
+        self._alive = self._alive[:self._size].copy()
+        self.ids, self.id_to_row = list(self.ids), dict(self.id_to_row)
+        self.store = None
+
+    # ── Mutations ────────────────────────────────────────────
+    def _append(self, ids, vectors, attributes=None):
+        self._own()
+        self._reserve(len(ids))
+        start = self._size
+        end = start + len(ids)
+        self._store(start, end, vectors)
+        if attributes is not None:
+            self.attributes.set(start, attributes)
+        self._alive[start:end] = True
+        for offset, doc_id in enumerate(ids):
+            old = self.id_to_row.get(doc_id)
+            if old is not None:
+                self._alive[old] = False
+            self.id_to_row[doc_id] = start + offset
+        self.ids.extend(ids)
+        self._size = end
+        return start, end
+
+    def _store(self, start, end, vectors):
+        self._vectors[start:end] = vectors
+
+    def build(self, ids, vectors, attributes=None):
+        """Replace the index contents; `attributes` is one filter-attribute dict (or None) per id."""
+        vectors = normalize(vectors).reshape(-1, self.dim)
+        with self._lock:
+            self._reset()
+            self._append(list(ids), vectors, attributes)
+
+    def add(self, ids, vectors, attributes=None):
+        """Insert or replace vectors by id."""
+        vectors = normalize(vectors).reshape(-1, self.dim)
+        with self._lock:
+            self._append(list(ids), vectors, attributes)
+
+    def remove(self, ids):
+        """Tombstone vectors by id; returns how many were present."""
+        removed = 0
+        with self._lock:
+            self._own()
+            for doc_id in ids:
+                row = self.id_to_row.pop(doc_id, None)
+                if row is not None:
+                    self._alive[row] = False
+                    removed += 1
+        return removed
+
+    def live_ids(self):
+        """Snapshot of the ids currently in the index."""
+        with self._lock:
+            return list(self.id_to_row)
+
+    def _live_rows(self):
+        return np.flatnonzero(self._alive[:self._size])
+
+    def compact(self):
+        """Drop tombstoned rows and renumber."""
+        with self._lock:
+            rows = self._live_rows()
+            self._compact_rows(rows)
+
+    def _compact_rows(self, rows):
+        self._own()
+        self.attributes.take(rows)
+        self.ids = [self.ids[r] for r in rows]
+        self._vectors = np.ascontiguousarray(self._vectors[rows])
+        self._alive = np.ones(rows.size, dtype=bool)
+        self._size = rows.size
+        self.id_to_row = {doc_id: i for i, doc_id in enumerate(self.ids)}
+
+    # ── Search ───────────────────────────────────────────────
+    def _hits(self, scores, rows, k):
+        best = top_k(scores, k)
+        best = best[np.isfinite(scores[best])]
+        if rows is None:
+            return [(self.ids[i], float(scores[i])) for i in best]
+        return [(self.ids[rows[i]], float(scores[i])) for i in best]
+
+    def _exact_scores(self, queries):
+        """(m, size) scores against every stored row; tombstones get -inf."""
+        scores = queries @ self.matrix.T
+        if self.tombstones:
+            scores[:, ~self._alive[:self._size]] = -np.inf
+        return scores
+
+    def _row_scores(self, queries, rows):
+        """(m, len(rows)) scores against the given rows only."""
+        return queries @ self._vectors[rows].T
+
+    def _filter_mask(self, filters):
+        """Bitmap of the live rows matching `filters` ({attribute: [values]}), or None when unfiltered."""
+        if not filters:
+            return None
+        return self.attributes.mask(filters, self._size) & self._alive[:self._size]
+
+    def _scan(self, queries, k, allowed=None):
+        """Exact top-k per (normalized) query over every live row, or only the `allowed` ones."""
+        rows, excluded = None, None
+        if allowed is not None:
+            matches = int(np.count_nonzero(allowed))
+            if matches <= FILTER_GATHER_FRACTION * self._size:
+                rows = np.flatnonzero(allowed)
+            elif matches < len(self):
+                # A broad filter costs less as a mask over the full scan than as a gather
+                excluded = ~allowed
+        if self._size == 0 or (rows is not None and rows.size == 0):
+            return [[] for _ in range(queries.shape[0])]
+        # Bound the (m, n) score block to ~64 MB of float32
+        block = max(1, SCORE_BLOCK_ELEMENTS // (self._size if rows is None else rows.size))
+        results = []
+        for start in range(0, queries.shape[0], block):
+            chunk = queries[start:start + block]
+            if rows is None:
+                scores = self._exact_scores(chunk)
+                if excluded is not None:
+                    np.copyto(scores, -np.inf, where=excluded)
+            else:
+                scores = self._row_scores(chunk, rows)
+            results.extend(self._hits(row, rows, k) for row in scores)
+        return results
+
+    def search(self, query, k=10, filters=None, **_):
+        """Return [(id, score)] for the k most similar live vectors."""
+        return self.search_batch(np.atleast_2d(query), k, filters=filters)[0]
+
+    def search_batch(self, queries, k=10, filters=None, **_):
+        """
+        Top-k for each row of `queries` via one matrix-matrix product per block.
+        `filters` restricts the scan to rows whose attributes match.
+        """
+        queries = normalize(queries).reshape(-1, self.dim)
+        with self._lock:
+            return self._scan(queries, k, self._filter_mask(filters))
+
+    def stats(self):
+        return {
+            "type": self.index_type,
+            "size": len(self),
+            "tombstones": self.tombstones,
+            "dim": self.dim,
+            "matrix_bytes": int(self.matrix.nbytes),
+            "memory_mapped": self.store is not None,
+            "filter_values": self.attributes.stats(),
+        }
+
+    # ── Persistence ──────────────────────────────────────────
+    def _save_arrays(self, rows):
+        return {
+            "type": np.array(self.index_type),
+            "dim": np.array(self.dim),
+            "ids": np.array([self.ids[r] for r in rows], dtype=str),
+            "vectors": self._vectors[rows],
+            **self.attributes.arrays(rows),
+        }
+
+    def save(self, path):
+        """Write the live rows atomically to `path` (.npz)."""
+        with self._lock:
+            arrays = self._save_arrays(self._live_rows())
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.tmp.npz"
+        np.savez(tmp, **arrays)
+        os.replace(tmp, path)
+
+    def _load_arrays(self, data):
+        self._append(data["ids"].tolist(), data["vectors"])
+        self.attributes.load(data, self._size)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            index = cls(int(data["dim"]))
+            index._load_arrays(data)
+        return index
+
+
+class IVFIndex(ExactIndex):
+    """Inverted-file index with exact re-scoring inside probed lists."""
+
+    index_type = "ivf_flat"
+
+    def __init__(self, dim, nlist=None, nprobe=8, seed=0):
+        super().__init__(dim)
+        self.nlist_target = nlist
+        self.nprobe = nprobe
+        self.seed = seed
+
+        self.centroids = None          # (nlist, dim) once trained
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._lists = None             # list of row-index arrays
+        self._lists_stale = True
+        self.trained_size = 0
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def _grow(self, capacity):
+        assign = np.full(capacity, -1, dtype=np.int32)
+        assign[:self._size] = self._assign[:self._size]
+        super()._grow(capacity)
+        self._assign = assign
+
+    def _reset(self):
+        super()._reset()
+        self._assign = np.zeros(0, dtype=np.int32)
+        self.centroids = None
+        self._lists = None
+
+    def _attached(self, start):
+        super()._attached(start)
+        assign = np.full(self._size, -1, dtype=np.int32)
+        if start:
+            assign[:start] = self._assign[:start]
+            if self.centroids is not None and self._size > start:
+                assign[start:] = self._nearest_list(self._vectors[start:self._size])
+        else:
+            # Training on a fresh attach is left to the caller (train()), so
+            # opening a large store stays cheap; untrained, queries scan exactly
+            self.centroids, self._lists, self.trained_size = None, None, 0
+        self._assign = assign
+        self._lists_stale = True
+        if start and len(self) >= MIN_TRAIN_SIZE and len(self) >= 2 * max(self.trained_size, MIN_TRAIN_SIZE // 2):
+            self.train()
+
+    def _nearest_list(self, vectors):
+        labels = np.empty(vectors.shape[0], dtype=np.int32)
+        for start in range(0, vectors.shape[0], ASSIGN_CHUNK):
+            chunk = vectors[start:start + ASSIGN_CHUNK]
+            labels[start:start + ASSIGN_CHUNK] = np.argmax(chunk @ self.centroids.T, axis=1)
+        return labels
+
+    def _rebuild_lists(self):
+        rows = self._live_rows()
+        labels = self._assign[rows]
+        order = np.argsort(labels, kind="stable")
+        rows, labels = rows[order], labels[order]
+        bounds = np.searchsorted(labels, np.arange(self.centroids.shape[0] + 1))
+        self._lists = [rows[bounds[i]:bounds[i + 1]] for i in range(self.centroids.shape[0])]
+        self._lists_stale = False
+
+    # ── Build / train ────────────────────────────────────────
+    def build(self, ids, vectors, attributes=None):
+        """Replace the index contents and train the quantizer."""
+        with self._lock:
+            super().build(ids, vectors, attributes)
+            self.train()
+
+    def train(self):
+        """(Re)train centroids on the live vectors and reassign every row."""
+        with self._lock:
+            rows = self._live_rows()
+            if rows.size < MIN_TRAIN_SIZE:
+                self.centroids = None
+                self._lists = None
+                return
+            nlist = self.nlist_target or default_nlist(rows.size)
+            rng = np.random.default_rng(self.seed)
+            sample_size = min(rows.size, nlist * KMEANS_SAMPLE_PER_LIST)
+            sample = self._vectors[rng.choice(rows, size=sample_size, replace=False)]
+
+            started = time.perf_counter()
+            self.centroids = spherical_kmeans(sample, nlist, seed=self.seed)
+            self._assign[rows] = self._nearest_list(self._vectors[rows])
+            self.trained_size = rows.size
+            self._rebuild_lists()
+            logger.info(f"IVF trained: {rows.size} vectors, {self.centroids.shape[0]} lists "
+                        f"in {time.perf_counter() - started:.2f}s")
+
+    # ── Mutations ────────────────────────────────────────────
+    def _append(self, ids, vectors, attributes=None):
+        start, end = super()._append(ids, vectors, attributes)
+        if self.centroids is not None:
+            self._assign[start:end] = self._nearest_list(vectors)
+        self._lists_stale = True
+        return start, end
+
+    def add(self, ids, vectors, attributes=None):
+        """Insert or replace vectors by id."""
+        with self._lock:
+            super().add(ids, vectors, attributes)
+            # Retrain once the corpus has doubled since the last training
+            if len(self) >= MIN_TRAIN_SIZE and len(self) >= 2 * max(self.trained_size, MIN_TRAIN_SIZE // 2):
+                self.train()
+
+    def remove(self, ids):
+        with self._lock:
+            removed = super().remove(ids)
+            if removed:
+                self._lists_stale = True
+            return removed
+
+    def _compact_rows(self, rows):
+        assign = self._assign[rows].copy()
+        super()._compact_rows(rows)
+        self._assign = assign
+        self._lists_stale = True
+
+    # ── Search ───────────────────────────────────────────────
+    def _candidates(self, query, nprobe):
+        if self._lists_stale:
+            self._rebuild_lists()
+        nprobe = min(nprobe, self.centroids.shape[0])
+        probe = top_k(self.centroids @ query, nprobe)
+        return np.concatenate([self._lists[i] for i in probe])
+
+    def search(self, query, k=10, nprobe=None, exact=False, filters=None, **_):
+        """Return [(id, score)]; probes `nprobe` lists unless exact=True."""
+        return self.search_batch(np.atleast_2d(query), k, nprobe=nprobe, exact=exact, filters=filters)[0]
+
+    def search_batch(self, queries, k=10, nprobe=None, exact=False, filters=None, **_):
+        """
+        Top-k per query row; falls back to the exact matrix product when untrained.
+        With `filters`, a selective filter (fewer matches than the probed lists
+        would hold) is scanned exactly over its matches; otherwise the probe
+        widens until it yields k matching candidates.
+        """
+        if exact or self.centroids is None:
+            return super().search_batch(queries, k, filters=filters)
+        queries = normalize(queries).reshape(-1, self.dim)
+        nprobe = min(nprobe or self.nprobe, self.centroids.shape[0])
+        results = []
+        with self._lock:
+            allowed = self._filter_mask(filters)
+            if allowed is not None and np.count_nonzero(allowed) <= len(self) * nprobe / self.centroids.shape[0]:
+                return self._scan(queries, k, allowed)
+            for query in queries:
+                probe = nprobe
+                rows = self._candidates(query, probe)
+                while allowed is not None:
+                    rows = rows[allowed[rows]]
+                    if rows.size >= k or probe >= self.centroids.shape[0]:
+                        break
+                    probe = min(2 * probe, self.centroids.shape[0])
+                    rows = self._candidates(query, probe)
+                if rows.size == 0:
+                    results.append([])
+                    continue
+                results.append(self._hits(self._vectors[rows] @ query, rows, k))
+        return results
+
+    def stats(self):
+        stats = super().stats()
+        stats.update({
+            "trained": self.is_trained,
+            "nlist": int(self.centroids.shape[0]) if self.centroids is not None else 0,
+            "nprobe": self.nprobe,
+        })
+        return stats
+
+    # ── Persistence ──────────────────────────────────────────
+    def _save_arrays(self, rows):
+        arrays = super()._save_arrays(rows)
+        arrays.update({
+            "nprobe": np.array(self.nprobe),
+            "assign": self._assign[rows],
+            "trained_size": np.array(self.trained_size),
+        })
+        if self.centroids is not None:
+            arrays["centroids"] = self.centroids
+        return arrays
+
+    def _load_arrays(self, data):
+        super()._load_arrays(data)
+        if "nprobe" in data:
+            self.nprobe = int(data["nprobe"])
+        if "centroids" in data:
+            self.centroids = data["centroids"]
+            self._assign[:self._size] = data["assign"]
+            self.trained_size = int(data["trained_size"])
+            self._rebuild_lists()
+
+
+class QuantizedIndex(ExactIndex):
+    """
+    Compact index: per-vector int8 codes plus a packed sign-bit sketch,
+    about 1.1 bytes per dimension instead of 4. A query ranks every row by
+    Hamming distance between sketches, keeps `rescore` × k candidates and
+    re-scores only those with the int8 codes.
+    """
+
+    index_type = "int8_binary"
+    attachable = False             # rows are int8 codes, not the store's float32
+
+    def __init__(self, dim, rescore=RESCORE_FACTOR):
+        super().__init__(dim)
+        self.rescore = rescore
+        self._vectors = None
+        self._codes = np.zeros((0, dim), dtype=np.int8)
+        self._scales = np.zeros(0, dtype=np.float32)
+        self._bits = np.zeros((0, (dim + 7) // 8), dtype=np.uint8)
+
+    @property
+    def matrix(self):
+        """Dequantized float32 copy of every stored row (including tombstones)."""
+        return self._codes[:self._size].astype(np.float32) * self._scales[:self._size, None]
+
+    def _grow(self, capacity):
+        codes = np.zeros((capacity, self.dim), dtype=np.int8)
+        codes[:self._size] = self._codes[:self._size]
+        scales = np.zeros(capacity, dtype=np.float32)
+        scales[:self._size] = self._scales[:self._size]
+        bits = np.zeros((capacity, self._bits.shape[1]), dtype=np.uint8)
+        bits[:self._size] = self._bits[:self._size]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+        self._codes, self._scales, self._bits, self._alive = codes, scales, bits, alive
+
+    def _reset(self):
+        super()._reset()
+        self._vectors = None
+        self._codes = np.zeros((0, self.dim), dtype=np.int8)
+        self._scales = np.zeros(0, dtype=np.float32)
+        self._bits = np.zeros((0, (self.dim + 7) // 8), dtype=np.uint8)
+
+    def _store(self, start, end, vectors):
+        self._codes[start:end], self._scales[start:end] = quantize_int8(vectors)
+        self._bits[start:end] = sign_bits(vectors)
+
+    def _compact_rows(self, rows):
+        self.attributes.take(rows)
+        self.ids = [self.ids[r] for r in rows]
+        self._codes = np.ascontiguousarray(self._codes[rows])
+        self._scales = self._scales[rows]
+        self._bits = np.ascontiguousarray(self._bits[rows])
+        self._alive = np.ones(rows.size, dtype=bool)
+        self._size = rows.size
+        self.id_to_row = {doc_id: i for i, doc_id in enumerate(self.ids)}
+
+    # ── Search ───────────────────────────────────────────────
+    def _int8_scores(self, query, rows):
+        return (self._codes[rows].astype(np.float32) @ query) * self._scales[rows]
+
+    def _row_scores(self, queries, rows):
+        return (queries @ self._codes[rows].astype(np.float32).T) * self._scales[rows]
+
+    def _exact_scores(self, queries):
+        """(m, size) int8 scores against every stored row; tombstones get -inf."""
+        scores = (queries @ self._codes[:self._size].astype(np.float32).T) * self._scales[:self._size]
+        if self.tombstones:
+            scores[:, ~self._alive[:self._size]] = -np.inf
+        return scores
+
+    def search(self, query, k=10, exact=False, rescore=None, filters=None, **_):
+        """Return [(id, score)]; Hamming shortlist + int8 re-score unless exact=True."""
+        return self.search_batch(np.atleast_2d(query), k, exact=exact, rescore=rescore, filters=filters)[0]
+
+    def search_batch(self, queries, k=10, exact=False, rescore=None, filters=None, **_):
+        """
+        Top-k per query row; exact=True scores every row with the int8 codes.
+        With `filters`, non-matching rows never enter the shortlist, and a
+        filter matching no more rows than the shortlist re-scores them all.
+        """
+        if exact:
+            return super().search_batch(queries, k, filters=filters)
+        queries = normalize(queries).reshape(-1, self.dim)
+        query_bits = sign_bits(queries)
+        shortlist = k * (rescore or self.rescore)
+        results = []
+        with self._lock:
+            if self._size == 0:
+                return [[] for _ in range(queries.shape[0])]
+            bits = self._bits[:self._size]
+            dead = ~self._alive[:self._size] if self.tombstones else None
+            allowed = self._filter_mask(filters)
+            if allowed is not None:
+                if np.count_nonzero(allowed) <= shortlist:
+                    return self._scan(queries, k, allowed)
+                dead = ~allowed
+            for query, qbits in zip(queries, query_bits):
+                closeness = -hamming_distances(qbits, bits).astype(np.float32)
+                if dead is not None:
+                    closeness[dead] = -np.inf
+                rows = top_k(closeness, shortlist)
+                rows = rows[np.isfinite(closeness[rows])]
+                results.append(self._hits(self._int8_scores(query, rows), rows, k))
+        return results
+
+    def stats(self):
+        stats = super().stats()
+        stats.update({
+            "matrix_bytes": int(self._codes[:self._size].nbytes + self._scales[:self._size].nbytes
+                                + self._bits[:self._size].nbytes),
+            "rescore": self.rescore,
+        })
+        return stats
+
+    # ── Persistence ──────────────────────────────────────────
+    def _save_arrays(self, rows):
+        return {
+            "type": np.array(self.index_type),
+            "dim": np.array(self.dim),
+            "ids": np.array([self.ids[r] for r in rows], dtype=str),
+            "codes": self._codes[rows],
+            "scales": self._scales[rows],
+            "bits": self._bits[rows],
+            "rescore": np.array(self.rescore),
+            **self.attributes.arrays(rows),
+        }
+
+    def _load_arrays(self, data):
+        ids = data["ids"].tolist()
+        self._reserve(len(ids))
+        end = len(ids)
+        self._codes[:end], self._scales[:end], self._bits[:end] = data["codes"], data["scales"], data["bits"]
+        self._alive[:end] = True
+        self.ids = ids
+        self.id_to_row = {doc_id: i for i, doc_id in enumerate(ids)}
+        self._size = end
+        self.rescore = int(data["rescore"])
+        self.attributes.load(data, end)
+
+
+class ReducedIndex(ExactIndex):
+    """
+    Two-stage index: float32 rows plus a reduced copy of each (e.g. 64-d PCA).
+    A query scans the reduced rows for `rerank` candidates and re-scores only
+    those with the full rows, so the full matrix is touched in a few hundred
+    places per query. Attached to an EmbeddingStore, only the reduced copy
+    has to stay resident.
+
+    A supplied projection (fitted by `python dim_reduction.py`, or a prefix
+    truncation) is used as is. Otherwise PCA is fitted on the rows once there
+    are MIN_TRAIN_SIZE of them and refitted when the corpus doubles; until
+    then queries scan the full rows exactly.
+    """
+
+    index_type = "reduced"
+
+    def __init__(self, dim, reduced_dim=REDUCED_DIM, method="pca", rerank=RERANK_CANDIDATES, projection=None):
+        super().__init__(dim)
+        if projection is None and method == "prefix":
+            projection = Projection("prefix", dim, min(reduced_dim, dim))
+        if projection is not None and projection.source_dim != dim:
+            raise ValueError(f"Projection maps {projection.source_dim} dims, index has {dim}")
+        self.projection = projection
+        self.fixed = projection is not None    # supplied projections are never refitted
+        self.method = projection.method if projection is not None else method
+        self.reduced_dim = projection.dim if projection is not None else min(reduced_dim, dim)
+        self.rerank = rerank
+        self.trained_size = 0
+        self._reduced = np.zeros((0, self.reduced_dim), dtype=np.float32)
+
+    @property
+    def is_trained(self):
+        return self.projection is not None
+
+    def _grow(self, capacity):
+        reduced = np.zeros((capacity, self.reduced_dim), dtype=np.float32)
+        reduced[:self._size] = self._reduced[:self._size]
+        super()._grow(capacity)
+        self._reduced = reduced
+
+    def _reset(self):
+        super()._reset()
+        self._reduced = np.zeros((0, self.reduced_dim), dtype=np.float32)
+        if not self.fixed:
+            self.projection, self.trained_size = None, 0
+
+    def _store(self, start, end, vectors):
+        super()._store(start, end, vectors)
+        if self.projection is not None:
+            self._reduced[start:end] = self.projection.apply(vectors)
+
+    def _project_rows(self, start, end):
+        """Recompute the reduced copy of rows [start, end), a chunk at a time."""
+        for chunk in range(start, end, ASSIGN_CHUNK):
+            stop = min(chunk + ASSIGN_CHUNK, end)
+            self._reduced[chunk:stop] = self.projection.apply(self._vectors[chunk:stop])
+
+    def _attached(self, start):
+        super()._attached(start)
+        reduced = np.zeros((self._size, self.reduced_dim), dtype=np.float32)
+        if start:
+            reduced[:start] = self._reduced[:start]
+        elif not self.fixed:
+            # As with IVF, fitting on a fresh attach is left to the caller (train())
+            self.projection, self.trained_size = None, 0
+        self._reduced = reduced
+        if self.projection is not None:
+            self._project_rows(start, self._size)
+        if start and self._due_for_training():
+            self.train()
+
+    def _compact_rows(self, rows):
+        reduced = np.ascontiguousarray(self._reduced[rows])
+        super()._compact_rows(rows)
+        self._reduced = reduced
+
+    def _due_for_training(self):
+        return (not self.fixed and len(self) >= MIN_TRAIN_SIZE
+                and len(self) >= 2 * max(self.trained_size, MIN_TRAIN_SIZE // 2))
+
+    # ── Build / train ────────────────────────────────────────
+    def build(self, ids, vectors, attributes=None):
+        """Replace the index contents and fit the projection (unless one was supplied)."""
+        with self._lock:
+            super().build(ids, vectors, attributes)
+            self.train()
+
+    def train(self):
+        """(Re)fit PCA on a sample of the live rows and re-project every row (no-op for a supplied projection)."""
+        with self._lock:
+            rows = self._live_rows()
+            self.trained_size = rows.size
+            if self.fixed:
+                return                 # rows were projected as they were stored
+            if rows.size < MIN_TRAIN_SIZE:
+                self.projection, self.trained_size = None, 0
+                return
+            started = time.perf_counter()
+            sample = np.sort(np.random.default_rng(0).choice(rows, size=min(rows.size, FIT_SAMPLE), replace=False))
+            self.projection = fit_projection(self._vectors[sample], self.reduced_dim, self.method)
+            self._project_rows(0, self._size)
+            logger.info(f"Reduced index fitted: {self.method} {self.dim} → {self.reduced_dim} dims "
+                        f"on {sample.size} vectors in {time.perf_counter() - started:.2f}s")
+
+    def add(self, ids, vectors, attributes=None):
+        """Insert or replace vectors by id."""
+        with self._lock:
+            super().add(ids, vectors, attributes)
+            if self._due_for_training():
+                self.train()
+
+    # ── Search ───────────────────────────────────────────────
+    def search(self, query, k=10, exact=False, rerank=None, filters=None, **_):
+        """Return [(id, score)]; reduced scan + full-dimension re-score unless exact=True."""
+        return self.search_batch(np.atleast_2d(query), k, exact=exact, rerank=rerank, filters=filters)[0]
+
+    def search_batch(self, queries, k=10, exact=False, rerank=None, filters=None, **_):
+        """
+        Top-k per query row; exact=True (or no projection yet) scans the full
+        rows. With `filters`, non-matching rows never become candidates, and a
+        filter matching no more rows than the candidate pool scores them all.
+        """
+        if exact or self.projection is None:
+            return super().search_batch(queries, k, filters=filters)
+        queries = normalize(queries).reshape(-1, self.dim)
+        reduced_queries = self.projection.apply(queries)
+        candidates = max(k, rerank or self.rerank)
+        results = []
+        with self._lock:
+            if self._size == 0:
+                return [[] for _ in range(queries.shape[0])]
+            allowed = self._filter_mask(filters)
+            if allowed is not None:
+                if np.count_nonzero(allowed) <= candidates:
+                    return self._scan(queries, k, allowed)
+                excluded = ~allowed
+            else:
+                excluded = ~self._alive[:self._size] if self.tombstones else None
+            reduced = self._reduced[:self._size]
+            block = max(1, SCORE_BLOCK_ELEMENTS // self._size)
+            for start in range(0, queries.shape[0], block):
+                scores = reduced_queries[start:start + block] @ reduced.T
+                if excluded is not None:
+                    np.copyto(scores, -np.inf, where=excluded)
+                for query, row_scores in zip(queries[start:start + block], scores):
+                    rows = top_k(row_scores, candidates)
+                    # Ascending rows read a memory-mapped matrix front to back
+                    rows = np.sort(rows[np.isfinite(row_scores[rows])])
+                    results.append(self._hits(self._vectors[rows] @ query, rows, k))
+        return results
+
+    def stats(self):
+        stats = super().stats()
+        stats.update({
+            "trained": self.is_trained,
+            "method": self.method,
+            "reduced_dim": self.reduced_dim,
+            "reduced_bytes": int(self._reduced[:self._size].nbytes) if self.projection is not None else 0,
+            "rerank": self.rerank,
+        })
+        return stats
+
+    # ── Persistence ──────────────────────────────────────────
+    def _save_arrays(self, rows):
+        arrays = super()._save_arrays(rows)
+        arrays.update({
+            "method": np.array(self.method),
+            "reduced_dim": np.array(self.reduced_dim),
+            "rerank": np.array(self.rerank),
+            "fixed": np.array(self.fixed),
+            "trained_size": np.array(self.trained_size),
+        })
+        if self.projection is not None:
+            arrays.update(self.projection.arrays())
+        return arrays
+
+    def _load_arrays(self, data):
+        # The reduced rows are not saved: they are recomputed from the projection on load
+        self.method, self.reduced_dim = str(data["method"]), int(data["reduced_dim"])
+        self.rerank, self.fixed = int(data["rerank"]), bool(data["fixed"])
+        self.trained_size = int(data["trained_size"])
+        self.projection = Projection.from_arrays(data) if "projection_method" in data else None
+        self._reduced = np.zeros((0, self.reduced_dim), dtype=np.float32)
+        super()._load_arrays(data)
+
+
+INDEX_TYPES = {"exact": ExactIndex, "ivf_flat": IVFIndex, "int8_binary": QuantizedIndex, "reduced": ReducedIndex}
+
+
+def settings_match(index, wanted):
+    """False when a persisted reduced index was built with another projection than `wanted` uses."""
+    if not isinstance(index, ReducedIndex) or not isinstance(wanted, ReducedIndex):
+        return True
+    if (index.method, index.reduced_dim, index.fixed) != (wanted.method, wanted.reduced_dim, wanted.fixed):
+        return False
+    return wanted.projection is None or wanted.projection.components is None \
+        or np.array_equal(index.projection.components, wanted.projection.components)
+
+
+def load_index(path):
+    """Load a persisted index of whichever type it was saved as."""
+    with np.load(path, allow_pickle=False) as data:
+        index_type = str(data["type"]) if "type" in data else "ivf_flat"
+    return INDEX_TYPES[index_type].load(path)
+
+
+EMBEDDED_FILTER = {"embedding": {"$exists": True, "$ne": []}}
+
+
+def count_index_entries(collection):
+    """Entries load_from_collection would produce: one per chunk, or one per unchunked document."""
+    pipeline = [
+        {"$match": EMBEDDED_FILTER},
+        {"$group": {"_id": None, "n": {"$sum": {"$max": [1, {"$size": {"$ifNull": ["$chunks", []]}}]}}}},
+    ]
+    result = list(collection.aggregate(pipeline))
+    return result[0]["n"] if result else 0
+
+
+def load_from_collection(collection, batch_size=2000):
+    """
+    Read (ids, vectors, attributes) for every document that has an embedding,
+    in any storage mode. Documents stored with per-chunk vectors contribute one
+    "<id>#<n>" entry per chunk instead of their pooled vector; chunk entries
+    share their document's filter attributes.
+    """
+    cursor = collection.find(
+        EMBEDDED_FILTER,
+        {"embedding": 1, "embedding_scale": 1, "chunks": 1, **FILTER_PROJECTION},
+        batch_size=batch_size,
+    )
+    ids, vectors, attributes = [], [], []
+    for doc in cursor:
+        doc_attributes = document_attributes(doc)
+        if doc.get("chunks"):
+            for i, chunk in enumerate(doc["chunks"]):
+                ids.append(chunk_id(doc["_id"], i))
+                vectors.append(decode_embedding(chunk))
+                attributes.append(doc_attributes)
+            continue
+        ids.append(str(doc["_id"]))
+        vectors.append(decode_embedding(doc))
+        attributes.append(doc_attributes)
+    if not vectors:
+        return ids, None, attributes
+    return ids, np.vstack(vectors), attributes
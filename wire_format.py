@@ -0,0 +1,78 @@
+"""
+Binary Embedding Wire Format
+Compact alternative to JSON float lists for /embed and /embed-batch.
+
+Layout (all little-endian):
+    offset 0   4 bytes  magic  b"EMBV"
+    offset 4   uint8    format version (1)
+    offset 5   uint8    dtype code (1 = float32, 2 = float16)
+    offset 6   uint16   reserved (0)
+    offset 8   uint32   count  (number of vectors)
+    offset 12  uint32   dim    (values per vector)
+    offset 16  count * dim values, row-major
+"""
+import struct
+
+import numpy as np
+
+MEDIA_TYPE = "application/octet-stream"
+MAGIC = b"EMBV"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHII")
+
+DTYPES = {
+    "float32": (1, np.dtype("<f4")),
+    "float16": (2, np.dtype("<f2")),
+}
+DTYPE_BY_CODE = {code: (name, dt) for name, (code, dt) in DTYPES.items()}
+
+
+def pack_embeddings(embeddings, dtype="float32"):
+    """Serialize an (n, dim) array into header + raw buffer."""
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported dtype '{dtype}'")
+    code, np_dtype = DTYPES[dtype]
+    arr = np.ascontiguousarray(np.atleast_2d(embeddings), dtype=np_dtype)
+    count, dim = arr.shape
+    return HEADER.pack(MAGIC, VERSION, code, 0, count, dim) + arr.tobytes()
+
+
+def unpack_embeddings(buffer):
+    """Parse a packed buffer back into an (n, dim) float32 array."""
+    if len(buffer) < HEADER.size:
+        raise ValueError("Buffer shorter than header")
+    magic, version, code, _, count, dim = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError("Bad magic; not an embedding buffer")
+    if version != VERSION:
+        raise ValueError(f"Unsupported wire format version {version}")
+    if code not in DTYPE_BY_CODE:
+        raise ValueError(f"Unknown dtype code {code}")
+    _, np_dtype = DTYPE_BY_CODE[code]
+    expected = HEADER.size + count * dim * np_dtype.itemsize
+    if len(buffer) != expected:
+        raise ValueError(f"Expected {expected} bytes, got {len(buffer)}")
+    arr = np.frombuffer(buffer, dtype=np_dtype, offset=HEADER.size).reshape(count, dim)
+    return arr.astype(np.float32, copy=False)
+
+
+def negotiate(accept_header):
+    """
+    Pick the response encoding from an Accept header.
+    Returns None for JSON (the default) or the binary dtype name, e.g.
+        Accept: application/octet-stream                 → "float32"
+        Accept: application/octet-stream; dtype=float16  → "float16"
+    """
+    if not accept_header:
+        return None
+    for part in accept_header.split(","):
+        fields = [f.strip() for f in part.split(";")]
+        if fields[0].lower() != MEDIA_TYPE:
+            continue
+        dtype = "float32"
+        for param in fields[1:]:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "dtype" and value.strip().lower() in DTYPES:
+                dtype = value.strip().lower()
+        return dtype
+    return None